@@ -0,0 +1,175 @@
+"""
+Cold start benchmark of LambdaFixedWidthExecutor.
+
+Records the import time of every transformer.* module in a fresh interpreter, then times the first (cold) and
+following (warm) executor runs in another fresh interpreter. S3 and the config are replaced with local files, the
+S3 client is still constructed so its cost is part of the results.
+
+    python -m benchmarks.cold_start --runs 5 --rows 1000 --output cold_start.json
+"""
+import argparse
+import functools
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import fixtures
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXECUTOR_IMPORT = "from transformer.executor import LambdaFixedWidthExecutor"
+SOURCE_KEY = "benchmark.txt"
+
+
+def measure_imports() -> dict:
+    """
+    Import time in microseconds of every transformer.* module and of the executor as a whole, from python -X importtime
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", EXECUTOR_IMPORT], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    modules = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_time, cumulative, raw_name = line[len("import time:"):].split("|")
+        if not self_time.strip().isdigit():
+            continue
+        name = raw_name.strip()
+        if name.startswith("transformer"):
+            modules[name] = {"self_us": int(self_time), "cumulative_us": int(cumulative)}
+        # Nested imports are indented, the cumulative times of the top level ones add up to the whole import
+        if raw_name[1:2] != " ":
+            total += int(cumulative)
+    return {"total_us": total, "modules": modules}
+
+
+def measure_invocations(runs: int, rows: int) -> dict:
+    """
+    Runs the executor [runs] times in a fresh interpreter, see run_invocations
+    """
+    result = subprocess.run([sys.executable, "-m", "benchmarks.cold_start", "--invocations", "--runs", str(runs),
+                             "--rows", str(rows)], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run_invocations(runs: int, rows: int) -> dict:
+    work_dir = tempfile.mkdtemp()
+    try:
+        source_file = os.path.join(work_dir, "source.txt")
+        config_file = os.path.join(work_dir, "config.yaml")
+        fixtures.write_source(source_file, rows)
+        fixtures.write_config(config_file, {"Benchmark": fixtures.source_config(f"^{SOURCE_KEY}$")})
+        os.environ.update({"config_type": "local", "config_name": config_file})
+
+        start = time.perf_counter()
+        from transformer.executor import LambdaFixedWidthExecutor
+        import_time = time.perf_counter() - start
+
+        phases = {}
+        _instrument(phases, source_file)
+        invocations = []
+        for _ in range(runs):
+            phases.clear()
+            start = time.perf_counter()
+            with open(os.devnull, 'w') as devnull:
+                stdout, sys.stdout = sys.stdout, devnull
+                try:
+                    LambdaFixedWidthExecutor().run(bucket="benchmark", key=SOURCE_KEY)
+                finally:
+                    sys.stdout = stdout
+            invocations.append({"total_s": time.perf_counter() - start, "phases_s": dict(phases)})
+        return {"import_s": import_time, "rows": rows, "runs": invocations}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _instrument(phases: dict, source_file: str):
+    from transformer.executor import ExecutorConfig
+    from transformer.library import aws_service
+    from transformer.result import ResultMapper, ResultMapperConfig, ResultProducerConfig, result_producer
+    from transformer.source import SourceMapper, SourceMapperConfig
+
+    def download_s3_file(bucket, key, file_name, client=None, **kwargs):
+        # Stand-in for S3: the client is constructed as in aws_service.download_s3_file, the file is copied locally
+        with _timer(phases, "client"):
+            aws_service._boto3().resource('s3', region_name=os.environ.get("AWS_DEFAULT_REGION", "us-east-1"))
+        with _timer(phases, "download"):
+            shutil.copyfile(source_file, file_name)
+        return file_name
+
+    aws_service.download_s3_file = download_s3_file
+    for owner, name, phase in [
+        (ExecutorConfig, "__init__", "config"),
+        (SourceMapperConfig, "__init__", "source_config"),
+        (ResultMapperConfig, "__init__", "result_config"),
+        (ResultProducerConfig, "__init__", "result_config"),
+        (SourceMapper, "run", "source"),
+        (SourceMapper, "run_chunks", "source"),
+        (ResultMapper, "run", "result"),
+        (result_producer.ConsoleResultProducer, "run", "produce"),
+    ]:
+        setattr(owner, name, _timed(phases, phase, getattr(owner, name)))
+
+
+class _timer:
+    def __init__(self, phases: dict, phase: str):
+        self.phases = phases
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *args):
+        self.phases[self.phase] = self.phases.get(self.phase, 0) + time.perf_counter() - self.start
+
+
+def _timed(phases: dict, phase: str, function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with _timer(phases, phase):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def _revision():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Executor runs, the first one is the cold start")
+    parser.add_argument("--rows", type=int, default=1000, help="Body rows of the source file")
+    parser.add_argument("--output", help="JSON file to write the results to, printed when not given")
+    parser.add_argument("--invocations", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(arguments)
+
+    if args.invocations:
+        print(json.dumps(run_invocations(args.runs, args.rows)))
+        return
+    results = {
+        "benchmark": "cold_start",
+        "revision": _revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "imports": measure_imports(),
+        "invocations": measure_invocations(args.runs, args.rows)
+    }
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
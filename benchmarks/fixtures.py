@@ -0,0 +1,99 @@
+"""
+Synthetic fixed width files and their configuration for the benchmarks.
+"""
+import numpy as np
+import yaml
+
+HEADER_WIDTH = 9
+FOOTER_WIDTH = 11
+# Rows generated at once, bounds the memory used to write large files
+BLOCK_ROWS = 100_000
+
+
+def body_layout(fields: int, width: int) -> list[tuple[str, int, int]]:
+    """
+    (name, start, end) of every body field. The first field holds the row number, the others repeat it.
+    """
+    return [(f"field{i}", i * width, (i + 1) * width) for i in range(fields)]
+
+
+def write_source(file_name: str, rows: int, fields=5, width=10) -> int:
+    """
+    Writes a file with a header line, [rows] body records of [fields] fields of [width] characters and a footer line.
+
+    :return: Size of the file in bytes
+    """
+    size = 0
+    with open(file_name, 'wb') as file:
+        size += file.write(b"H" + b"20260101".ljust(HEADER_WIDTH - 1) + b"\n")
+        for start in range(0, rows, BLOCK_ROWS):
+            block = _body_block(start, min(BLOCK_ROWS, rows - start), fields, width)
+            size += file.write(block.tobytes())
+        size += file.write(b"F" + str(rows).rjust(FOOTER_WIDTH - 1, "0").encode() + b"\n")
+    return size
+
+
+def _body_block(start: int, rows: int, fields: int, width: int) -> np.ndarray:
+    record_length = fields * width
+    block = np.full((rows, record_length + 1), ord(" "), dtype=np.uint8)
+    block[:, record_length] = ord("\n")
+    numbers = np.arange(start, start + rows, dtype=np.int64)
+    digits = min(width, 12)
+    column = np.empty((rows, digits), dtype=np.uint8)
+    remaining = numbers.copy()
+    for position in range(digits - 1, -1, -1):
+        column[:, position] = ord("0") + remaining % 10
+        remaining //= 10
+    for field in range(fields):
+        block[:, field * width:field * width + digits] = column
+    return block
+
+
+def source_config(pattern: str, fields=5, width=10, producer="ConsoleResultProducer", producer_arguments=None,
+                  body_formatter="BodySourceFormatter", **options) -> dict:
+    """
+    Configuration of a single file entry matching [pattern], reading the files written by write_source.
+    [options] are added to the file entry, eg. chunk_size or parse_workers.
+    """
+    body = [{"name": name, "spec": f"{start},{end}"} for name, start, end in body_layout(fields, width)]
+    producer_config = {"name": producer}
+    if producer_arguments:
+        producer_config['arguments'] = producer_arguments
+    entry = {
+        "pattern": pattern,
+        "source": {
+            "header": {
+                "formatter": "HeaderSourceFormatter",
+                "format": [
+                    {"name": "record_type", "spec": "0,1"},
+                    {"name": "file_date", "spec": f"1,{HEADER_WIDTH}"}
+                ]
+            },
+            "body": {
+                "formatter": body_formatter,
+                "format": body
+            },
+            "footer": {
+                "formatter": "FooterSourceFormatter",
+                "format": [
+                    {"name": "record_type", "spec": "0,1"},
+                    {"name": "record_count", "spec": f"1,{FOOTER_WIDTH}"}
+                ]
+            }
+        },
+        "result": {
+            "producer": producer_config,
+            "formatter": "DefaultArrayResultFormatter",
+            "format": {
+                "metadata": [{"name": "file_date", "value": "header.file_date"}],
+                "body": [{"name": name, "value": f"body.{name}"} for name, _, _ in body_layout(fields, width)]
+            }
+        }
+    }
+    entry.update(options)
+    return entry
+
+
+def write_config(file_name: str, entries: dict[str, dict]):
+    with open(file_name, 'w') as file:
+        yaml.safe_dump({"files": entries}, file)
@@ -0,0 +1,216 @@
+"""
+End to end throughput and memory benchmark over synthetic fixed width files.
+
+Every file size is run in a fresh interpreter. A file with a header, [rows] body records and a footer is generated,
+then SourceMapper, ResultMapper and the producer are run on it. Rows per second and peak RSS are reported per stage.
+
+    python -m benchmarks.throughput --sizes 10k 1m 10m --fields 5 --width 10 --output throughput.json
+    python -m benchmarks.throughput --sizes 10k 1m --baseline throughput.json --tolerance 0.2
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks import fixtures
+from benchmarks.cold_start import ROOT, _revision
+
+SOURCE_KEY = "benchmark.txt"
+
+
+def parse_size(text: str) -> int:
+    multipliers = {"k": 1_000, "m": 1_000_000}
+    suffix = text[-1:].lower()
+    if suffix in multipliers:
+        return int(float(text[:-1]) * multipliers[suffix])
+    return int(text)
+
+
+class RssMonitor:
+    """
+    Peak resident set size while a stage runs, sampled from /proc/self/statm every [interval] seconds.
+    Where /proc is not available the peak of the whole process (ru_maxrss) is reported instead.
+    """
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+
+def current_rss() -> int:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_case(rows: int, fields: int, width: int, body_formatter: str, chunk_size=None, arrow_strings=False) -> dict:
+    from transformer.result import ResultMapper, ResultMapperConfig, ResultProducerConfig, result_producer
+    from transformer.source import SourceMapper, SourceMapperConfig
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        source_file = os.path.join(work_dir, SOURCE_KEY)
+        start = time.perf_counter()
+        size = fixtures.write_source(source_file, rows, fields, width)
+        generate_time = time.perf_counter() - start
+        options = {"chunk_size": chunk_size} if chunk_size else {}
+        if arrow_strings:
+            options['arrow_strings'] = True
+        entry = fixtures.source_config(f"^{SOURCE_KEY}$", fields, width, body_formatter=body_formatter, **options)
+
+        stages = {}
+
+        @contextlib.contextmanager
+        def stage(name: str, per_row=True):
+            with RssMonitor() as monitor:
+                start = time.perf_counter()
+                yield
+                elapsed = time.perf_counter() - start
+            stages[name] = {"seconds": elapsed, "rows_per_second": rows / elapsed if per_row and elapsed else None,
+                            "peak_rss_bytes": monitor.peak}
+
+        # Results are printed by ConsoleResultProducer, and some configs print themselves
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            with stage("source_config", per_row=False):
+                source_config = SourceMapperConfig(entry, source_file)
+                result_config = ResultMapperConfig(entry)
+                producer_config = ResultProducerConfig(entry)
+                producer = getattr(result_producer, producer_config.name)(producer_config)
+            if chunk_size:
+                # Stages are interleaved chunk by chunk, so only the whole pipeline is measured
+                with stage("pipeline"):
+                    producer.run_chunks(ResultMapper().run(config=result_config, frames=frames)
+                                        for frames in SourceMapper().run_chunks(source_config))
+            else:
+                with stage("source"):
+                    frames = SourceMapper().run(source_config)
+                with stage("result"):
+                    data = ResultMapper().run(config=result_config, frames=frames)
+                del frames
+                with stage("produce"):
+                    producer.run(data)
+        total = sum(stage["seconds"] for stage in stages.values())
+        return {
+            "rows": rows,
+            "fields": fields,
+            "width": width,
+            "body_formatter": body_formatter,
+            "chunk_size": chunk_size,
+            "arrow_strings": arrow_strings,
+            "file_bytes": size,
+            "generate_seconds": generate_time,
+            "total_seconds": total,
+            "rows_per_second": rows / total if total else None,
+            "stages": stages
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def measure(rows: int, args) -> dict:
+    command = [sys.executable, "-m", "benchmarks.throughput", "--case", "--rows", str(rows), "--fields",
+               str(args.fields), "--width", str(args.width), "--formatter", args.formatter]
+    if args.chunk_size:
+        command += ["--chunk-size", str(args.chunk_size)]
+    if args.arrow_strings:
+        command.append("--arrow-strings")
+    result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {"rows": rows, "error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else None}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def regressions(results: list[dict], baseline: dict, tolerance: float) -> list[str]:
+    """
+    Stages whose rows per second dropped by more than [tolerance] (eg. 0.2 for 20%) compared to [baseline]
+    """
+    found = []
+    previous = {_case_key(case): case for case in baseline.get("cases", []) if "stages" in case}
+    for case in results:
+        if "stages" not in case or _case_key(case) not in previous:
+            continue
+        for name, stage in case['stages'].items():
+            before = previous[_case_key(case)]['stages'].get(name, {}).get("rows_per_second")
+            after = stage.get("rows_per_second")
+            if before and after and after < before * (1 - tolerance):
+                found.append(f"{case['rows']} rows, {name}: {after:,.0f} rows/s, was {before:,.0f} rows/s")
+    return found
+
+
+def _case_key(case: dict) -> tuple:
+    return case['rows'], case['fields'], case['width'], case['body_formatter'], case['chunk_size'], \
+        case.get('arrow_strings', False)
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["10k", "1m", "10m"], help="Body rows, eg. 10k 1m 10m")
+    parser.add_argument("--fields", type=int, default=5, help="Body fields per record")
+    parser.add_argument("--width", type=int, default=10, help="Width of every body field")
+    parser.add_argument("--formatter", default="BodySourceFormatter", help="SourceFormatter of the body segment")
+    parser.add_argument("--chunk-size", type=int, help="Process the body in chunks of this many rows")
+    parser.add_argument("--arrow-strings", action="store_true", help="Hold str fields as Arrow strings")
+    parser.add_argument("--output", help="JSON file to write the results to, printed when not given")
+    parser.add_argument("--baseline", help="Earlier results to compare rows per second with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed drop in rows per second")
+    parser.add_argument("--case", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--rows", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(arguments)
+
+    if args.case:
+        print(json.dumps(run_case(args.rows, args.fields, args.width, args.formatter, args.chunk_size,
+                                  args.arrow_strings)))
+        return
+    results = {
+        "benchmark": "throughput",
+        "revision": _revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cases": [measure(parse_size(size), args) for size in args.sizes]
+    }
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text)
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as file:
+            found = regressions(results['cases'], json.load(file), args.tolerance)
+        for regression in found:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
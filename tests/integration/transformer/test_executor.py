@@ -1,8 +1,11 @@
+import io
+import json
 import unittest.mock
 
 import yaml
 
 from transformer.executor import LambdaFixedWidthExecutor
+from transformer.enrichment import enricher
 from tests.test_helper import generate_file_data
 import pytest
 import os
@@ -89,8 +92,277 @@ class TestLambdaFixedWidthExecutor:
         generate_file_data("/tmp/"+file_name, file_data)
 
         with(open(cfg_file, 'w')) as file:
-            yaml.dump(yaml.load(text), file)
+            yaml.dump(yaml.safe_load(text), file)
         results = LambdaFixedWidthExecutor().run(key=file_name, bucket="")
+        stages = {stage['name']: stage for stage in results.metrics['stages']}
+        assert list(stages) == ["config", "download", "format", "nan_check", "validate", "trim", "convert",
+                                "result_format", "result_validate", "produce"]
+        for stage in stages.values():
+            assert stage['calls'] == 1
+            assert stage['wall_seconds'] >= 0 and stage['cpu_seconds'] >= 0
+        assert results.metrics['wall_seconds'] == sum(stage['wall_seconds'] for stage in stages.values())
+        assert stages['format']['rows_out'] == 6
+        assert stages['nan_check']['rows_in'] == 6
+        assert stages['validate']['rows_in'] == 6
+        assert stages['convert']['rows_out'] == 6
+        assert stages['result_format']['rows_out'] == 4
+        assert stages['produce']['rows_in'] == 4
+
+    def test_chunked(self, file_name, cfg_file, mocker, capsys):
+        unittest.mock.patch.dict('os.environ', {'config_type': 'local', 'config_name': cfg_file}).start()
+        mocker.patch('transformer.library.aws_service.download_s3_file').return_value = file_name
+        text = f"""
+        files:
+            File 1:
+                pattern: ^{file_name}$
+                chunk_size: 3
+                source:
+                    header:
+                        formatter: HeaderSourceFormatter
+                        format:
+                            - name: header1
+                              spec: 0,1
+                    body:
+                        formatter: BodySourceFormatter
+                        format:
+                            - name: body1
+                              spec: 0,1
+                            - name: body2
+                              spec: 1,5
+                              validators:
+                                - name: RefValidator
+                                  arguments:
+                                    type: count
+                                    ref: footer.footer1
+                    footer:
+                        formatter: FooterSourceFormatter
+                        format:
+                            - name: footer1
+                              spec: 0, 5
+                result:
+                    producer:
+                        name: ConsoleResultProducer
+                    formatter: DefaultArrayResultFormatter
+                    format:
+                        metadata:
+                            - name: field1
+                              value: header.header1
+                        body:
+                            - name: body2
+                              value: body.body2
+        """
+
+        file_data = {
+            "header": {
+                "values": [["X"]],
+                "spacing": [1]
+            },
+            "body": {
+                "values": [["B", "1"], ["B", "2"], ["B", "3"], ["B", "4"]],
+                "spacing": [1, 4]
+            },
+            "footer": {
+                "values": [["4"]],
+                "spacing": [5]
+            }
+        }
+        generate_file_data("/tmp/"+file_name, file_data)
+
+        with(open(cfg_file, 'w')) as file:
+            yaml.dump(yaml.safe_load(text), file)
+        response = LambdaFixedWidthExecutor().run(key=file_name, bucket="")
+        records = [line for line in capsys.readouterr().out.split("\n") if line.startswith("{'body'")]
+        assert len(records) == 4
+        assert "'body2': '4'" in records[-1]
+        stages = {stage['name']: stage for stage in response.metrics['stages']}
+        assert stages['format']['rows_out'] == 6
+        assert stages['produce']['rows_in'] == 4
+
+    def test_s3_stream(self, file_name, cfg_file, mocker, capsys, caplog):
+        unittest.mock.patch.dict('os.environ', {'config_type': 'local', 'config_name': cfg_file}).start()
+        mocker.patch.dict('os.environ', {'metrics_log': 'true'})
+        download = mocker.patch('transformer.library.aws_service.download_s3_file')
+        text = f"""
+        files:
+            File 1:
+                pattern: ^{file_name}$
+                reader:
+                    name: S3SourceReader
+                    arguments:
+                        buffer_size: 16
+                source:
+                    header:
+                        formatter: HeaderSourceFormatter
+                        format:
+                            - name: header1
+                              spec: 0,1
+                    body:
+                        formatter: BodySourceFormatter
+                        format:
+                            - name: body1
+                              spec: 0,5
+                    footer:
+                        formatter: FooterSourceFormatter
+                        format:
+                            - name: footer1
+                              spec: 0, 5
+                result:
+                    producer:
+                        name: ConsoleResultProducer
+                    formatter: DefaultArrayResultFormatter
+                    format:
+                        header:
+                            - name: header1
+                              value: header.header1
+                        body:
+                            - name: body1
+                              value: body.body1
+        """
+        file_data = {
+            "header": {"values": [["X"]], "spacing": [1]},
+            "body": {"values": [["B1"], ["B2"], ["B3"]], "spacing": [5]},
+            "footer": {"values": [["3"]], "spacing": [5]}
+        }
+        generate_file_data("/tmp/"+file_name, file_data)
+        with open("/tmp/"+file_name, 'rb') as file:
+            stream = mocker.patch('transformer.library.aws_service.download_s3_as_bytes',
+                                  return_value=io.BytesIO(file.read()))
+        os.remove("/tmp/"+file_name)
+
+        with(open(cfg_file, 'w')) as file:
+            yaml.dump(yaml.safe_load(text), file)
+        LambdaFixedWidthExecutor().run(key=file_name, bucket="somebucket")
+        download.assert_not_called()
+        stream.assert_called_once_with("somebucket", file_name, None)
+        assert '{"metrics": {' in caplog.text
+        records = [line for line in capsys.readouterr().out.split("\n") if line.startswith("{'body'")]
+        assert len(records) == 3
+
+    def test_quarantine(self, file_name, cfg_file, mocker, capsys, tmp_path):
+        unittest.mock.patch.dict('os.environ', {'config_type': 'local', 'config_name': cfg_file}).start()
+        mocker.patch('transformer.library.aws_service.download_s3_file').return_value = file_name
+        quarantine_file = tmp_path / "quarantine.jsonl"
+        text = f"""
+        files:
+            File 1:
+                pattern: ^{file_name}$
+                quarantine:
+                    threshold: 1
+                    producer:
+                        name: LocalResultProducer
+                        arguments:
+                            file_name: {quarantine_file}
+                source:
+                    header:
+                        formatter: HeaderSourceFormatter
+                        format:
+                            - name: header1
+                              spec: 0,1
+                    body:
+                        formatter: BodySourceFormatter
+                        format:
+                            - name: body1
+                              spec: 0,5
+                              validators:
+                                - name: RegexValidator
+                                  arguments:
+                                    pattern: ^B\\d\\s*$
+                    footer:
+                        formatter: FooterSourceFormatter
+                        format:
+                            - name: footer1
+                              spec: 0, 5
+                result:
+                    producer:
+                        name: ConsoleResultProducer
+                    formatter: DefaultArrayResultFormatter
+                    format:
+                        body:
+                            - name: body1
+                              value: body.body1
+        """
+        file_data = {
+            "header": {"values": [["X"]], "spacing": [1]},
+            "body": {"values": [["B1"], ["BX"], ["B3"]], "spacing": [5]},
+            "footer": {"values": [["3"]], "spacing": [5]}
+        }
+        generate_file_data("/tmp/"+file_name, file_data)
+
+        with(open(cfg_file, 'w')) as file:
+            yaml.dump(yaml.safe_load(text), file)
+        response = LambdaFixedWidthExecutor().run(key=file_name, bucket="")
+        records = [line for line in capsys.readouterr().out.split("\n") if line.startswith("{'body'")]
+        assert len(records) == 2
+        with open(quarantine_file) as file:
+            quarantined = [json.loads(line) for line in file]
+        assert [(q['segment'], q['row'], q['line'], q['reasons']) for q in quarantined] == [
+            ("body", 1, "BX   ", ["body1.RegexValidator"])
+        ]
+        stages = {stage['name']: stage for stage in response.metrics['stages']}
+        assert stages['quarantine']['rows_in'] == 1
+
+    @pytest.mark.parametrize("chunk_size", [None, 2])
+    def test_enrichment(self, file_name, cfg_file, mocker, capsys, tmp_path, chunk_size):
+        unittest.mock.patch.dict('os.environ', {'config_type': 'local', 'config_name': cfg_file}).start()
+        mocker.patch('transformer.library.aws_service.download_s3_file').return_value = file_name
+        reference_file = tmp_path / "branches.csv"
+        reference_file.write_text("code,name\nB1,Main\nB2,Harbour\n")
+        text = f"""
+        files:
+            File 1:
+                pattern: ^{file_name}$
+                enrich:
+                    - table: branches
+                      source: {reference_file}
+                      key: code
+                      field: body.body1
+                source:
+                    header:
+                        formatter: HeaderSourceFormatter
+                        format:
+                            - name: header1
+                              spec: 0,1
+                    body:
+                        formatter: BodySourceFormatter
+                        format:
+                            - name: body1
+                              spec: 0,5
+                    footer:
+                        formatter: FooterSourceFormatter
+                        format:
+                            - name: footer1
+                              spec: 0, 5
+                result:
+                    producer:
+                        name: ConsoleResultProducer
+                    formatter: DefaultArrayResultFormatter
+                    format:
+                        body:
+                            - name: body1
+                              value: body.body1
+                            - name: branch_name
+                              value: ref.branches.name
+        """
+        file_data = {
+            "header": {"values": [["X"]], "spacing": [1]},
+            "body": {"values": [["B1"], ["B2"], ["B1"]], "spacing": [5]},
+            "footer": {"values": [["3"]], "spacing": [5]}
+        }
+        generate_file_data("/tmp/"+file_name, file_data)
+
+        config = yaml.safe_load(text)
+        if chunk_size:
+            config['files']['File 1']['chunk_size'] = chunk_size
+        with(open(cfg_file, 'w')) as file:
+            yaml.dump(config, file)
+        read = mocker.spy(enricher, '_read')
+        response = LambdaFixedWidthExecutor().run(key=file_name, bucket="")
+        records = [line for line in capsys.readouterr().out.split("\n") if line.startswith("{'body'")]
+        assert [("'branch_name': 'Main'" in record) for record in records] == [True, False, True]
+        assert "'branch_name': 'Harbour'" in records[1]
+        assert read.call_count == 1
+        stages = {stage['name']: stage for stage in response.metrics['stages']}
+        assert stages['enrich']['rows_out'] == (10 if chunk_size else 8)
 
     # def test_msk_result(self, file_name, cfg_file, mocker):
     #     unittest.mock.patch.dict('os.environ', {'config_type': 'local', 'config_name': cfg_file, 'region': 'ap-southeast-1'}).start()
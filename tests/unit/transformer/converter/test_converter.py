@@ -1,8 +1,9 @@
+import numpy as np
 import pandas as pd
 import pytest
 
 from transformer.converter import ConverterConfig, converter
-from transformer.library.exceptions import ConversionError
+from transformer.library.exceptions import ConversionError, InvalidConfigError
 
 
 class TestStrConverter:
@@ -129,8 +130,9 @@ class TestNumberConverter:
                     "field1": ["adasd", "*$)_@#(_)@#", "1"]
                 })
             }
-            with pytest.raises(ConversionError):
+            with pytest.raises(ConversionError) as e:
                 converter.NumberConverter().run(config,dataframes[config.segment][config.field_name])
+            assert e.value.rows == [0, 1]
 
         def test_invalid_to_float(self):
             config = ConverterConfig(
@@ -144,4 +146,106 @@ class TestNumberConverter:
                 })
             }
             with pytest.raises(ConversionError):
-                converter.NumberConverter().run(config,dataframes[config.segment][config.field_name])
\ No newline at end of file
+                converter.NumberConverter().run(config,dataframes[config.segment][config.field_name])
+
+class TestImpliedDecimalConverter:
+    def test_scaled(self):
+        config = ConverterConfig(segment="body", field_name="amount", name="ImpliedDecimalConverter",
+                                 arguments={"picture": "9(5)V99"})
+        results = converter.ImpliedDecimalConverter().run(
+            config, pd.Series(["0012345", "-0000123", "0000100+", "0000007-", "5"]))
+        assert results.dtype == np.int64
+        assert results.tolist() == [12345, -123, 100, -7, 5]
+
+    def test_failing_rows(self):
+        config = ConverterConfig(segment="body", field_name="amount", name="ImpliedDecimalConverter",
+                                 arguments={"picture": "9(3)V9"})
+        with pytest.raises(ConversionError) as e:
+            converter.ImpliedDecimalConverter().run(config, pd.Series(["1234", "12345", "12.4", "", None, "-"]))
+        assert e.value.rows == [1, 2, 3, 4, 5]
+
+    @pytest.mark.parametrize("arguments", [{"picture": "X(5)"}, {"picture": "9(19)"}, {"picture": "9(10)V9(9)"},
+                                           {"scale": 2}])
+    def test_invalid_arguments(self, arguments):
+        config = ConverterConfig(segment="body", field_name="amount", name="ImpliedDecimalConverter",
+                                 arguments=arguments)
+        with pytest.raises(InvalidConfigError):
+            converter.ImpliedDecimalConverter().run(config, pd.Series(["1"]))
+
+
+class TestOverpunchConverter:
+    def test_signs(self):
+        config = ConverterConfig(segment="body", field_name="amount", name="OverpunchConverter",
+                                 arguments={"picture": "S9(3)V99"})
+        results = converter.OverpunchConverter().run(
+            config, pd.Series(["1234E", "1234N", "0000{", "0000}", "00012", "1234R"]))
+        assert results.tolist() == [12345, -12345, 0, 0, 12, -12349]
+
+    def test_failing_rows(self):
+        config = ConverterConfig(segment="body", field_name="amount", name="OverpunchConverter", arguments=None)
+        with pytest.raises(ConversionError) as e:
+            converter.OverpunchConverter().run(config, pd.Series(["123A", "12S", "1A3A", "é"]))
+        assert e.value.rows == [1, 2, 3]
+
+
+class TestPackedDecimalConverter:
+    def test_hex(self):
+        config = ConverterConfig(segment="body", field_name="amount", name="PackedDecimalConverter",
+                                 arguments={"picture": "9(3)V99"})
+        results = converter.PackedDecimalConverter().run(config, pd.Series(["12345C", "12345D", "0F", "00123b"]))
+        assert results.tolist() == [12345, -12345, 0, -123]
+
+    def test_bytes(self):
+        config = ConverterConfig(segment="body", field_name="amount", name="PackedDecimalConverter")
+        results = converter.PackedDecimalConverter().run(config, pd.Series([b"\x12\x34\x5c", b"\x00\x1d", b"\x0c"]))
+        assert results.tolist() == [12345, -1, 0]
+
+    def test_failing_rows(self):
+        config = ConverterConfig(segment="body", field_name="amount", name="PackedDecimalConverter",
+                                 arguments={"picture": "9(3)"})
+        with pytest.raises(ConversionError) as e:
+            converter.PackedDecimalConverter().run(config, pd.Series(["123C", "1234", "1A2C", "12345C", "C"]))
+        assert e.value.rows == [1, 2, 3, 4]
+
+
+class TestDateConverter:
+    def test_format(self):
+        config = ConverterConfig(segment="body", field_name="date", name="DateConverter",
+                                 arguments={"format": "%d%m%Y", "nulls": ["00000000"]})
+        results = converter.DateConverter().run(config, pd.Series(["31122023", "00000000", None]))
+        assert results.tolist()[0] == pd.Timestamp(2023, 12, 31)
+        assert results.isna().tolist() == [False, True, True]
+
+    def test_failing_rows(self):
+        config = ConverterConfig(segment="body", field_name="date", name="DateConverter", arguments=None)
+        with pytest.raises(ConversionError) as e:
+            converter.DateConverter().run(config, pd.Series(["20240229", "20230229", "2024011", "2024-01-01"]))
+        assert e.value.rows == [1, 2, 3]
+
+
+class TestArrowStrings:
+    @pytest.mark.parametrize("name, arguments, values", [
+        ("NumberConverter", None, ["1", "-2", None]),
+        ("NumberConverter", None, ["1.5", "2", None]),
+        ("NumberConverter", None, [" 1", "1e3", "+2"]),
+        ("ImpliedDecimalConverter", {"picture": "9(5)V99"}, ["0012345", "-0000123", "5"]),
+        ("OverpunchConverter", None, ["1234E", "1234N", "0000{"]),
+        ("PackedDecimalConverter", None, ["12345C", "12345D", "0F"]),
+        ("DateConverter", {"nulls": ["00000000"]}, ["20231231", "00000000", None]),
+    ])
+    def test_same_as_objects(self, name, arguments, values):
+        config = ConverterConfig(segment="body", field_name="field1", name=name, arguments=arguments)
+        expected = getattr(converter, name)().run(config, pd.Series(values, dtype=object))
+        results = getattr(converter, name)().run(config, pd.Series(values, dtype="string[pyarrow]"))
+        pd.testing.assert_series_equal(results, expected, check_names=False)
+
+    def test_failing_rows(self):
+        config = ConverterConfig(segment="body", field_name="field1", name="NumberConverter")
+        with pytest.raises(ConversionError) as e:
+            converter.NumberConverter().run(config, pd.Series(["1", "a", None, "2b"], dtype="string[pyarrow]"))
+        assert e.value.rows == [1, 3]
+
+    def test_str(self):
+        config = ConverterConfig(segment="body", field_name="field1", name="StrConverter")
+        series = pd.Series(["a", None], dtype="string[pyarrow]")
+        assert converter.StrConverter().run(config, series) is series
@@ -0,0 +1,90 @@
+import io
+
+import pandas as pd
+import pytest
+
+from transformer.enrichment import EnrichmentConfig, Enricher, enricher
+from transformer.library.exceptions import InvalidConfigError
+
+
+class TestEnricher:
+    @pytest.fixture(autouse=True)
+    def clear_tables(self):
+        enricher.clear_tables()
+        yield
+        enricher.clear_tables()
+
+    @pytest.fixture
+    def csv_file(self, tmp_path):
+        file_name = tmp_path / "branches.csv"
+        file_name.write_text("code,name,region\n001,Main,North\n002,Harbour,South\n001,Duplicate,East\n")
+        return str(file_name)
+
+    @pytest.fixture
+    def frames(self):
+        return {
+            "header": pd.DataFrame({"date": ["20260101"]}),
+            "body": pd.DataFrame({"branch": ["002", "003", "001"], "amount": ["1", "2", "3"]})
+        }
+
+    def config(self, source, columns=None):
+        table = {"table": "branches", "source": source, "key": "code", "field": "body.branch"}
+        if columns:
+            table['columns'] = columns
+        return EnrichmentConfig({"enrich": [table]})
+
+    def test_join(self, csv_file, frames):
+        result = Enricher().run(self.config(csv_file, ["name"]), frames)
+        assert list(result.keys()) == ["header", "body", "ref.branches"]
+        assert list(result['ref.branches'].columns) == ["name"]
+        assert result['ref.branches']['name'].tolist()[::2] == ["Harbour", "Main"]
+        assert pd.isna(result['ref.branches']['name'][1])
+
+    def test_parquet(self, tmp_path, frames):
+        file_name = str(tmp_path / "branches.parquet")
+        pd.DataFrame({"code": [1, 2], "name": ["Main", "Harbour"]}).to_parquet(file_name)
+        frames['body']['branch'] = [2, 1, 3]
+        result = Enricher().run(self.config(file_name), frames)
+        assert result['ref.branches']['name'].tolist()[:2] == ["Harbour", "Main"]
+
+    def test_cached(self, csv_file, frames, mocker):
+        build = mocker.spy(enricher, '_build')
+        Enricher().run(self.config(csv_file), frames)
+        Enricher().run(self.config(csv_file), frames)
+        assert build.call_count == 1
+        with open(csv_file, 'a') as file:
+            file.write("003,Airport,West\n")
+        result = Enricher().run(self.config(csv_file), frames)
+        assert build.call_count == 2
+        assert result['ref.branches']['name'].tolist() == ["Harbour", "Airport", "Main"]
+
+    def test_cache_bytes(self, csv_file, tmp_path, frames, mocker):
+        mocker.patch.dict('os.environ', {'reference_cache_bytes': "1"})
+        other_file = tmp_path / "other.csv"
+        other_file.write_text("code,name\n001,Other\n")
+        Enricher().run(self.config(csv_file), frames)
+        Enricher().run(self.config(str(other_file)), frames)
+        assert list(enricher._tables) == [(str(other_file), "code")]
+
+    def test_s3(self, frames, mocker):
+        download = mocker.patch('transformer.library.aws_service.download_s3_if_modified',
+                                side_effect=[(io.BytesIO(b"code,name\n001,Main\n"), "etag1"), (None, "etag1")])
+        Enricher().run(self.config("s3://bucket/branches.csv"), frames)
+        result = Enricher().run(self.config("s3://bucket/branches.csv"), frames)
+        assert download.call_args_list[1].args == ("bucket", "branches.csv")
+        assert download.call_args_list[1].kwargs == {"etag": "etag1"}
+        assert result['ref.branches']['name'].tolist()[2] == "Main"
+
+    def test_loaded_tables(self, csv_file, frames, mocker):
+        read = mocker.spy(enricher, '_read')
+        config = self.config(csv_file)
+        tables = Enricher().load(config)
+        for _ in range(3):
+            result = Enricher().run(config, frames, tables=tables)
+            assert result['ref.branches']['name'].tolist()[::2] == ["Harbour", "Main"]
+        assert read.call_count == 1
+        assert Enricher().load(EnrichmentConfig({})) == {}
+
+    def test_unknown_column(self, csv_file, frames):
+        with pytest.raises(InvalidConfigError):
+            Enricher().run(self.config(csv_file, ["unknown"]), frames)
@@ -0,0 +1,29 @@
+import pytest
+
+from transformer.enrichment import EnrichmentConfig, ReferenceTableConfig
+from transformer.library.exceptions import InvalidConfigError
+
+
+class TestEnrichmentConfig:
+    def test_tables(self):
+        config = EnrichmentConfig({
+            "enrich": [
+                {"table": "branches", "source": "branches.csv", "key": "code", "field": "body.branch",
+                 "columns": ["name"]}
+            ]
+        })
+        assert config.tables == [ReferenceTableConfig(name="branches", source="branches.csv", key="code",
+                                                      segment="body", field_name="branch", columns=["name"])]
+
+    def test_without_tables(self):
+        assert EnrichmentConfig({}).tables == []
+
+    @pytest.mark.parametrize("enrich", [
+        {"table": "branches"},
+        [{"table": "branches", "source": "branches.csv", "key": "code"}],
+        [{"table": "branches", "source": "branches.csv", "key": "code", "field": "branch"}],
+        [{"table": "branches", "source": "branches.csv", "key": "code", "field": "body.branch", "columns": "name"}]
+    ])
+    def test_invalid(self, enrich):
+        with pytest.raises(InvalidConfigError):
+            EnrichmentConfig({"enrich": enrich})
@@ -5,7 +5,7 @@ from unittest.mock import MagicMock
 import pytest
 import yaml
 from transformer.library import exceptions
-from transformer.executor import ExecutorConfig
+from transformer.executor import ExecutorConfig, executor_config
 
 
 class TestExecutorConfig:
@@ -25,6 +25,12 @@ class TestExecutorConfig:
         assert config.get_exact_config()
         assert config.get_config()
 
+    def test_version(self):
+        config = ExecutorConfig(key=self.shared_good_key, inline=self.shared_good_config)
+        assert config.get_version() == ExecutorConfig(key=self.shared_good_key, inline=self.shared_good_config).get_version()
+        changed = self.shared_good_config.replace("somevalue", "othervalue")
+        assert config.get_version() != ExecutorConfig(key=self.shared_good_key, inline=changed).get_version()
+
     def test_local_relative_path(self):
         config_file = "config_{}.yaml".format(uuid.uuid4().__str__())
         config_text = yaml.load(self.shared_good_config)
@@ -66,11 +72,47 @@ class TestExecutorConfig:
         mocker.patch.dict(os.environ, {"config_type": "external"})
         mocker.patch.dict(os.environ, {"config_bucket": "somebucket"})
         mocker.patch.dict(os.environ, {"config_name": "somekey"})
-        mocker.patch("transformer.library.aws_service.download_s3_as_bytes", return_value=io.StringIO(self.shared_good_config))
+        executor_config._configs.clear()
+        mocker.patch("transformer.library.aws_service.download_s3_if_modified",
+                     return_value=(io.StringIO(self.shared_good_config), '"etag"'))
         config = ExecutorConfig(key=self.shared_good_key)
         assert config.get_exact_config()
         assert config.get_config()
 
+    def test_remote_config_cache(self, mocker):
+        mocker.patch.dict(os.environ, {"config_type": "external", "config_bucket": "somebucket", "config_name": "somekey"})
+        executor_config._configs.clear()
+        download = mocker.patch("transformer.library.aws_service.download_s3_if_modified",
+                                return_value=(io.StringIO(self.shared_good_config), '"etag"'))
+        first = ExecutorConfig(key=self.shared_good_key)
+        download.return_value = (None, '"etag"')
+        load = mocker.spy(ExecutorConfig, '_load')
+        second = ExecutorConfig(key=self.shared_good_key)
+        assert download.call_args.args == ("somebucket", "somekey", '"etag"')
+        assert load.call_count == 0
+        assert second.get_config() is first.get_config()
+        assert second.get_version() == first.get_version()
+
+        changed = self.shared_good_config.replace("somevalue", "othervalue")
+        download.return_value = (io.StringIO(changed), '"etag2"')
+        third = ExecutorConfig(key=self.shared_good_key)
+        assert third.get_exact_config()['source'] == {"somekey": "othervalue"}
+        assert third.get_version() != first.get_version()
+
+    def test_remote_config_ttl(self, mocker):
+        mocker.patch.dict(os.environ, {"config_type": "external", "config_bucket": "somebucket",
+                                       "config_name": "somekey", "config_ttl": "60"})
+        executor_config._configs.clear()
+        download = mocker.patch("transformer.library.aws_service.download_s3_if_modified",
+                                return_value=(io.StringIO(self.shared_good_config), '"etag"'))
+        ExecutorConfig(key=self.shared_good_key)
+        ExecutorConfig(key=self.shared_good_key)
+        assert download.call_count == 1
+        executor_config._configs[("somebucket", "somekey")].checked_at -= 61
+        download.return_value = (None, '"etag"')
+        assert ExecutorConfig(key=self.shared_good_key).get_exact_config()
+        assert download.call_count == 2
+
     def test_executor_cfg_invalid_local(self):
         with pytest.raises(exceptions.MissingConfigError):
             ExecutorConfig(key=self.shared_good_key, local="rubbish.file")
@@ -0,0 +1,75 @@
+import re
+
+import pytest
+
+from transformer.executor import file_matcher
+from transformer.executor.file_matcher import FilePatternMatcher
+from transformer.library.exceptions import InvalidConfigError
+
+
+def files(*patterns):
+    return {f"file{i}": {"pattern": pattern} for i, pattern in enumerate(patterns)}
+
+
+def sequential_match(config: dict, key: str):
+    for name in config:
+        if re.match(config[name]['pattern'], key):
+            return name
+    return None
+
+
+class TestLiteralPrefix:
+    @pytest.mark.parametrize("pattern,prefix", [
+        ("^somefile.txt$", "somefile"),
+        ("somefile\\.txt$", "somefile.txt"),
+        ("^abc?d", "ab"),
+        ("^ab+c", "ab"),
+        ("^ab{2}", "a"),
+        ("^\\d+abc", ""),
+        ("^abc|def", ""),
+        ("(?i)abc", ""),
+        ("in/\\w+/x", "in/"),
+    ])
+    def test_prefix(self, pattern, prefix):
+        assert file_matcher.literal_prefix(pattern) == prefix
+
+
+class TestFilePatternMatcher:
+    def test_first_match_wins(self):
+        config = files("^some.*$", "^somefile.txt$", ".*\\.txt$", "^other\\d+\\.txt$")
+        matcher = FilePatternMatcher(config)
+        for key in ["somefile.txt", "other12.txt", "other.txt", "x.csv", "", "s"]:
+            assert matcher.match(key) == sequential_match(config, key)
+
+    def test_many_patterns(self):
+        config = files(*[f"^in/{i}/(data|file)_(\\d+)\\.txt$" for i in range(300)], "^in/.*$", "^out/(?P<n>\\w+)$")
+        matcher = FilePatternMatcher(config)
+        for key in ["in/7/data_1.txt", "in/299/file_22.txt", "in/7/x.txt", "out/abc", "out/", "nothing"]:
+            assert matcher.match(key) == sequential_match(config, key)
+
+    def test_back_reference(self):
+        config = files("^(a)\\1$", "^(b)x$", "^a.*$")
+        matcher = FilePatternMatcher(config)
+        assert matcher.match("aa") == "file0"
+        assert matcher.match("ab") == "file2"
+        assert matcher.match("bx") == "file1"
+
+    def test_conditional_reference(self):
+        config = files("[q](p)?", "(x)?(?(1)y|z)w", "^(?P<n>a)?(?(n)b|c)$")
+        matcher = FilePatternMatcher(config)
+        for key in ["xyw", "xzw", "zw", "qp", "ab", "c", "b"]:
+            assert matcher.match(key) == sequential_match(config, key)
+
+    def test_duplicate_group_names(self):
+        config = files("^(?P<n>a)1$", "^(?P<n>a)2$")
+        assert FilePatternMatcher(config).match("a2") == "file1"
+
+    def test_cached(self):
+        matcher = FilePatternMatcher(files("^a$", "^b$"), cache_size=2)
+        assert matcher.match("b") == "file1"
+        assert matcher.match("b") == "file1"
+        assert matcher.match.cache_info().hits == 1
+
+    def test_invalid_pattern(self):
+        with pytest.raises(InvalidConfigError):
+            FilePatternMatcher(files("^a(", "^b$"))
@@ -0,0 +1,37 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+# Wall time allowed for importing the executor in a fresh interpreter, aimed at Lambda cold starts
+IMPORT_BUDGET_SECONDS = float(os.environ.get('import_budget_seconds', 3.0))
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "modules": sorted(m for m in sys.modules if "." not in m)}}))
+"""
+
+
+def run_import(statement: str) -> dict:
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", ".."))
+    result = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT.format(statement=statement)], cwd=root,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class TestImportBudget:
+    def test_executor_within_budget(self):
+        result = run_import("from transformer.executor import LambdaFixedWidthExecutor")
+        assert result['elapsed'] < IMPORT_BUDGET_SECONDS
+
+    @pytest.mark.parametrize("module", ["kafka", "boto3", "botocore"])
+    def test_executor_without_unused_dependencies(self, module):
+        assert module not in run_import("from transformer.executor import LambdaFixedWidthExecutor")['modules']
+
+    def test_executor_config_without_pandas(self):
+        assert "pandas" not in run_import("from transformer.executor import ExecutorConfig")['modules']
@@ -1,3 +1,6 @@
+import io
+import botocore.exceptions as be
+
 from transformer.library import aws_service
 
 
@@ -10,3 +13,28 @@ def test_download_s3_file_success_no_client(mocker):
         key="testkey"
     )
     assert response == filename
+
+
+def test_download_s3_file_with_transfer_config(mocker):
+    resource = mocker.patch('boto3.resource')
+    aws_service.download_s3_file(bucket="test", key="testkey", file_name="/tmp/testfile",
+                                 part_size=8 * 1024 * 1024, max_workers=4)
+    config = resource.return_value.meta.client.download_file.call_args.kwargs['Config']
+    assert config.multipart_chunksize == 8 * 1024 * 1024
+    assert config.max_concurrency == 4
+
+
+def test_download_s3_if_modified(mocker):
+    client = mocker.MagicMock()
+    client.get_object.return_value = {'Body': io.BytesIO(b"data"), 'ETag': '"abc"'}
+    body, etag = aws_service.download_s3_if_modified("test", "testkey", client=client)
+    assert body.read() == b"data"
+    assert etag == '"abc"'
+    client.get_object.assert_called_once_with(Bucket="test", Key="testkey")
+
+
+def test_download_s3_if_modified_not_modified(mocker):
+    client = mocker.MagicMock()
+    client.get_object.side_effect = be.ClientError({'Error': {'Code': '304', 'Message': 'Not Modified'}}, 'GetObject')
+    assert aws_service.download_s3_if_modified("test", "testkey", etag='"abc"', client=client) == (None, '"abc"')
+    client.get_object.assert_called_once_with(Bucket="test", Key="testkey", IfNoneMatch='"abc"')
@@ -0,0 +1,124 @@
+import json
+import time
+import tracemalloc
+
+import pandas as pd
+
+from transformer.library.metrics import PipelineMetrics, count_rows
+
+
+class TestPipelineMetrics:
+    def test_stage(self):
+        metrics = PipelineMetrics()
+        with metrics.stage("format") as stage:
+            stage.record(rows_out=10, bytes=100)
+        with metrics.stage("format") as stage:
+            stage.record(rows_out=5, bytes=50)
+        result = metrics.to_dict()
+        assert result['stages'] == [{
+            "name": "format",
+            "wall_seconds": metrics.stages["format"].wall_seconds,
+            "cpu_seconds": metrics.stages["format"].cpu_seconds,
+            "calls": 2,
+            "rows_in": None,
+            "rows_out": 15,
+            "bytes": 150
+        }]
+
+    def test_nested_stage_is_excluded(self):
+        metrics = PipelineMetrics()
+        with metrics.stage("produce"):
+            with metrics.stage("format"):
+                time.sleep(0.05)
+        assert metrics.stages["format"].wall_seconds >= 0.05
+        assert metrics.stages["produce"].wall_seconds < 0.05
+        assert [stage['name'] for stage in metrics.to_dict()['stages']] == ["produce", "format"]
+
+    def test_stage_recorded_on_error(self):
+        metrics = PipelineMetrics()
+        try:
+            with metrics.stage("validate"):
+                raise ValueError()
+        except ValueError:
+            pass
+        assert metrics.stages["validate"].calls == 1
+
+    def test_to_json(self):
+        metrics = PipelineMetrics()
+        with metrics.stage("config"):
+            pass
+        assert json.loads(metrics.to_json())['metrics']['stages'][0]['name'] == "config"
+
+
+def test_count_rows():
+    assert count_rows({"a": pd.DataFrame({"x": [1, 2]}), "b": pd.DataFrame({"x": [1]})}) == 3
+    assert count_rows([{}, {}]) == 2
+
+
+class TestMemoryMetrics:
+    def test_disabled_by_default(self, mocker):
+        mocker.patch.dict('os.environ', {}, clear=True)
+        metrics = PipelineMetrics()
+        with metrics.stage("format") as stage:
+            metrics.record_frames(stage, {"body": pd.DataFrame({"x": ["a"]})})
+        assert "memory" not in metrics.to_dict()['stages'][0]
+
+    def test_enabled_by_environment(self, mocker):
+        mocker.patch.dict('os.environ', {'memory_metrics': 'true'})
+        assert PipelineMetrics().memory
+
+    def test_stage_memory(self):
+        metrics = PipelineMetrics(memory=True)
+        try:
+            with metrics.stage("format") as stage:
+                frames = {"body": pd.DataFrame({"x": ["a" * 100] * 10000})}
+                metrics.record_frames(stage, frames)
+                buffer = bytearray(4 * 1024 * 1024)
+            with metrics.stage("produce"):
+                with metrics.stage("result_format"):
+                    data = [bytearray(1024 * 1024)]
+        finally:
+            tracemalloc.stop()
+        memory = metrics.stages["format"].memory
+        assert memory['frame_bytes']['body'] >= 100 * 10000
+        assert memory['traced_peak_bytes'] > 0
+        assert memory['peak_rss_bytes'] > 0
+        assert any("test_metrics.py" in site['site'] for site in memory['top_allocations'])
+        # Peak of a nested stage is part of the peak of the enclosing stage
+        assert metrics.stages["result_format"].memory['traced_peak_bytes'] >= 1024 * 1024
+        assert metrics.stages["produce"].memory['traced_peak_bytes'] >= 1024 * 1024
+        assert len(data) == len(buffer) // (4 * 1024 * 1024)
+
+    def test_tracing_stopped(self, mocker):
+        snapshot = mocker.spy(tracemalloc, 'take_snapshot')
+        metrics = PipelineMetrics(memory=True)
+        with metrics.stage("produce"):
+            for _ in range(3):
+                with metrics.stage("format"):
+                    assert tracemalloc.is_tracing()
+        assert not tracemalloc.is_tracing()
+        # Nested stages are not snapshot
+        assert snapshot.call_count == 2
+        assert 'top_allocations' in metrics.stages["produce"].memory
+        assert 'top_allocations' not in metrics.stages["format"].memory
+        assert metrics.stages["format"].memory['traced_peak_bytes'] > 0
+
+    def test_rss_per_run(self, mocker):
+        rss = mocker.patch('transformer.library.metrics.current_rss')
+        # A previous run of a warm process reached 900, this run stays below it
+        rss.side_effect = [100, 300, 500, 200]
+        metrics = PipelineMetrics(memory=True)
+        with metrics.stage("produce"):
+            with metrics.stage("result_format"):
+                pass
+        assert metrics.stages["result_format"].memory['peak_rss_bytes'] == 500
+        # Samples of nested stages are part of the enclosing stage
+        assert metrics.stages["produce"].memory['peak_rss_bytes'] == 500
+
+    def test_rss_unavailable(self, mocker):
+        mocker.patch('transformer.library.metrics.current_rss').return_value = None
+        metrics = PipelineMetrics(memory=True)
+        with metrics.stage("format"):
+            pass
+        assert 'peak_rss_bytes' not in metrics.stages["format"].memory
+        assert metrics.stages["format"].memory['traced_peak_bytes'] >= 0
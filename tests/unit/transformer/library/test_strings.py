@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from transformer.library.strings import ARROW_STRING, code_points, from_bytes, is_arrow_string
+
+
+class TestFromBytes:
+    def test_strings(self):
+        series = from_bytes(np.array([b"ab", b"", "é".encode()], dtype="S2"), index=pd.Index([3, 4, 5]))
+        assert is_arrow_string(series)
+        assert series.tolist() == ["ab", "", "é"]
+        assert series.index.tolist() == [3, 4, 5]
+
+    def test_empty(self):
+        assert from_bytes(np.array([], dtype="S0")).tolist() == []
+
+    def test_invalid_utf8(self):
+        with pytest.raises(ValueError):
+            from_bytes(np.array([b"\xff"], dtype="S1"))
+
+
+class TestCodePoints:
+    @pytest.mark.parametrize("dtype", [object, ARROW_STRING])
+    def test_matrix(self, dtype):
+        matrix, missing = code_points(pd.Series(["ab", None, "c"], dtype=dtype))
+        assert missing.tolist() == [False, True, False]
+        assert matrix[[0, 2], :2].tolist() == [[97, 98], [99, 0]]
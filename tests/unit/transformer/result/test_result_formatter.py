@@ -1,4 +1,5 @@
 import pandas as pd
+import pytest
 from transformer.result import ResultFormatterConfig, ResultFieldFormat, DefaultArrayResultFormatter
 
 
@@ -114,4 +115,27 @@ class TestResultFormatter:
             formats={}
         )
         results = DefaultArrayResultFormatter().run(cfg, dataframes)
-        print(results)
\ No newline at end of file
+        print(results)
+
+    @pytest.mark.parametrize("dtype", ["string[pyarrow]", "category"])
+    def test_arrow_strings(self, dtype):
+        # Dictionary encoded by the memory optimiser, Arrow strings are categoricals of Arrow strings
+        dataframes = {
+            "body": pd.DataFrame({
+                "field1": pd.Series(["a", None, "c"], dtype="string[pyarrow]").astype(dtype),
+                "field2": [1, 2, 3]
+            })
+        }
+        cfg = ResultFormatterConfig(
+            name="DefaultArrayResultFormatter",
+            formats={
+                "body": [
+                    ResultFieldFormat("one", "body.field1"),
+                    ResultFieldFormat("two", "body.field2"),
+                ]
+            }
+        )
+        results = DefaultArrayResultFormatter().run(cfg, dataframes)
+        assert [result['body'] for result in results] == [
+            {"one": "a", "two": 1}, {"one": None, "two": 2}, {"one": "c", "two": 3}
+        ]
@@ -1,5 +1,6 @@
 import pytest
 from transformer.result import result_producer, ResultProducerConfig
+from transformer.library.exceptions import InvalidConfigError
 from unittest import mock
 
 
@@ -38,6 +39,35 @@ class TestConsoleResultProducer:
         print(captured)
         assert len(captured.out.split("\n")) == 2
 
+    def test_chunks(self, pre_config, capsys):
+        config = ResultProducerConfig(pre_config)
+        producer = result_producer.ConsoleResultProducer(config)
+        producer.run_chunks(iter([[{"Field1": "One"}, {"Field1": "Two"}], [{"Field1": "Three"}]]))
+        captured = capsys.readouterr()
+        assert len(captured.out.split("\n")) == 4
+
+
+class TestLocalResultProducer:
+    @pytest.fixture
+    def pre_config(self, tmp_path):
+        return {
+            "result": {
+                "producer": {
+                    "name": "LocalResultProducer",
+                    "arguments": {
+                        "file_name": str(tmp_path / "results.jsonl")
+                    }
+                }
+            }
+        }
+
+    def test_chunks(self, pre_config):
+        config = ResultProducerConfig(pre_config)
+        producer = result_producer.LocalResultProducer(config)
+        producer.run_chunks(iter([[{"Field1": "One"}, {"Field1": "Two"}], [{"Field1": "Three"}]]))
+        with open(config.arguments['file_name']) as file:
+            assert file.read() == '{"Field1": "One"}\n{"Field1": "Two"}\n{"Field1": "Three"}\n'
+
 
 class TestS3ResultProducer:
     @pytest.fixture
@@ -55,10 +85,32 @@ class TestS3ResultProducer:
         }
 
     def test_produce_results(self, mocker, pre_config):
-        mocker.patch('transformer.library.aws_service.upload_s3_with_bytes')
+        upload = mocker.patch('transformer.library.aws_service.upload_s3_with_bytes')
         config = ResultProducerConfig(pre_config)
         producer = result_producer.S3ResultProducer(config)
         producer.run({"Field1": "Works"})
+        assert upload.call_args.kwargs['bytes'] == b'[{"Field1": "Works"}]'
+
+    @pytest.mark.parametrize("output_format", [None, "json", "jsonl"])
+    def test_same_format_in_chunks(self, mocker, pre_config, output_format):
+        if output_format:
+            pre_config['result']['producer']['arguments']['format'] = output_format
+        upload = mocker.patch('transformer.library.aws_service.upload_s3_with_bytes')
+        uploaded = []
+        mocker.patch('transformer.library.aws_service.upload_s3_fileobj',
+                     side_effect=lambda fileobj, bucket, s3_key: uploaded.append((fileobj.read(), bucket, s3_key)))
+        producer = result_producer.S3ResultProducer(ResultProducerConfig(pre_config))
+        producer.run([{"Field1": "One"}, {"Field1": "Two"}, {"Field1": "Three"}])
+        producer.run_chunks(iter([[{"Field1": "One"}, {"Field1": "Two"}], [{"Field1": "Three"}]]))
+        expected = b'{"Field1": "One"}\n{"Field1": "Two"}\n{"Field1": "Three"}\n' if output_format == "jsonl" \
+            else b'[{"Field1": "One"}, {"Field1": "Two"}, {"Field1": "Three"}]'
+        assert upload.call_args.kwargs['bytes'] == expected
+        assert uploaded == [(expected, "somebucket", "somekey.txt")]
+
+    def test_invalid_format(self, pre_config):
+        pre_config['result']['producer']['arguments']['format'] = "csv"
+        with pytest.raises(InvalidConfigError):
+            result_producer.S3ResultProducer(ResultProducerConfig(pre_config))
 
 
 # class TestMSKScramResultProducer:
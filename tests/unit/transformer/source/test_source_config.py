@@ -1,3 +1,7 @@
+import dataclasses
+import pytest
+
+from transformer.library import exceptions
 from transformer.source import source_config
 
 
@@ -145,3 +149,370 @@ class TestSourceMapperConfig:
         assert len(config.get_mappers()) == 1
         assert len(config.get_converters()) == 1
         assert len(config.get_validators()) == 2
+
+    def test_chunk_size(self):
+        config_dict = {
+            "chunk_size": 1000,
+            "source": {
+                "body": {
+                    "formatter": "BodySourceFormatter",
+                    "format": [{"name": "one", "spec": "0,5"}]
+                }
+            }
+        }
+        assert source_config.SourceMapperConfig(config_dict, "asd").chunk_size == 1000
+        del config_dict['chunk_size']
+        assert source_config.SourceMapperConfig(config_dict, "asd").chunk_size is None
+
+    def test_invalid_chunk_size(self):
+        config_dict = {
+            "chunk_size": 0,
+            "source": {
+                "body": {
+                    "formatter": "BodySourceFormatter",
+                    "format": [{"name": "one", "spec": "0,5"}]
+                }
+            }
+        }
+        with pytest.raises(exceptions.InvalidConfigError):
+            source_config.SourceMapperConfig(config_dict, "asd")
+
+    def test_reader(self):
+        config_dict = {
+            "source": {
+                "body": {
+                    "formatter": "BodySourceFormatter",
+                    "format": [{"name": "one", "spec": "0,5"}]
+                }
+            }
+        }
+        assert source_config.SourceMapperConfig(config_dict, "asd").reader.name == "LocalSourceReader"
+        config_dict['reader'] = "S3SourceReader"
+        assert source_config.SourceMapperConfig(config_dict, "asd").reader.name == "S3SourceReader"
+        config_dict['reader'] = {"name": "S3SourceReader", "arguments": {"read_ahead": 4}}
+        config = source_config.SourceMapperConfig(config_dict, "asd")
+        assert config.reader.name == "S3SourceReader"
+        assert config.reader.arguments == {"read_ahead": 4}
+
+    def test_download(self):
+        config_dict = {
+            "source": {
+                "body": {
+                    "formatter": "BodySourceFormatter",
+                    "format": [{"name": "one", "spec": "0,5"}]
+                }
+            }
+        }
+        assert source_config.SourceMapperConfig(config_dict, "asd").download == source_config.DownloadConfig()
+        config_dict['download'] = {"part_size": 1024, "max_workers": 4}
+        download = source_config.SourceMapperConfig(config_dict, "asd").download
+        assert (download.part_size, download.max_workers) == (1024, 4)
+
+    @pytest.mark.parametrize("download", [8, {"part_size": 0}, {"max_workers": "4"}, {"record_length": 11}])
+    def test_invalid_download(self, download):
+        config_dict = {
+            "download": download,
+            "source": {
+                "body": {
+                    "formatter": "BodySourceFormatter",
+                    "format": [{"name": "one", "spec": "0,5"}]
+                }
+            }
+        }
+        with pytest.raises(exceptions.InvalidConfigError):
+            source_config.SourceMapperConfig(config_dict, "asd")
+
+    def test_invalid_reader(self):
+        config_dict = {
+            "reader": {"arguments": {}},
+            "source": {
+                "body": {
+                    "formatter": "BodySourceFormatter",
+                    "format": [{"name": "one", "spec": "0,5"}]
+                }
+            }
+        }
+        with pytest.raises(exceptions.InvalidConfigError):
+            source_config.SourceMapperConfig(config_dict, "asd")
+
+    def test_parse_workers(self):
+        config_dict = {
+            "parse_workers": 4,
+            "source": {
+                "header": {
+                    "formatter": "HeaderSourceFormatter",
+                    "format": [{"name": "one", "spec": "0,5"}]
+                },
+                "body": {
+                    "formatter": "BodySourceFormatter",
+                    "format": [{"name": "one", "spec": "0,5"}]
+                }
+            }
+        }
+        assert [m.workers for m in source_config.SourceMapperConfig(config_dict, "asd").get_mappers()] == [4, 4]
+        config_dict['parse_workers'] = -1
+        with pytest.raises(exceptions.InvalidConfigError):
+            source_config.SourceMapperConfig(config_dict, "asd")
+
+    def test_compression(self):
+        config_dict = {
+            "source": {
+                "body": {
+                    "formatter": "BodySourceFormatter",
+                    "format": [{"name": "one", "spec": "0,5"}]
+                }
+            }
+        }
+        assert source_config.SourceMapperConfig(config_dict, "asd").compression == "auto"
+        config_dict['compression'] = "zstd"
+        assert source_config.SourceMapperConfig(config_dict, "asd").compression == "zstd"
+        config_dict['compression'] = "zip"
+        with pytest.raises(exceptions.InvalidConfigError):
+            source_config.SourceMapperConfig(config_dict, "asd")
+
+    def test_trim(self):
+        config_dict = {
+            "source": {
+                "body": {
+                    "formatter": "BodySourceFormatter",
+                    "format": [
+                        {"name": "one", "spec": "0,5"},
+                        {"name": "two", "spec": "5,10", "trim": "left"},
+                        {"name": "three", "spec": "10,15", "trim": {"side": "left", "characters": "0"}},
+                        {"name": "four", "spec": "15,20", "trim": False}
+                    ]
+                }
+            }
+        }
+        config = source_config.SourceMapperConfig(config_dict, "asd")
+        assert config.trim
+        assert not config.mappers[0].trim_on_parse
+        assert config.mappers[0].trims == (
+            source_config.TrimConfig(),
+            source_config.TrimConfig(side="left"),
+            source_config.TrimConfig(side="left", characters="0"),
+            None
+        )
+        config_dict['trim'] = "none"
+        config = source_config.SourceMapperConfig(config_dict, "asd")
+        assert not config.trim
+        assert config.mappers[0].trims[0] is None
+        assert config.mappers[0].trims[1] == source_config.TrimConfig(side="left")
+        config_dict['trim_on_parse'] = True
+        assert source_config.SourceMapperConfig(config_dict, "asd").mappers[0].trim_on_parse
+        config_dict['trim_on_parse'] = "yes"
+        with pytest.raises(exceptions.InvalidConfigError):
+            source_config.SourceMapperConfig(config_dict, "asd")
+
+    @pytest.mark.parametrize("trim", ["middle", 1, {"side": "up"}, {"characters": ""}])
+    def test_invalid_trim(self, trim):
+        config_dict = {
+            "source": {
+                "body": {
+                    "formatter": "BodySourceFormatter",
+                    "format": [{"name": "one", "spec": "0,5", "trim": trim}]
+                }
+            }
+        }
+        with pytest.raises(exceptions.InvalidConfigError):
+            source_config.SourceMapperConfig(config_dict, "asd")
+
+    def test_converter_arguments(self):
+        config_dict = {
+            "source": {
+                "body": {
+                    "formatter": "BodySourceFormatter",
+                    "format": [
+                        {"name": "one", "spec": "0,5", "converter": "NumberConverter"},
+                        {"name": "two", "spec": "5,14",
+                         "converter": {"name": "ImpliedDecimalConverter", "arguments": {"picture": "9(7)V99"}}}
+                    ]
+                }
+            }
+        }
+        config = source_config.SourceMapperConfig(config_dict, "asd")
+        assert config.get_converters()[0].arguments is None
+        assert config.get_converters()[1].name == "ImpliedDecimalConverter"
+        assert config.get_converters()[1].arguments == {"picture": "9(7)V99"}
+
+    @pytest.mark.parametrize("converter", [1, {"arguments": {}}, {"name": "DateConverter", "arguments": "%Y"}])
+    def test_invalid_converter(self, converter):
+        config_dict = {
+            "source": {
+                "body": {
+                    "formatter": "BodySourceFormatter",
+                    "format": [{"name": "one", "spec": "0,5", "converter": converter}]
+                }
+            }
+        }
+        with pytest.raises(exceptions.InvalidConfigError):
+            source_config.SourceMapperConfig(config_dict, "asd")
+
+    def test_optimise_memory(self):
+        config_dict = {
+            "optimise_memory": {"category_ratio": 0.1},
+            "source": {
+                "body": {
+                    "formatter": "BodySourceFormatter",
+                    "format": [{"name": "one", "spec": "0,5"}]
+                }
+            }
+        }
+        config = source_config.SourceMapperConfig(config_dict, "asd")
+        assert config.memory_optimiser.category_ratio == 0.1
+        config_dict['optimise_memory'] = True
+        assert source_config.SourceMapperConfig(config_dict, "asd").memory_optimiser.category_ratio == 0.5
+        config_dict['optimise_memory'] = False
+        assert source_config.SourceMapperConfig(config_dict, "asd").memory_optimiser is None
+
+    @pytest.mark.parametrize("optimise_memory", ["yes", {"category_ratio": 2}, {"category_ratio": True}])
+    def test_invalid_optimise_memory(self, optimise_memory):
+        config_dict = {
+            "optimise_memory": optimise_memory,
+            "source": {
+                "body": {
+                    "formatter": "BodySourceFormatter",
+                    "format": [{"name": "one", "spec": "0,5"}]
+                }
+            }
+        }
+        with pytest.raises(exceptions.InvalidConfigError):
+            source_config.SourceMapperConfig(config_dict, "asd")
+
+    def test_arrow_strings(self):
+        config_dict = {
+            "arrow_strings": True,
+            "source": {
+                "body": {
+                    "formatter": "BodySourceFormatter",
+                    "format": [{"name": "one", "spec": "0,5"}]
+                }
+            }
+        }
+        config = source_config.SourceMapperConfig(config_dict, "asd")
+        assert all(mapper.arrow_strings for mapper in config.mappers)
+        del config_dict['arrow_strings']
+        assert not source_config.SourceMapperConfig(config_dict, "asd").mappers[0].arrow_strings
+
+    def test_invalid_arrow_strings(self):
+        config_dict = {
+            "arrow_strings": "yes",
+            "source": {
+                "body": {
+                    "formatter": "BodySourceFormatter",
+                    "format": [{"name": "one", "spec": "0,5"}]
+                }
+            }
+        }
+        with pytest.raises(exceptions.InvalidConfigError):
+            source_config.SourceMapperConfig(config_dict, "asd")
+
+    def test_quarantine(self):
+        config_dict = {
+            "quarantine": {
+                "threshold": 0.01,
+                "producer": {"name": "LocalResultProducer", "arguments": {"file_name": "quarantine.jsonl"}}
+            },
+            "source": {
+                "body": {
+                    "formatter": "BodySourceFormatter",
+                    "format": [{"name": "one", "spec": "0,5"}]
+                }
+            }
+        }
+        config = source_config.SourceMapperConfig(config_dict, "asd")
+        assert config.quarantine.threshold == 0.01
+        assert config.quarantine.name == "LocalResultProducer"
+        assert config.quarantine.arguments == {"file_name": "quarantine.jsonl"}
+        del config_dict['quarantine']
+        assert source_config.SourceMapperConfig(config_dict, "asd").quarantine is None
+
+    @pytest.mark.parametrize("quarantine", [True, {"threshold": 1}, {"threshold": -1, "producer": {"name": "a"}}])
+    def test_invalid_quarantine(self, quarantine):
+        config_dict = {
+            "quarantine": quarantine,
+            "source": {
+                "body": {
+                    "formatter": "BodySourceFormatter",
+                    "format": [{"name": "one", "spec": "0,5"}]
+                }
+            }
+        }
+        with pytest.raises(exceptions.InvalidConfigError):
+            source_config.SourceMapperConfig(config_dict, "asd")
+
+
+class TestSourceLayout:
+    @pytest.fixture
+    def config_dict(self):
+        source_config.clear_layouts()
+        yield {
+            "pattern": "^somefile.txt$",
+            "source": {
+                "body": {
+                    "formatter": "BodySourceFormatter",
+                    "format": [
+                        {"name": "one", "spec": "0,5", "validators": [{"name": "NricValidator"}]},
+                        {"name": "two", "spec": "5,12", "converter": "NumberConverter"}
+                    ]
+                }
+            }
+        }
+        source_config.clear_layouts()
+
+    def test_layout(self, config_dict):
+        layout = source_config.SourceMapperConfig(config_dict, "asd").layout
+        assert layout.offsets['body'].tolist() == [0, 5]
+        assert layout.widths['body'].tolist() == [5, 7]
+        assert layout.mappers[0].offsets is layout.offsets['body']
+        assert layout.mappers[0].widths is layout.widths['body']
+        assert type(layout.validator_callables['NricValidator']).__name__ == "NricValidator"
+        assert type(layout.converter_callables['NumberConverter']).__name__ == "NumberConverter"
+        with pytest.raises(ValueError):
+            layout.offsets['body'][0] = 1
+
+    def test_cached_per_version(self, config_dict, mocker):
+        compile_spy = mocker.spy(source_config, '_compile')
+        first = source_config.SourceMapperConfig(config_dict, "a", version="v1")
+        second = source_config.SourceMapperConfig(config_dict, "b", version="v1")
+        assert first.layout is second.layout
+        assert second.file_name == "b"
+        assert source_config.SourceMapperConfig(config_dict, "c", version="v2").layout is not first.layout
+        config_dict['pattern'] = "^otherfile.txt$"
+        source_config.SourceMapperConfig(config_dict, "d", version="v1")
+        assert compile_spy.call_count == 3
+
+    def test_immutable(self, config_dict):
+        config_dict['reader'] = {"name": "S3SourceReader", "arguments": {"read_ahead": 4}}
+        config_dict['source']['body']['format'][0]['validators'][0]['arguments'] = {"values": ["A"]}
+        layout = source_config.SourceMapperConfig(config_dict, "a", version="v1").layout
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            layout.mappers[0].workers = 4
+        with pytest.raises(TypeError):
+            layout.reader.arguments['read_ahead'] = 8
+        with pytest.raises(AttributeError):
+            layout.mappers[0].names.append("three")
+        arguments = layout.validators[0].validators[0].arguments
+        assert arguments == {"values": ("A",)}
+        with pytest.raises(TypeError):
+            arguments['values'] = ["B"]
+        config_dict['source']['body']['format'][0]['validators'][0]['arguments']['values'].append("B")
+        assert source_config.SourceMapperConfig(config_dict, "b", version="v1").layout is layout
+        assert arguments == {"values": ("A",)}
+
+    def test_not_cached_without_version(self, config_dict, mocker):
+        compile_spy = mocker.spy(source_config, '_compile')
+        source_config.SourceMapperConfig(config_dict, "a")
+        source_config.SourceMapperConfig(config_dict, "a")
+        assert compile_spy.call_count == 2
+
+    def test_cache_size(self, config_dict, mocker):
+        mocker.patch.object(source_config, 'LAYOUT_CACHE_SIZE', 2)
+        layouts = [source_config.SourceMapperConfig(config_dict, "a", version=str(v)).layout for v in range(3)]
+        assert source_config.SourceMapperConfig(config_dict, "a", version="2").layout is layouts[2]
+        assert source_config.SourceMapperConfig(config_dict, "a", version="0").layout is not layouts[0]
+
+    def test_unknown_validator(self, config_dict):
+        config_dict['source']['body']['format'][0]['validators'][0]['name'] = "SomeValidator"
+        with pytest.raises(exceptions.InvalidConfigError):
+            source_config.SourceMapperConfig(config_dict, "asd")
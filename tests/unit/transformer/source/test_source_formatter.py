@@ -1,9 +1,13 @@
+import dataclasses
 import os
 import uuid
 from tests.test_helper import generate_fw_text_line, generate_file_data
 import pytest
 
-from transformer.source.source_formatter import HeaderSourceFormatter, BodySourceFormatter, FooterSourceFormatter, SourceFormatterConfig, BodyOnlySourceFormatter
+from transformer.source import source_formatter
+from transformer.source.source_config import TrimConfig
+from transformer.source.source_formatter import HeaderSourceFormatter, BodySourceFormatter, FooterSourceFormatter, SourceFormatterConfig, BodyOnlySourceFormatter, \
+    NumpyBodySourceFormatter, NumpyBodyOnlySourceFormatter, arrow_strings
 from transformer.library.exceptions import SourceFileError
 
 
@@ -250,4 +254,277 @@ class TestBodyOnlySourceFormatter:
             specs=[(0, 10), (10, 20)],
         )
         with pytest.raises(SourceFileError):
-            BodyOnlySourceFormatter().run(config, file_name)
\ No newline at end of file
+            BodyOnlySourceFormatter().run(config, file_name)
+
+
+class TestNumpyBodySourceFormatter:
+    @pytest.fixture(autouse=True)
+    def file_name(self):
+        source_file_name = f"fw_file-{uuid.uuid4().__str__()}.txt"
+        yield source_file_name
+        if os.path.exists(source_file_name):
+            os.remove(source_file_name)
+
+    @pytest.fixture
+    def config(self):
+        return SourceFormatterConfig(
+            name="NumpyBodySourceFormatter",
+            segment="body",
+            names=["field1", "field2", "field3"],
+            specs=[(0, 10), (10, 15), (50, 60)],
+        )
+
+    def test_success(self, file_name, config):
+        file_data = {
+            "header": {"values": [["HEADER"]], "spacing": [30]},
+            "body": {"values": [["X1", "X2"], ["Y1", "Y2"], ["Z1", "Z2"]], "spacing": [10, 5]},
+            "footer": {"values": [["FOOTER"]], "spacing": [8]}
+        }
+        generate_file_data(file_name, file_data)
+        df = NumpyBodySourceFormatter().run(config, file_name)
+        assert list(df['field1']) == ["X1        ", "Y1        ", "Z1        "]
+        assert list(df['field2']) == ["X2   ", "Y2   ", "Z2   "]
+        assert df['field3'].isnull().all()
+
+    def test_same_as_body_source_formatter(self, file_name, config):
+        with open(file_name, 'w') as file:
+            file.write("HEADER\r\n")
+            file.write("ABCDEFGHIJ 1 2      \r\n")
+            file.write("   ABCDEFG  3     4 \r\n")
+            file.write("FOOTER\r\n")
+        config = dataclasses.replace(config, specs=[(0, 3), (3, 11), (11, 20)])
+        expected = BodySourceFormatter().run(config, file_name)
+        assert NumpyBodySourceFormatter().run(config, file_name).equals(expected)
+
+    def test_variable_length_records(self, file_name, config):
+        file_data = {
+            "header": {"values": [["HEADER"]], "spacing": [30]},
+            "body": {"values": [["X1"], ["Y1234"]], "spacing": [3]},
+            "footer": {"values": [["FOOTER"]], "spacing": [8]}
+        }
+        generate_file_data(file_name, file_data)
+        with pytest.raises(SourceFileError):
+            NumpyBodySourceFormatter().run(config, file_name)
+
+    def test_empty_file(self, file_name, config):
+        with open(file_name, 'w'):
+            pass
+        with pytest.raises(SourceFileError):
+            NumpyBodySourceFormatter().run(config, file_name)
+
+    def test_missing_file(self, file_name, config):
+        with pytest.raises(SourceFileError):
+            NumpyBodySourceFormatter().run(config, file_name)
+
+
+class TestNumpyBodyOnlySourceFormatter:
+    @pytest.fixture(autouse=True)
+    def file_name(self):
+        source_file_name = f"fw_file-{uuid.uuid4().__str__()}.txt"
+        yield source_file_name
+        if os.path.exists(source_file_name):
+            os.remove(source_file_name)
+
+    def test_success(self, file_name):
+        config = SourceFormatterConfig(
+            name="NumpyBodyOnlySourceFormatter",
+            segment="body",
+            names=["field1", "field2"],
+            specs=[(0, 10), (10, 20)],
+        )
+        with open(file_name, 'w') as file:
+            file.write(generate_fw_text_line(["X1", "X2"], [10, 10]) + "\n")
+            file.write(generate_fw_text_line(["Y1", "Y2"], [10, 10]))
+        df = NumpyBodyOnlySourceFormatter().run(config, file_name)
+        assert list(df['field2']) == ["X2        ", "Y2        "]
+
+    def test_misaligned_lines(self, file_name):
+        config = SourceFormatterConfig(name="NumpyBodyOnlySourceFormatter", segment="body", names=["field1"],
+                                       specs=[(0, 4)])
+        with open(file_name, 'wb') as file:
+            file.write(b"abcd\na\nbc\nabcd\n")
+        with pytest.raises(SourceFileError):
+            NumpyBodyOnlySourceFormatter().run(config, file_name)
+
+    @pytest.mark.parametrize("arrow_strings", [False, True])
+    def test_invalid_utf8(self, file_name, arrow_strings):
+        config = SourceFormatterConfig(name="NumpyBodyOnlySourceFormatter", segment="body", names=["field1"],
+                                       specs=[(0, 4)], arrow_strings=arrow_strings)
+        with open(file_name, 'wb') as file:
+            file.write(b"abcd\nab\xffd\n")
+        with pytest.raises(SourceFileError):
+            NumpyBodyOnlySourceFormatter().run(config, file_name)
+
+
+class TestTrim:
+    @pytest.fixture(autouse=True)
+    def file_name(self):
+        source_file_name = f"fw_file-{uuid.uuid4().__str__()}.txt"
+        with open(source_file_name, 'w') as file:
+            file.write("HEADER\n")
+            file.write("  X1  00120 ab--\n")
+            file.write(" Y1   00003 cd- \n")
+            file.write("FOOTER\n")
+        yield source_file_name
+        if os.path.exists(source_file_name):
+            os.remove(source_file_name)
+
+    @pytest.mark.parametrize("formatter", [BodySourceFormatter, NumpyBodySourceFormatter])
+    def test_trim(self, file_name, formatter):
+        config = SourceFormatterConfig(
+            name=formatter.__name__,
+            segment="body",
+            names=["both", "left", "zeros", "right", "none"],
+            specs=[(0, 6), (0, 6), (6, 11), (11, 16), (0, 6)],
+            trims=[TrimConfig(), TrimConfig(side="left"), TrimConfig(side="left", characters="0"),
+                   TrimConfig(side="right", characters="- "), None],
+            trim_on_parse=True
+        )
+        df = formatter().run(config, file_name)
+        assert list(df['both']) == ["X1", "Y1"]
+        assert list(df['left']) == ["X1  ", "Y1   "]
+        assert list(df['zeros']) == ["120", "3"]
+        assert list(df['right']) == [" ab", " cd"]
+        assert list(df['none']) == ["  X1  ", " Y1   "]
+
+    @pytest.mark.parametrize("formatter", [BodySourceFormatter, NumpyBodySourceFormatter])
+    def test_untrimmed(self, file_name, formatter):
+        config = SourceFormatterConfig(
+            name=formatter.__name__,
+            segment="body",
+            names=["both", "zeros"],
+            specs=[(0, 6), (6, 11)],
+            trims=[TrimConfig(), TrimConfig(side="left", characters="0")]
+        )
+        df = formatter().run(config, file_name)
+        assert list(df['both']) == ["  X1  ", " Y1   "]
+        assert list(df['zeros']) == ["00120", "00003"]
+
+
+class TestArrowStrings:
+    @pytest.fixture(autouse=True)
+    def file_name(self):
+        source_file_name = f"fw_file-{uuid.uuid4().__str__()}.txt"
+        with open(source_file_name, 'w', encoding='utf-8') as file:
+            file.write("HEADER\n")
+            file.write("  X1  00120 aé--\n")
+            file.write(" Y1   00003 cé- \n")
+            file.write("FOOTER\n")
+        yield source_file_name
+        if os.path.exists(source_file_name):
+            os.remove(source_file_name)
+
+    @pytest.fixture
+    def config(self):
+        return SourceFormatterConfig(
+            name="NumpyBodySourceFormatter",
+            segment="body",
+            names=["both", "zeros", "right", "none"],
+            specs=[(0, 6), (6, 11), (11, 17), (0, 6)],
+            trims=[TrimConfig(), TrimConfig(side="left", characters="0"), TrimConfig(side="right", characters="- "),
+                   None],
+            trim_on_parse=True,
+            arrow_strings=True
+        )
+
+    def test_from_bytes(self, file_name, config):
+        df = NumpyBodySourceFormatter().run(config, file_name)
+        assert all(dtype == "string[pyarrow]" for dtype in df.dtypes)
+        assert list(df['both']) == ["X1", "Y1"]
+        assert list(df['zeros']) == ["120", "3"]
+        assert list(df['right']) == [" aé", " cé"]
+        assert list(df['none']) == ["  X1  ", " Y1   "]
+
+    def test_same_as_objects(self, file_name, config):
+        arrow = NumpyBodySourceFormatter().run(config, file_name)
+        config = dataclasses.replace(config, arrow_strings=False)
+        expected = NumpyBodySourceFormatter().run(config, file_name)
+        assert arrow.astype(object).equals(expected)
+        assert arrow_strings(BodySourceFormatter().run(config, file_name)).equals(arrow)
+
+
+class TestParallelParsing:
+    @pytest.fixture(autouse=True)
+    def file_name(self):
+        source_file_name = f"fw_file-{uuid.uuid4().__str__()}.txt"
+        yield source_file_name
+        if os.path.exists(source_file_name):
+            os.remove(source_file_name)
+
+    @pytest.fixture(autouse=True)
+    def parallel_min_bytes(self, mocker):
+        mocker.patch('transformer.source.source_formatter.PARALLEL_MIN_BYTES', 0)
+        mocker.patch('os.cpu_count', return_value=8)
+
+    @pytest.fixture
+    def file_data(self, file_name):
+        file_data = {
+            "header": {"values": [["HEADER"]], "spacing": [10]},
+            "body": {"values": [[f"A{i}", f"B{i}"] for i in range(101)], "spacing": [10, 10]},
+            "footer": {"values": [["FOOTER"]], "spacing": [10]}
+        }
+        generate_file_data(file_name, file_data)
+        return file_data
+
+    @pytest.mark.parametrize("formatter", [BodySourceFormatter, NumpyBodySourceFormatter])
+    def test_same_as_serial(self, file_name, file_data, formatter):
+        config = SourceFormatterConfig(
+            name=formatter.__name__,
+            segment="body",
+            names=["field1", "field2"],
+            specs=[(0, 10), (10, 20)],
+        )
+        expected = formatter().run(config, file_name)
+        config = dataclasses.replace(config, workers=3)
+        df = formatter().run(config, file_name)
+        assert len(df.index) == 101
+        assert df.equals(expected)
+
+    def test_spawned_workers(self, file_name, file_data, mocker):
+        mocker.patch('multiprocessing.get_all_start_methods', return_value=["spawn"])
+        config = SourceFormatterConfig(
+            name="NumpyBodySourceFormatter",
+            segment="body",
+            names=["field1", "field2"],
+            specs=[(0, 10), (10, 20)],
+        )
+        expected = NumpyBodySourceFormatter().run(config, file_name)
+        config = dataclasses.replace(config, workers=3)
+        assert NumpyBodySourceFormatter().run(config, file_name).equals(expected)
+
+    def test_workers_capped_by_cpus(self, file_name, file_data, mocker):
+        mocker.patch('os.cpu_count', return_value=2)
+        line_ranges = mocker.spy(source_formatter, '_line_ranges')
+        config = SourceFormatterConfig(
+            name="NumpyBodySourceFormatter",
+            segment="body",
+            names=["field1", "field2"],
+            specs=[(0, 10), (10, 20)],
+            workers=16
+        )
+        assert len(NumpyBodySourceFormatter().run(config, file_name).index) == 101
+        assert line_ranges.call_args.args[1] == 2
+
+    def test_body_only(self, file_name, file_data):
+        config = SourceFormatterConfig(
+            name="BodyOnlySourceFormatter",
+            segment="body",
+            names=["field1"],
+            specs=[(0, 10)],
+            workers=4
+        )
+        df = BodyOnlySourceFormatter().run(config, file_name)
+        assert list(df['field1']) == ["HEADER    "] + [f"A{i}".ljust(10) for i in range(101)] + ["FOOTER    "]
+
+    def test_worker_error(self, file_name):
+        with open(file_name, 'w') as file:
+            file.write("HEADER\n" + "A" * 20 + "\n" + "B" * 10 + "\n" + "C" * 20 + "\n" + "FOOTER\n")
+        config = SourceFormatterConfig(
+            name="NumpyBodySourceFormatter",
+            segment="body",
+            names=["field1"],
+            specs=[(0, 10)],
+            workers=3
+        )
+        with pytest.raises(SourceFileError):
+            NumpyBodySourceFormatter().run(config, file_name)
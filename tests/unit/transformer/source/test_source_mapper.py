@@ -1,5 +1,14 @@
 from transformer.source import SourceMapperConfig, SourceMapper, SourceFormatterConfig
+from transformer.library.exceptions import ValidationFailureError, SourceFileError
+from transformer.library.metrics import PipelineMetrics
+from transformer.library.strings import arrow_array
+from transformer.source import source_formatter, source_reader
+from transformer.source.memory_optimiser import MemoryOptimiser, MemoryOptimiserConfig
 from tests.test_helper import generate_fw_text_line, generate_file_data
+import dataclasses
+import gzip
+import numpy as np
+import pandas as pd
 import pytest
 import os
 import uuid
@@ -97,3 +106,383 @@ class TestSourceMapper:
         for df in dataframes:
             assert len(dataframes[df].index) == len(file_data[df]['values'])
         assert isinstance(dataframes['body']['two'][0].item(), int)
+
+    def test_source_file_read_once(self, file_name, mocker):
+        config_dict = {
+            "source": {
+                "header": {
+                    "formatter": "HeaderSourceFormatter",
+                    "format": [{"name": "field1", "spec": "0,4"}]
+                },
+                "body": {
+                    "formatter": "BodySourceFormatter",
+                    "format": [{"name": "field1", "spec": "0,4"}]
+                },
+                "footer": {
+                    "formatter": "FooterSourceFormatter",
+                    "format": [{"name": "field1", "spec": "0,4"}]
+                }
+            }
+        }
+        file_data = {
+            "header": {"values": [["HD"]], "spacing": [4]},
+            "body": {"values": [["B1"], ["B2"], ["B3"]], "spacing": [4]},
+            "footer": {"values": [["FT"]], "spacing": [4]}
+        }
+        generate_file_data(file_name, file_data)
+        spy = mocker.spy(source_reader, 'read_segments')
+
+        dataframes = SourceMapper().run(SourceMapperConfig(config_dict, file_name))
+        assert spy.call_count == 1
+        assert list(dataframes['header']['field1']) == ["HD"]
+        assert list(dataframes['body']['field1']) == ["B1", "B2", "B3"]
+        assert list(dataframes['footer']['field1']) == ["FT"]
+
+    def test_trim_after_parse(self, file_name, mocker):
+        config_dict = {
+            "source": {
+                "body": {
+                    "formatter": "BodyOnlySourceFormatter",
+                    "format": [
+                        {"name": "field1", "spec": "0,6"},
+                        {"name": "field2", "spec": "6,12", "trim": {"side": "left", "characters": "0"}},
+                        {"name": "field3", "spec": "0,6", "trim": False}
+                    ]
+                }
+            }
+        }
+        with open(file_name, 'w') as file:
+            file.write(" B1   000120\n")
+            file.write(" B2   000003\n")
+
+
+        class UntrimmedSourceFormatter(source_formatter.BodyOnlySourceFormatter):
+            trims_on_parse = False
+
+            def format(self, config, segments):
+                return super().format(dataclasses.replace(config, trims=None), segments)
+
+        mocker.patch.object(source_formatter, 'UntrimmedSourceFormatter', UntrimmedSourceFormatter, create=True)
+        config_dict['source']['body']['formatter'] = "UntrimmedSourceFormatter"
+
+        dataframes = SourceMapper().run(SourceMapperConfig(config_dict, file_name))
+        assert list(dataframes['body']['field1']) == ["B1", "B2"]
+        assert list(dataframes['body']['field2']) == ["120", "3"]
+        assert list(dataframes['body']['field3']) == [" B1   ", " B2   "]
+
+    @pytest.mark.parametrize("trim_on_parse, pattern", [(False, "^ B[12] {3}$"), (True, "^B[12]$")])
+    def test_trim_on_parse(self, file_name, trim_on_parse, pattern):
+        config_dict = {
+            "trim_on_parse": trim_on_parse,
+            "source": {
+                "body": {
+                    "formatter": "NumpyBodyOnlySourceFormatter",
+                    "format": [
+                        {"name": "field1", "spec": "0,6",
+                         "validators": [{"name": "RegexValidator", "arguments": {"pattern": pattern}}]}
+                    ]
+                }
+            }
+        }
+        with open(file_name, 'w') as file:
+            file.write(" B1   \n")
+            file.write(" B2   \n")
+
+        metrics = PipelineMetrics()
+        dataframes = SourceMapper().run(SourceMapperConfig(config_dict, file_name), metrics)
+        assert list(dataframes['body']['field1']) == ["B1", "B2"]
+        assert ("trim" in metrics.stages) != trim_on_parse
+
+
+class TestSourceMapperChunks:
+    @pytest.fixture
+    def file_name(self):
+        source_file_name = f"fw_file-{uuid.uuid4().__str__()}.txt"
+        yield source_file_name
+        if os.path.exists(source_file_name):
+            os.remove(source_file_name)
+
+    @pytest.fixture
+    def config_dict(self):
+        return {
+            "chunk_size": 2,
+            "source": {
+                "header": {
+                    "formatter": "HeaderSourceFormatter",
+                    "format": [{"name": "field1", "spec": "0,4"}]
+                },
+                "body": {
+                    "formatter": "BodySourceFormatter",
+                    "format": [
+                        {
+                            "name": "field1",
+                            "spec": "0,4",
+                            "converter": "NumberConverter",
+                            "validators": [
+                                {
+                                    "name": "RefValidator",
+                                    "arguments": {"type": "count", "ref": "footer.recordCount"}
+                                }
+                            ]
+                        }
+                    ]
+                },
+                "footer": {
+                    "formatter": "FooterSourceFormatter",
+                    "format": [{"name": "recordCount", "spec": "0,4"}]
+                }
+            }
+        }
+
+    def test_same_as_run(self, file_name, config_dict):
+        generate_file_data(file_name, {
+            "header": {"values": [["HD"]], "spacing": [4]},
+            "body": {"values": [["1"], ["2"], ["3"], ["4"], ["5"]], "spacing": [4]},
+            "footer": {"values": [["5"]], "spacing": [4]}
+        })
+        config = SourceMapperConfig(config_dict, file_name)
+        chunks = list(SourceMapper().run_chunks(config))
+        expected = SourceMapper().run(config)
+
+        assert [len(c['body'].index) for c in chunks] == [2, 2, 1]
+        assert list(chunks[0].keys()) == list(expected.keys())
+        assert pd.concat([c['body'] for c in chunks], ignore_index=True).equals(expected['body'])
+        for chunk in chunks:
+            assert chunk['header'].equals(expected['header'])
+            assert chunk['footer'].equals(expected['footer'])
+
+    def test_count_across_chunks_failure(self, file_name, config_dict):
+        generate_file_data(file_name, {
+            "header": {"values": [["HD"]], "spacing": [4]},
+            "body": {"values": [["1"], ["2"], ["3"]], "spacing": [4]},
+            "footer": {"values": [["2"]], "spacing": [4]}
+        })
+        config = SourceMapperConfig(config_dict, file_name)
+        metrics = PipelineMetrics()
+        chunks = SourceMapper().run_chunks(config, metrics=metrics)
+        # Body lines are counted up front, so the count fails before the first chunk is yielded
+        with pytest.raises(ValidationFailureError):
+            next(chunks)
+        assert {s['name']: s['rows_out'] for s in metrics.to_dict()['stages']}['count'] == 3
+
+    def test_chunk_validation_failure(self, file_name, config_dict):
+        config_dict['source']['body']['format'][0]['validators'].append(
+            {"name": "RegexValidator", "arguments": {"pattern": r"^\d\s*$"}}
+        )
+        generate_file_data(file_name, {
+            "header": {"values": [["HD"]], "spacing": [4]},
+            "body": {"values": [["1"], ["2"], ["X"]], "spacing": [4]},
+            "footer": {"values": [["3"]], "spacing": [4]}
+        })
+        config = SourceMapperConfig(config_dict, file_name)
+        chunks = SourceMapper().run_chunks(config)
+        assert len(next(chunks)['body'].index) == 2
+        with pytest.raises(ValidationFailureError):
+            next(chunks)
+
+    def test_empty_body(self, file_name, config_dict):
+        generate_file_data(file_name, {
+            "header": {"values": [["HD"]], "spacing": [4]},
+            "footer": {"values": [["0"]], "spacing": [4]}
+        })
+        config = SourceMapperConfig(config_dict, file_name)
+        with pytest.raises(SourceFileError):
+            list(SourceMapper().run_chunks(config))
+
+    def test_gzip_source(self, file_name, config_dict):
+        generate_file_data(file_name, {
+            "header": {"values": [["HD"]], "spacing": [4]},
+            "body": {"values": [["1"], ["2"], ["3"]], "spacing": [4]},
+            "footer": {"values": [["3"]], "spacing": [4]}
+        })
+        with open(file_name, 'rb') as source, gzip.open(file_name + ".gz", 'wb') as target:
+            target.write(source.read())
+        try:
+            config = SourceMapperConfig(config_dict, file_name + ".gz")
+            chunks = list(SourceMapper().run_chunks(config))
+            assert pd.concat([c['body'] for c in chunks])['field1'].tolist() == [1, 2, 3]
+        finally:
+            os.remove(file_name + ".gz")
+
+
+class TestSourceMapperQuarantine:
+    @pytest.fixture
+    def file_name(self):
+        source_file_name = f"fw_file-{uuid.uuid4().__str__()}.txt"
+        generate_file_data(source_file_name, {
+            "header": {"values": [["HD"]], "spacing": [4]},
+            "body": {"values": [["1"], ["X"], ["3"], ["Y"], ["5"]], "spacing": [4]},
+            "footer": {"values": [["5"]], "spacing": [4]}
+        })
+        yield source_file_name
+        if os.path.exists(source_file_name):
+            os.remove(source_file_name)
+
+    @pytest.fixture
+    def config_dict(self):
+        return {
+            "quarantine": {"threshold": 2, "producer": {"name": "ConsoleResultProducer"}},
+            "source": {
+                "header": {
+                    "formatter": "HeaderSourceFormatter",
+                    "format": [{"name": "field1", "spec": "0,4"}]
+                },
+                "body": {
+                    "formatter": "BodySourceFormatter",
+                    "format": [
+                        {
+                            "name": "field1",
+                            "spec": "0,4",
+                            "converter": "NumberConverter",
+                            "validators": [
+                                {"name": "RegexValidator", "arguments": {"pattern": r"^\d\s*$"}},
+                                {"name": "RefValidator", "arguments": {"type": "count", "ref": "footer.recordCount"}}
+                            ]
+                        }
+                    ]
+                },
+                "footer": {
+                    "formatter": "FooterSourceFormatter",
+                    "format": [{"name": "recordCount", "spec": "0,4"}]
+                }
+            }
+        }
+
+    @pytest.mark.parametrize("formatter", ["BodySourceFormatter", "NumpyBodySourceFormatter"])
+    def test_run(self, file_name, config_dict, formatter):
+        config_dict['source']['body']['formatter'] = formatter
+        mapper = SourceMapper()
+        dataframes = mapper.run(SourceMapperConfig(config_dict, file_name))
+        assert dataframes['body']['field1'].tolist() == [1, 3, 5]
+        assert [(r['row'], r['line'], r['reasons']) for r in mapper.quarantine.records] == [
+            (1, "X   ", ["field1.RegexValidator"]),
+            (3, "Y   ", ["field1.RegexValidator"])
+        ]
+
+    def test_blank_lines(self, file_name, config_dict):
+        with open(file_name, 'wb') as file:
+            file.write(b"HD  \r\n1   \r\n\r\nX   \r\n   \r\n3   \r\n3   \r\n")
+        config_dict['quarantine']['threshold'] = 1
+        mapper = SourceMapper()
+        dataframes = mapper.run(SourceMapperConfig(config_dict, file_name))
+        assert dataframes['body']['field1'].tolist() == [1, 3]
+        assert [(r['row'], r['line']) for r in mapper.quarantine.records] == [(1, "X   ")]
+
+    def test_chunks(self, file_name, config_dict):
+        config_dict['chunk_size'] = 2
+        mapper = SourceMapper()
+        chunks = list(mapper.run_chunks(SourceMapperConfig(config_dict, file_name)))
+        assert pd.concat([c['body'] for c in chunks])['field1'].tolist() == [1, 3, 5]
+        assert [r['row'] for r in mapper.quarantine.records] == [1, 3]
+
+    def test_threshold(self, file_name, config_dict):
+        config_dict['quarantine']['threshold'] = 1
+        with pytest.raises(ValidationFailureError):
+            SourceMapper().run(SourceMapperConfig(config_dict, file_name))
+
+    def test_fraction_threshold(self, file_name, config_dict):
+        config_dict['quarantine']['threshold'] = 0.3
+        config_dict['chunk_size'] = 2
+        chunks = SourceMapper().run_chunks(SourceMapperConfig(config_dict, file_name))
+        # 1 of 5 rows is below the threshold, the second quarantined row fails the file at the second chunk
+        next(chunks)
+        with pytest.raises(ValidationFailureError):
+            next(chunks)
+        config_dict['quarantine']['threshold'] = 0.4
+        assert len(list(SourceMapper().run_chunks(SourceMapperConfig(config_dict, file_name)))) == 3
+
+    def test_header_failure(self, file_name, config_dict):
+        config_dict['source']['header']['format'][0]['validators'] = [
+            {"name": "RegexValidator", "arguments": {"pattern": r"^\d\s*$"}}
+        ]
+        with pytest.raises(ValidationFailureError):
+            SourceMapper().run(SourceMapperConfig(config_dict, file_name))
+
+
+class TestSourceMapperMemoryOptimiser:
+    @pytest.fixture
+    def file_name(self):
+        source_file_name = f"fw_file-{uuid.uuid4().__str__()}.txt"
+        generate_file_data(source_file_name, {
+            "body": {"values": [[str(i % 100), ["SG", "MY"][i % 2], f"ID{i}"] for i in range(1000)],
+                     "spacing": [4, 2, 6]}
+        })
+        yield source_file_name
+        if os.path.exists(source_file_name):
+            os.remove(source_file_name)
+
+    @pytest.fixture
+    def config_dict(self):
+        return {
+            "optimise_memory": True,
+            "source": {
+                "body": {
+                    "formatter": "BodyOnlySourceFormatter",
+                    "format": [
+                        {"name": "amount", "spec": "0,4", "converter": "NumberConverter"},
+                        {"name": "country", "spec": "4,6"},
+                        {"name": "id", "spec": "6,12"}
+                    ]
+                }
+            }
+        }
+
+    def test_run(self, file_name, config_dict):
+        mapper = SourceMapper()
+        dataframes = mapper.run(SourceMapperConfig(config_dict, file_name))
+        body = dataframes['body']
+        assert body['amount'].dtype == "int8"
+        assert body['country'].dtype == "category"
+        assert body['id'].dtype == object
+        assert body['country'].tolist()[:3] == ["SG", "MY", "SG"]
+        report = mapper.memory_optimiser.report['body']
+        assert report.columns == {"amount": "int8", "country": "category"}
+        assert report.bytes_after == body.memory_usage(deep=True).sum()
+        assert report.saved > 0
+
+    def test_chunks(self, file_name, config_dict):
+        config_dict['chunk_size'] = 400
+        mapper = SourceMapper()
+        chunks = list(mapper.run_chunks(SourceMapperConfig(config_dict, file_name)))
+        assert [c['body']['country'].dtype for c in chunks] == ["category"] * 3
+        assert mapper.memory_optimiser.report['body'].bytes_after == \
+               sum(c['body'].memory_usage(deep=True).sum() for c in chunks)
+
+    def test_disabled(self, file_name, config_dict):
+        del config_dict['optimise_memory']
+        mapper = SourceMapper()
+        assert mapper.run(SourceMapperConfig(config_dict, file_name))['body']['country'].dtype == object
+        assert mapper.memory_optimiser is None
+
+
+class TestMemoryOptimiser:
+    def test_floats(self):
+        frame = pd.DataFrame({"exact": [0.5, 1.25, np.nan] * 100, "inexact": [0.1, 0.5, 1.0] * 100})
+        optimised = MemoryOptimiser(MemoryOptimiserConfig()).optimise("body", frame)
+        assert optimised['exact'].dtype == np.float32
+        assert optimised['inexact'].dtype == np.float64
+        assert optimised['inexact'].tolist() == frame['inexact'].tolist()
+
+    def test_category_ratio(self):
+        frame = pd.DataFrame({"code": [f"C{i % 40}" for i in range(100)]})
+        assert MemoryOptimiser(MemoryOptimiserConfig(category_ratio=0.5)).optimise("body", frame)['code'].dtype \
+               == "category"
+        assert MemoryOptimiser(MemoryOptimiserConfig(category_ratio=0.2)).optimise("body", frame)['code'].dtype \
+               == object
+        assert MemoryOptimiser(MemoryOptimiserConfig(category_ratio=0)).optimise("body", frame)['code'].dtype \
+               == object
+
+    def test_small_columns_kept(self):
+        frame = pd.DataFrame({"code": ["A", "A", "B"]})
+        optimiser = MemoryOptimiser(MemoryOptimiserConfig())
+        assert optimiser.optimise("body", frame) is frame
+        assert optimiser.report['body'].saved == 0
+
+    def test_arrow_strings(self):
+        frame = pd.DataFrame({"code": [f"BRANCH{i % 40}" for i in range(999)] + [None]}, dtype="string[pyarrow]")
+        optimiser = MemoryOptimiser(MemoryOptimiserConfig())
+        optimised = optimiser.optimise("body", frame)
+        assert optimised['code'].dtype == "category"
+        assert optimised['code'].cat.categories.dtype == "string[pyarrow]"
+        assert optimiser.report['body'].saved > 0
+        assert arrow_array(optimised['code']).to_pylist() == arrow_array(frame['code']).to_pylist()
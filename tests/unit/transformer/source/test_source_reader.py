@@ -0,0 +1,298 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+import uuid
+
+import pytest
+
+from tests.test_helper import generate_file_data
+from transformer.library.exceptions import SourceFileError, InvalidConfigError
+from transformer.source import source_reader
+
+
+class TestSplitSegments:
+    def test_header_body_footer(self):
+        segments = source_reader.split_segments(b"HEAD\nB1\nB2\nFOOT\n", "test")
+        assert bytes(segments.header()) == b"HEAD\n"
+        assert bytes(segments.body()) == b"B1\nB2\n"
+        assert bytes(segments.footer()) == b"FOOT\n"
+        assert bytes(segments.all()) == b"HEAD\nB1\nB2\nFOOT\n"
+
+    def test_without_trailing_newline(self):
+        segments = source_reader.split_segments(b"HEAD\nB1\nFOOT", "test")
+        assert bytes(segments.body()) == b"B1\n"
+        assert bytes(segments.footer()) == b"FOOT"
+
+    def test_trailing_blank_lines(self):
+        segments = source_reader.split_segments(b"HEAD\nB1\nFOOT\r\n\r\n", "test")
+        assert bytes(segments.body()) == b"B1\n"
+        assert bytes(segments.footer()).strip() == b"FOOT"
+
+    def test_single_line(self):
+        segments = source_reader.split_segments(b"ONLY\n", "test")
+        assert bytes(segments.header()) == b"ONLY\n"
+        assert bytes(segments.footer()) == b"ONLY\n"
+        assert len(segments.body()) == 0
+
+    def test_empty(self):
+        segments = source_reader.split_segments(b"", "test")
+        assert len(segments.header()) == 0
+        assert len(segments.body()) == 0
+        assert len(segments.footer()) == 0
+
+
+class TestReadSegments:
+    @pytest.fixture
+    def file_name(self):
+        source_file_name = f"fw_file-{uuid.uuid4().__str__()}.txt"
+        yield source_file_name
+        if os.path.exists(source_file_name):
+            os.remove(source_file_name)
+
+    def test_read(self, file_name):
+        generate_file_data(file_name, {
+            "header": {"values": [["H"]], "spacing": [5]},
+            "body": {"values": [["B1"], ["B2"]], "spacing": [5]},
+            "footer": {"values": [["F"]], "spacing": [5]}
+        })
+        segments = source_reader.read_segments(file_name)
+        assert segments.file_name == file_name
+        assert bytes(segments.body()) == b"B1   \nB2   \n"
+
+    def test_missing_file(self, file_name):
+        with pytest.raises(SourceFileError):
+            source_reader.read_segments(file_name)
+
+
+class TestReadEdges:
+    @pytest.fixture
+    def file_name(self):
+        source_file_name = f"fw_file-{uuid.uuid4().__str__()}.txt"
+        yield source_file_name
+        if os.path.exists(source_file_name):
+            os.remove(source_file_name)
+
+    def test_edges(self, file_name):
+        with open(file_name, 'wb') as file:
+            file.write(b"HEAD\nB1\nB2\nFOOT\n\n")
+        segments = source_reader.read_edges(file_name)
+        assert bytes(segments.header()) == b"HEAD\n"
+        assert bytes(segments.footer()).strip() == b"FOOT"
+        assert len(segments.body()) == 0
+
+    def test_missing_file(self, file_name):
+        with pytest.raises(SourceFileError):
+            source_reader.read_edges(file_name)
+
+
+class TestIterChunks:
+    @pytest.fixture
+    def file_name(self):
+        source_file_name = f"fw_file-{uuid.uuid4().__str__()}.txt"
+        with open(source_file_name, 'wb') as file:
+            file.write(b"HEAD\nB1\nB2\nB3\nB4\nB5\nFOOT\n")
+        yield source_file_name
+        if os.path.exists(source_file_name):
+            os.remove(source_file_name)
+
+    def test_body(self, file_name):
+        chunks = [bytes(c.body()) for c in source_reader.iter_chunks(file_name, 2)]
+        assert chunks == [b"B1\nB2\n", b"B3\nB4\n", b"B5\n"]
+
+    def test_all(self, file_name):
+        chunks = [bytes(c.all()) for c in source_reader.iter_chunks(file_name, 4, source_range="all")]
+        assert chunks == [b"HEAD\nB1\nB2\nB3\n", b"B4\nB5\nFOOT\n"]
+
+    def test_missing_file(self):
+        with pytest.raises(SourceFileError):
+            list(source_reader.iter_chunks("rubbish.file", 2))
+
+    def test_count_lines(self, file_name):
+        assert source_reader.count_lines(file_name) == 5
+        assert source_reader.count_lines(file_name, source_range="all") == 7
+
+    def test_count_lines_blank(self, file_name):
+        with open(file_name, 'wb') as file:
+            file.write(b"HEAD\r\nB1\r\n\r\nB2\r\nFOOT\r\n\r\n")
+        assert source_reader.count_lines(file_name) == 2
+
+
+class TestS3SourceReader:
+    @pytest.fixture
+    def data(self):
+        return b"HEAD\n" + b"".join(f"B{i:04d}\n".encode() for i in range(1000)) + b"FOOT\n"
+
+    def test_read_segments(self, mocker, data):
+        download = mocker.patch('transformer.library.aws_service.download_s3_as_bytes', return_value=io.BytesIO(data))
+        reader = source_reader.S3SourceReader("s3://somebucket/some/key.txt", buffer_size=64, read_ahead=2)
+        segments = source_reader.read_segments(reader)
+        download.assert_called_once_with("somebucket", "some/key.txt", None)
+        assert segments.file_name == "s3://somebucket/some/key.txt"
+        assert bytes(segments.all()) == data
+        assert bytes(segments.footer()) == b"FOOT\n"
+
+    def test_iter_chunks(self, mocker, data):
+        mocker.patch('transformer.library.aws_service.download_s3_as_bytes', return_value=io.BytesIO(data))
+        reader = source_reader.S3SourceReader("s3://somebucket/key.txt", buffer_size=100)
+        chunks = list(source_reader.iter_chunks(reader, 300))
+        assert [len(bytes(c.body()).splitlines()) for c in chunks] == [300, 300, 300, 100]
+
+    def test_missing_object(self, mocker):
+        mocker.patch('transformer.library.aws_service.download_s3_as_bytes', side_effect=Exception("NoSuchKey"))
+        with pytest.raises(SourceFileError):
+            source_reader.read_segments(source_reader.S3SourceReader("s3://somebucket/key.txt"))
+
+    def test_invalid_file_name(self):
+        with pytest.raises(InvalidConfigError):
+            source_reader.S3SourceReader("/tmp/key.txt")
+
+
+class TestReadAheadStream:
+    def test_read(self):
+        data = bytes(range(256)) * 100
+        with io.BufferedReader(source_reader.ReadAheadStream(io.BytesIO(data), 1000, 3)) as stream:
+            assert stream.read() == data
+
+    def test_error_is_raised_to_reader(self):
+        class BrokenStream(io.BytesIO):
+            def read(self, size=-1):
+                raise IOError("Connection reset")
+
+        with pytest.raises(IOError):
+            source_reader.ReadAheadStream(BrokenStream(), 10, 1).read(10)
+
+
+class TestReadTail:
+    @pytest.fixture
+    def file_name(self):
+        source_file_name = f"fw_file-{uuid.uuid4().__str__()}.txt"
+        with open(source_file_name, 'wb') as file:
+            file.write(b"HEAD\n" + b"".join(f"B{i:04d}\n".encode() for i in range(1000)) + b"FOOT\n")
+        yield source_file_name
+        if os.path.exists(source_file_name):
+            os.remove(source_file_name)
+
+    def test_tail_start(self):
+        assert source_reader.tail_start(b"A\nB\nC\n", 1) == 4
+        assert source_reader.tail_start(b"A\nB\nC\n\r\n", 2) == 2
+        assert source_reader.tail_start(b"C\n", 1) == -1
+
+    def test_local(self, file_name):
+        assert source_reader.LocalSourceReader(file_name).read_tail(1, block_size=16) == b"FOOT\n"
+        assert source_reader.LocalSourceReader(file_name).read_tail(3, block_size=16) == b"B0998\nB0999\nFOOT\n"
+
+    def test_local_whole_file(self, file_name):
+        with open(file_name, 'wb') as file:
+            file.write(b"ONLY")
+        assert source_reader.LocalSourceReader(file_name).read_tail(2) == b"ONLY"
+
+    def test_streaming_default(self, file_name):
+        reader = source_reader.AbstractSourceReader(file_name)
+        reader.open = lambda: open(file_name, 'rb')
+        assert reader.read_tail(2) == b"B0999\nFOOT\n"
+
+    def test_s3(self, mocker):
+        data = b"HEAD\n" + b"".join(f"B{i:04d}\n".encode() for i in range(1000)) + b"FOOT\n"
+        ranges = []
+
+        def download_range(bucket, key, byte_range, client):
+            ranges.append(byte_range)
+            return io.BytesIO(data[-int(byte_range[len("bytes=-"):]):])
+
+        mocker.patch('transformer.library.aws_service.download_s3_range', side_effect=download_range)
+        reader = source_reader.S3SourceReader("s3://somebucket/key.txt", compression="none")
+        assert reader.read_tail(1, block_size=4) == b"FOOT\n"
+        assert ranges == ["bytes=-4", "bytes=-16"]
+
+    def test_s3_head(self, mocker):
+        data = b"HEADER\n" + b"".join(f"B{i:04d}\n".encode() for i in range(1000)) + b"FOOT\n"
+        ranges = []
+
+        def download_range(bucket, key, byte_range, client):
+            ranges.append(byte_range)
+            if byte_range.startswith("bytes=-"):
+                return io.BytesIO(data[-int(byte_range[len("bytes=-"):]):])
+            return io.BytesIO(data[:int(byte_range.split("-")[1]) + 1])
+
+        download = mocker.patch('transformer.library.aws_service.download_s3_as_bytes')
+        mocker.patch('transformer.library.aws_service.download_s3_range', side_effect=download_range)
+        reader = source_reader.S3SourceReader("s3://somebucket/key.txt", compression="none")
+        assert reader.read_head(1, block_size=4) == b"HEADER\n"
+        assert ranges == ["bytes=0-3", "bytes=0-15"]
+        segments = source_reader.read_edges(reader)
+        assert bytes(segments.header()) == b"HEADER\n" and bytes(segments.footer()) == b"FOOT\n"
+        download.assert_not_called()
+
+
+class TestCompression:
+    @pytest.fixture
+    def data(self):
+        return b"HEAD\n" + b"".join(f"B{i:04d}\n".encode() for i in range(1000)) + b"FOOT\n"
+
+    @pytest.fixture
+    def file_name(self):
+        source_file_name = f"fw_file-{uuid.uuid4().__str__()}"
+        yield source_file_name
+        if os.path.exists(source_file_name):
+            os.remove(source_file_name)
+
+    @pytest.mark.parametrize("extension,compress", [
+        (".gz", gzip.compress),
+        (".bz2", bz2.compress),
+        (".xz", lzma.compress)
+    ])
+    def test_extension(self, file_name, data, extension, compress):
+        with open(file_name + extension, 'wb') as file:
+            file.write(compress(data))
+        try:
+            segments = source_reader.read_segments(file_name + extension)
+            assert bytes(segments.all()) == data
+            assert source_reader.LocalSourceReader(file_name + extension).read_tail(1) == b"FOOT\n"
+        finally:
+            os.remove(file_name + extension)
+
+    def test_magic_bytes(self, file_name, data):
+        with open(file_name, 'wb') as file:
+            file.write(gzip.compress(data))
+        reader = source_reader.LocalSourceReader(file_name)
+        assert reader.is_compressed()
+        chunks = list(source_reader.iter_chunks(reader, 600))
+        assert [len(bytes(c.body()).splitlines()) for c in chunks] == [600, 400]
+        assert bytes(source_reader.read_edges(reader).footer()) == b"FOOT\n"
+
+    def test_configured(self, file_name, data):
+        with open(file_name, 'wb') as file:
+            file.write(bz2.compress(data))
+        assert bytes(source_reader.read_segments(source_reader.LocalSourceReader(file_name, compression="bz2")).all()) == data
+
+    def test_none(self, file_name, data):
+        with open(file_name + ".gz", 'wb') as file:
+            file.write(data)
+        try:
+            reader = source_reader.LocalSourceReader(file_name + ".gz", compression="none")
+            assert not reader.is_compressed()
+            assert bytes(source_reader.read_segments(reader).all()) == data
+        finally:
+            os.remove(file_name + ".gz")
+
+    def test_zstd(self, file_name, data):
+        zstandard = pytest.importorskip("zstandard")
+        with open(file_name, 'wb') as file:
+            file.write(zstandard.ZstdCompressor().compress(data))
+        assert bytes(source_reader.read_segments(file_name).all()) == data
+
+    def test_s3_stream(self, mocker, data):
+        mocker.patch('transformer.library.aws_service.download_s3_as_bytes',
+                     return_value=io.BytesIO(gzip.compress(data)))
+        reader = source_reader.S3SourceReader("s3://somebucket/key.txt.gz", buffer_size=64)
+        assert bytes(source_reader.read_segments(reader).all()) == data
+
+    def test_s3_magic_bytes(self, mocker, data):
+        mocker.patch('transformer.library.aws_service.download_s3_range', return_value=io.BytesIO(b"\x1f\x8b\x08\x00"))
+        assert source_reader.S3SourceReader("s3://somebucket/key.txt").is_compressed()
+
+    def test_invalid(self, file_name):
+        with pytest.raises(InvalidConfigError):
+            source_reader.LocalSourceReader(file_name, compression="rar")
@@ -2,7 +2,7 @@ import uuid
 
 import numpy as np
 import pytest
-from transformer.library.exceptions import ValidationError, MissingConfigError
+from transformer.library.exceptions import ValidationError, MissingConfigError, InvalidConfigError
 import pandas as pd
 from transformer.validator import validator
 
@@ -18,7 +18,7 @@ class TestNricValidator:
             "body": pd.DataFrame({
                 "body1": ["One", "Two", "Three", "Four", "Five"],
                 "body2": [1, 2, 3, 4, 5],
-                "ic": ["S1234567A", "S1234567A", "S1234567A", "S1234567A", "S1234567A"]
+                "ic": ["S1234567D", "T1234567J", "F1234567N", "G1234567X", "M1234567K"]
             }),
             "footer": pd.DataFrame({
                 "recordCount": [5]
@@ -40,6 +40,25 @@ class TestNricValidator:
             with pytest.raises(ValidationError):
                 validator.NricValidator().validate("body", "ic", {}, dfs)
 
+        def test_check_letter(self):
+            dfs = {
+                "body": pd.DataFrame({
+                    "ic": ["S1234567D", "S1234567A", "T1234567D", "M1234567X", "s1234567d"]
+                })
+            }
+            with pytest.raises(ValidationError) as e:
+                validator.NricValidator().validate("body", "ic", {}, dfs)
+            assert e.value.failCount == 3
+
+
+class TestNricChecksum:
+    def test_checksum(self):
+        values = np.array(["S0000001I", "T0000001E", "F0000001U", "G0000001P", "M0000001Q", "S000000I", "S00000O1I"],
+                          dtype=object)
+        assert validator.nric_checksum(values).tolist() == [True, True, True, True, True, False, False]
+        assert validator.nric_checksum(pd.Series(values, dtype="string[pyarrow]")).tolist() == \
+               [True, True, True, True, True, False, False]
+
 
 class TestNaNValidator:
     @pytest.fixture
@@ -142,7 +161,39 @@ class TestRefValidator:
             }
             validator.RefValidator().validate("body", "field1", arguments, dataframes)
 
+        def test_count_with_counts(self):
+            dataframes = {
+                "footer": pd.DataFrame({
+                    "recordCount": [5000]
+                })
+            }
+            arguments = {
+                "type": "count",
+                "ref": "footer.recordCount"
+            }
+            assert validator.RefValidator().is_deferred(arguments)
+            validator.RefValidator().validate_counts("body", "field1", arguments, dataframes,
+                                                     {"body": 5000, "footer": 1})
+
+        def test_match_not_deferred(self):
+            assert not validator.RefValidator().is_deferred({"type": "match", "ref": "body.field1"})
+            assert not validator.RegexValidator().is_deferred({"pattern": "^$"})
+
     class TestFailure:
+        def test_count_with_counts(self):
+            dataframes = {
+                "footer": pd.DataFrame({
+                    "recordCount": [5000]
+                })
+            }
+            arguments = {
+                "type": "count",
+                "ref": "footer.recordCount"
+            }
+            with pytest.raises(ValidationError):
+                validator.RefValidator().validate_counts("body", "field1", arguments, dataframes,
+                                                         {"body": 4999, "footer": 1})
+
         def test_failure(self):
             dataframes = {
                 "body": pd.DataFrame({
@@ -160,6 +211,90 @@ class TestRefValidator:
                 validator.RefValidator().validate("footer", "recordCount", arguments, dataframes)
 
 
+class TestRefValidatorLookup:
+    @pytest.fixture
+    def dataframes(self):
+        return {
+            "header": pd.DataFrame({"branches": ["B1", "B2"]}),
+            "body": pd.DataFrame({"branch": ["B1", "B3", "B2", np.nan]})
+        }
+
+    @pytest.fixture
+    def reference_file(self, tmp_path):
+        validator.clear_references()
+        file_name = tmp_path / "branches.txt"
+        file_name.write_text("B1\nB3 \n\n")
+        yield str(file_name)
+        validator.clear_references()
+
+    def test_segment(self, dataframes):
+        with pytest.raises(ValidationError) as e:
+            validator.RefValidator().validate("body", "branch", {"type": "lookup", "ref": "header.branches"},
+                                              dataframes)
+        assert e.value.failCount == 2
+        assert e.value.rows == [1, 3]
+
+    def test_file(self, dataframes, reference_file):
+        with pytest.raises(ValidationError) as e:
+            validator.RefValidator().validate("body", "branch", {"type": "lookup", "file": reference_file},
+                                              dataframes)
+        assert e.value.rows == [2, 3]
+
+    def test_csv_column(self, dataframes, tmp_path):
+        file_name = tmp_path / "branches.csv"
+        file_name.write_text("code,name\nB1,One\nB2,Two\nB3,Three\n")
+        arguments = {"type": "lookup", "file": str(file_name), "column": "code"}
+        dataframes['body'] = dataframes['body'].dropna()
+        validator.RefValidator().validate("body", "branch", arguments, dataframes)
+
+    def test_index_cached(self, reference_file):
+        index = validator.reference_index(reference_file)
+        assert list(index) == ["B1", "B3"]
+        assert validator.reference_index(reference_file) is index
+        with open(reference_file, 'a') as file:
+            file.write("B4\n")
+        assert list(validator.reference_index(reference_file)) == ["B1", "B3", "B4"]
+
+    def test_compiled(self, reference_file):
+        check = validator.RefValidator().compile({"type": "lookup", "file": reference_file})
+        failures = validator.row_failures(pd.Series(["B1", "B2", None]), [check])
+        assert failures[:, 0].tolist() == [False, True, True]
+
+    def test_arrow_strings(self, dataframes, reference_file):
+        dataframes = {name: frame.astype("string[pyarrow]") for name, frame in dataframes.items()}
+        with pytest.raises(ValidationError) as e:
+            validator.RefValidator().validate("body", "branch", {"type": "lookup", "ref": "header.branches"},
+                                              dataframes)
+        assert e.value.rows == [1, 3]
+        with pytest.raises(ValidationError) as e:
+            validator.RefValidator().validate("body", "branch", {"type": "lookup", "file": reference_file},
+                                              dataframes)
+        assert e.value.rows == [2, 3]
+
+    def test_match_failure(self):
+        dataframes = {
+            "body": pd.DataFrame({"field1": [1, 2, 3], "field2": [1, 5, 3]})
+        }
+        with pytest.raises(ValidationError) as e:
+            validator.RefValidator().validate("body", "field1", {"type": "match", "ref": "body.field2"}, dataframes)
+        assert e.value.rows == [1]
+
+    def test_match_arrow_strings(self):
+        dataframes = {
+            "body": pd.DataFrame({"field1": ["a", "b", None, None], "field2": ["a", "c", None, "d"]},
+                                 dtype="string[pyarrow]")
+        }
+        with pytest.raises(ValidationError) as e:
+            validator.RefValidator().validate("body", "field1", {"type": "match", "ref": "body.field2"}, dataframes)
+        assert e.value.rows == [1, 3]
+
+    def test_invalid_arguments(self):
+        with pytest.raises(MissingConfigError):
+            validator.RefValidator().compile({"type": "lookup"})
+        with pytest.raises(MissingConfigError):
+            validator.RefValidator().compile({"type": "unknown", "ref": "body.field1"})
+
+
 class TestRegexValidator:
     @pytest.fixture
     def dataframes(self):
@@ -195,6 +330,10 @@ class TestRegexValidator:
             with pytest.raises(MissingConfigError):
                 validator.RegexValidator().validate("footer", "field1", arguments, dataframes)
 
+        def test_invalid_regex(self, dataframes):
+            with pytest.raises(InvalidConfigError):
+                validator.RegexValidator().validate("footer", "field1", {"pattern": "SX("}, dataframes)
+
         def test_mismatch(self, dataframes):
             arguments = {
                 "pattern": r'^SX$'
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from transformer.library.exceptions import ValidationError
+from transformer.validator import ValidatorConfig, ValidatorFieldConfig, ValidatorEngine, validator
+
+
+class TestValidatorEngine:
+    @pytest.fixture
+    def config(self):
+        return [
+            ValidatorConfig(segment="body", field_name="ic", validators=[
+                ValidatorFieldConfig("NricValidator", None),
+                ValidatorFieldConfig("RegexValidator", {"pattern": "^S"})
+            ]),
+            ValidatorConfig(segment="body", field_name="code", validators=[
+                ValidatorFieldConfig("RegexValidator", {"pattern": r"^\d{2}$"})
+            ]),
+            ValidatorConfig(segment="footer", field_name="recordCount", validators=[
+                ValidatorFieldConfig("RefValidator", {"type": "count", "ref": "body.ic"})
+            ])
+        ]
+
+    @pytest.fixture
+    def frames(self):
+        return {
+            "body": pd.DataFrame({
+                "ic": ["S1234567D", "T1234567J", "S1234567D", np.nan],
+                "code": ["01", "02", "3", "04"]
+            }),
+            "footer": pd.DataFrame({"recordCount": ["4"]})
+        }
+
+    def test_bitmap(self, config, frames):
+        result = ValidatorEngine(config).run(frames)
+        failures = result.failures['body']
+        assert failures.rules == [("ic", "NricValidator"), ("ic", "RegexValidator"), ("code", "RegexValidator")]
+        assert failures.bitmap.tolist() == [
+            [False, False, False],
+            [False, True, False],
+            [False, False, True],
+            [True, True, False]
+        ]
+        assert failures.rows.tolist() == [False, True, True, True]
+        assert [(e.fieldName, e.failCount, e.recordCount) for e in result.errors] == [
+            ("ic", 1, 4), ("ic", 2, 4), ("code", 1, 4)
+        ]
+        assert all(isinstance(e, ValidationError) for e in result.errors)
+
+    def test_compiled_once(self, config, frames, mocker):
+        compile_spy = mocker.spy(validator.RegexValidator, 'compile')
+        engine = ValidatorEngine(config)
+        engine.run(frames)
+        engine.run(frames)
+        assert compile_spy.call_count == 2
+
+    def test_segments(self, config, frames):
+        result = ValidatorEngine(config).run(frames, segments={"footer"})
+        assert result.failures == {}
+        assert result.errors == []
+
+    def test_deferred(self, config, frames):
+        frames['footer']['recordCount'] = ["5"]
+        assert len(ValidatorEngine(config).run(frames, deferred=False).errors) == 3
+        errors = ValidatorEngine(config).run(frames, deferred=True).errors
+        assert [e.fieldName for e in errors] == ["recordCount"]
+
+
+class TestRowFailures:
+    def test_same_as_count(self):
+        series = pd.Series(["ab", "abab", "b", "", 1, None])
+        for pattern in ["ab", "^ab", "a|b", "^$", "b$"]:
+            check = validator.RegexValidator().compile({"pattern": pattern})
+            expected = (series.str.count(pattern) == True).tolist()
+            assert (~validator.row_failures(series, [check])[:, 0]).tolist() == expected
+
+    def test_arrow_strings(self):
+        series = pd.Series(["S0000001I", "S0000001J", None, "ab", "S0000001I", "s0000001i"])
+        checks = [validator.NricValidator().compile({}), validator.RegexValidator().compile({"pattern": "^S"})]
+        expected = validator.row_failures(series, checks)
+        assert validator.row_failures(series.astype("string[pyarrow]"), checks).tolist() == expected.tolist()
+
+    @pytest.mark.parametrize("values", [["ab", "abab", "b", "", None, "a1", "x12"], ["ab", "é", "a١", None]])
+    def test_arrow_patterns(self, values):
+        series = pd.Series(values)
+        for pattern in ["ab", "^ab", "a|b", "^$", "b$", r"^a\d$", r"(a)\1", "(?i)^AB"]:
+            check = validator.RegexValidator().compile({"pattern": pattern})
+            expected = validator.row_failures(series, [check])
+            assert validator.row_failures(series.astype("string[pyarrow]"), [check]).tolist() == expected.tolist()
+
+    def test_arrow_compute(self, mocker):
+        import pyarrow.compute as pc
+        match = mocker.spy(pc, 'match_substring_regex')
+        check = validator.RegexValidator().compile({"pattern": r"^\d{2}$"})
+        failures = validator.row_failures(pd.Series(["12", "1", None, "12"], dtype="string[pyarrow]"), [check])
+        assert failures[:, 0].tolist() == [False, True, True, False]
+        assert match.call_count == 1
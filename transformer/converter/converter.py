@@ -1,6 +1,42 @@
+import re
+
+import numpy as np
 import pandas as pd
 from transformer.converter import ConverterConfig
-from transformer.library.exceptions import ConversionError
+from transformer.library.exceptions import ConversionError, InvalidConfigError
+from transformer.library.strings import arrow_array, code_points, is_arrow_string
+
+# Most digits every int64 can hold
+MAX_DIGITS = 18
+DATE_FORMAT = "%Y%m%d"
+
+_PICTURE = re.compile(r"S?((?:9(?:\(\d+\))?)+)(?:V((?:9(?:\(\d+\))?)+))?")
+_NINES = re.compile(r"9(?:\((\d+)\))?")
+# Width of the date directives whose value always has the same number of digits
+_DATE_WIDTHS = {"%Y": 4, "%m": 2, "%d": 2, "%H": 2, "%M": 2, "%S": 2, "%y": 2, "%j": 3, "%%": 1}
+
+
+def _code_table(mapping: dict, default) -> np.ndarray:
+    table = np.full(128, default)
+    for characters, value in mapping.items():
+        for character in characters:
+            table[ord(character)] = value
+    return table
+
+
+# Digit and sign of the last character of a zoned number, whose sign is punched over its last digit
+_OVERPUNCH_DIGITS = _code_table({
+    **{str(digit): digit for digit in range(10)},
+    "{": 0, "}": 0,
+    **{chr(ord("A") + digit - 1): digit for digit in range(1, 10)},
+    **{chr(ord("J") + digit - 1): digit for digit in range(1, 10)}
+}, -1)
+_OVERPUNCH_NEGATIVE = _code_table({"}JKLMNOPQR": True}, False)
+_HEX_NIBBLES = _code_table({
+    **{str(digit): digit for digit in range(10)},
+    **{letter: 10 + offset for offset, letter in enumerate("ABCDEF")},
+    **{letter: 10 + offset for offset, letter in enumerate("abcdef")}
+}, -1)
 
 
 class AbstractConverter:
@@ -9,12 +45,210 @@ class AbstractConverter:
 
 class StrConverter(AbstractConverter):
     def run(self, config: ConverterConfig, series: pd.Series) -> pd.Series:
+        if is_arrow_string(series):
+            return series
         return series.astype(str)
 
 
 class NumberConverter(AbstractConverter):
     def run(self, config: ConverterConfig, series: pd.Series) -> pd.Series:
+        if is_arrow_string(series):
+            import pyarrow as pa
+            import pyarrow.compute as pc
+            array = arrow_array(series)
+            for target in (pa.int64(), pa.float64()):
+                try:
+                    return pd.Series(pc.cast(array, target).to_numpy(zero_copy_only=False), index=series.index,
+                                     name=series.name)
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                    continue
+            # Values Arrow does not parse, pandas.to_numeric reports them or parses the ones it accepts
         try:
             return pd.to_numeric(series)
         except ValueError as e:
-            raise ConversionError(msg=str(e), segment=config.segment, field_name=config.field_name)
+            failed = pd.to_numeric(series, errors='coerce').isna() & series.notna()
+            raise ConversionError(msg=str(e), segment=config.segment, field_name=config.field_name,
+                                  rows=np.flatnonzero(failed.to_numpy()).tolist())
+
+
+class ScaledDecimalConverter(AbstractConverter):
+    """
+    Base of the converters of fixed point numbers. Values are kept exact as the int64 of their digits, unscaled:
+    the implied decimal point is not applied, eg. 123.45 of picture 9(7)V99 is 12345.
+
+    Arguments: [picture], a COBOL picture such as 9(7)V99 giving the most digits (default 18).
+    """
+    label = "decimal"
+
+    def run(self, config: ConverterConfig, series: pd.Series) -> pd.Series:
+        digits = _picture(config.arguments)
+        numbers, present, negative, failed = self.digits(series)
+        values, counts, invalid = _accumulate(numbers, present)
+        failed |= invalid | (counts == 0) | (counts > digits)
+        _raise_failures(config, failed, self.label)
+        return pd.Series(np.where(negative, -values, values), index=series.index, dtype=np.int64)
+
+    def digits(self, series: pd.Series) -> tuple:
+        """
+        :return: (rows x positions digit values, True where the position is a digit of the number, True for negative
+        rows, True for rows that failed already)
+        """
+        pass
+
+
+class ImpliedDecimalConverter(ScaledDecimalConverter):
+    """
+    Digits with an implied decimal point, eg. 0012345 for 123.45 with picture 9(5)V99.
+    A separate leading or trailing sign (+ or -) is accepted.
+    """
+    label = "implied decimals"
+
+    def digits(self, series: pd.Series) -> tuple:
+        codes, failed = code_points(series)
+        present = codes != 0
+        lengths = present.sum(axis=1)
+        rows = np.arange(len(codes))
+        first = codes[:, 0]
+        last = codes[rows, np.maximum(lengths - 1, 0)]
+        leading = (first == ord("+")) | (first == ord("-"))
+        trailing = ~leading & (lengths > 1) & ((last == ord("+")) | (last == ord("-")))
+        negative = (leading & (first == ord("-"))) | (trailing & (last == ord("-")))
+        present[:, 0] &= ~leading
+        present[rows, np.maximum(lengths - 1, 0)] &= ~trailing
+        return codes.astype(np.int64) - ord("0"), present, negative, failed
+
+
+class OverpunchConverter(ScaledDecimalConverter):
+    """
+    Zoned decimals whose sign is punched over the last digit: { and A-I are 0 to 9 positive, } and J-R are 0 to 9
+    negative, eg. 1234E is 12345 and 1234N is -12345. A plain last digit is positive.
+    """
+    label = "signed zoned decimals"
+
+    def digits(self, series: pd.Series) -> tuple:
+        codes, failed = code_points(series)
+        present = codes != 0
+        lengths = present.sum(axis=1)
+        rows = np.arange(len(codes))
+        positions = np.maximum(lengths - 1, 0)
+        last = np.minimum(codes[rows, positions], 127)
+        numbers = codes.astype(np.int64) - ord("0")
+        numbers[rows, positions] = _OVERPUNCH_DIGITS[last]
+        return numbers, present, _OVERPUNCH_NEGATIVE[last], failed
+
+
+class PackedDecimalConverter(ScaledDecimalConverter):
+    """
+    COMP-3 packed decimals: two digits per byte and a last nibble holding the sign, C, A, E or F positive and B or D
+    negative, eg. 0x12345C is 12345. Values are either bytes or their hex text, eg. 12345C.
+    """
+    label = "packed decimals"
+
+    def digits(self, series: pd.Series) -> tuple:
+        if pd.api.types.infer_dtype(series, skipna=True) == "bytes":
+            nibbles, present, failed = _packed_nibbles(series)
+        else:
+            codes, failed = code_points(series)
+            nibbles = _HEX_NIBBLES[np.minimum(codes, 127)]
+            present = codes != 0
+        lengths = present.sum(axis=1)
+        rows = np.arange(len(nibbles))
+        positions = np.maximum(lengths - 1, 0)
+        signs = nibbles[rows, positions]
+        failed |= signs < 0xA
+        present[rows, positions] = False
+        return nibbles, present, (signs == 0xB) | (signs == 0xD), failed
+
+
+class DateConverter(AbstractConverter):
+    """
+    Dates of a fixed [format] (strftime directives, default %Y%m%d) to datetime64.
+    NaN and the values listed in [nulls], eg. 00000000, become NaT.
+    """
+    label = "dates"
+
+    def run(self, config: ConverterConfig, series: pd.Series) -> pd.Series:
+        arguments = config.arguments or {}
+        date_format = arguments.get('format', DATE_FORMAT)
+        nulls = arguments.get('nulls', [])
+        if not isinstance(date_format, str):
+            raise InvalidConfigError("Argument [format] must be of str type.")
+        if not isinstance(nulls, (list, tuple)):
+            raise InvalidConfigError("Argument [nulls] must be a list of values.")
+        empty = (series.isna() | series.isin(nulls)).to_numpy()
+        result = pd.to_datetime(series.where(~empty), format=date_format, errors='coerce')
+        failed = result.isna().to_numpy() & ~empty
+        width = _date_width(date_format)
+        if width is not None:
+            # strptime accepts values without their leading zeros, which a fixed format does not have
+            codes, _ = code_points(series)
+            failed |= ~empty & ((codes != 0).sum(axis=1) != width)
+        _raise_failures(config, failed, self.label)
+        return result
+
+
+def _picture(arguments: dict) -> int:
+    """
+    :return: Most digits of the [picture] argument
+    """
+    arguments = arguments or {}
+    if 'scale' in arguments.keys():
+        raise InvalidConfigError("Argument [scale] is not supported, decimals are unscaled. Use [picture] instead.")
+    if 'picture' not in arguments.keys():
+        return MAX_DIGITS
+    match = _PICTURE.fullmatch(str(arguments['picture']).upper())
+    if match is None:
+        raise InvalidConfigError(f"Argument [picture] {arguments['picture']} is not a picture such as 9(7)V99.")
+    digits = sum(int(count) if count else 1 for part in match.groups() for count in _NINES.findall(part or ""))
+    if digits > MAX_DIGITS:
+        raise InvalidConfigError(f"Decimals of more than {MAX_DIGITS} digits do not fit in int64.")
+    return digits
+
+
+def _packed_nibbles(series: pd.Series) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    :return: (rows x nibbles of bytes values, True for the nibbles of each value, True for NaN)
+    """
+    values = series.to_numpy(dtype=object)
+    missing = pd.isna(values)
+    raw = np.where(missing, b"", values).astype(bytes)
+    width = raw.dtype.itemsize
+    matrix = raw.view(np.uint8).reshape(len(raw), width)
+    # Shorter values are padded with 0 bytes, the last byte of a packed decimal holds its sign so is never 0
+    nonzero = matrix != 0
+    lengths = np.where(nonzero.any(axis=1), width - np.argmax(nonzero[:, ::-1], axis=1), 0)
+    nibbles = np.empty((len(raw), width * 2), dtype=np.int64)
+    nibbles[:, 0::2] = matrix >> 4
+    nibbles[:, 1::2] = matrix & 0x0F
+    return nibbles, np.arange(width * 2) < (lengths * 2)[:, None], missing
+
+
+def _accumulate(numbers: np.ndarray, present: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Value of the digits of every row, column by column over all rows at once
+    :return: (values, number of digits, True for rows with a position that is not a digit)
+    """
+    values = np.zeros(len(numbers), dtype=np.int64)
+    for position in range(numbers.shape[1]):
+        values = np.where(present[:, position], values * 10 + numbers[:, position], values)
+    invalid = (present & ((numbers < 0) | (numbers > 9))).any(axis=1)
+    return values, present.sum(axis=1), invalid
+
+
+def _date_width(date_format: str):
+    """
+    Length of every date of date_format, None when it has directives of varying length such as %B
+    """
+    directives = re.findall(r"%.", date_format)
+    if any(directive not in _DATE_WIDTHS for directive in directives):
+        return None
+    return len(re.sub(r"%.", "", date_format)) + sum(_DATE_WIDTHS[directive] for directive in directives)
+
+
+def _raise_failures(config: ConverterConfig, failed: np.ndarray, label: str):
+    if not failed.any():
+        return
+    rows = np.flatnonzero(failed).tolist()
+    raise ConversionError(msg=f"{len(rows)} values of {config.segment}.{config.field_name} are not {label}, "
+                              f"first at row {rows[0]}",
+                          segment=config.segment, field_name=config.field_name, rows=rows)
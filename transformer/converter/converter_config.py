@@ -1,8 +1,9 @@
 from dataclasses import dataclass
 
 
-@dataclass()
+@dataclass(frozen=True)
 class ConverterConfig:
     segment: str
     field_name: str
     name: str
+    arguments: dict = None
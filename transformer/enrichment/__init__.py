@@ -0,0 +1,2 @@
+from transformer.enrichment.enrichment_config import EnrichmentConfig, ReferenceTableConfig
+from transformer.enrichment.enricher import Enricher
@@ -0,0 +1,142 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+import io
+import os
+
+import pandas as pd
+
+from transformer.enrichment.enrichment_config import EnrichmentConfig, ReferenceTableConfig
+from transformer.library import logger, aws_service
+from transformer.library.exceptions import InvalidConfigError
+from transformer.library.metrics import PipelineMetrics, count_rows
+from transformer.library.strings import is_arrow_string
+
+log = logger.set_logger(__name__)
+
+# Memory the cached reference tables may use, the least recently used ones are dropped above it
+CACHE_BYTES = 256 * 1024 * 1024
+REF = "ref"
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+
+
+@dataclass
+class ReferenceTable:
+    """
+    :param version: ETag of an S3 object, modification time and size of a local file
+    :param index: Unique keys of the table, whose hash table is built once and reused by every join
+    :param frame: Columns of the table, row i belongs to key i. A last row of NaN is used for keys that are not found
+    :param size: Bytes used by index and frame
+    """
+    version: str
+    index: pd.Index
+    frame: pd.DataFrame
+    size: int
+
+
+# Reference tables keyed by (source, key column), least recently used first
+_tables = OrderedDict()
+
+
+class Enricher:
+    def load(self, config: EnrichmentConfig, metrics: PipelineMetrics = None) -> dict[str, ReferenceTable]:
+        """
+        Reference tables of config by table name, to load them once for every run() of a file, eg. of its chunks
+        """
+        if len(config.tables) == 0:
+            return {}
+        metrics = metrics or PipelineMetrics()
+        with metrics.stage("enrich"):
+            return _load_tables(config)
+
+    def run(self, config: EnrichmentConfig, frames: dict[str, pd.DataFrame],
+            metrics: PipelineMetrics = None, tables: dict[str, ReferenceTable] = None) -> dict[str, pd.DataFrame]:
+        """
+        Joins the reference tables of config with the frames. The columns joined from a table are added as the frame
+        ref.<table>, with a row for every row of the joined segment, so results can refer to ref.<table>.<column>.
+        Rows whose value is not a key of the table get NaN.
+        :param tables: Tables from load(), else they are loaded (or checked for changes when cached) by this run
+        """
+        if len(config.tables) == 0:
+            return frames
+        metrics = metrics or PipelineMetrics()
+        with metrics.stage("enrich") as stage:
+            stage.record(rows_in=count_rows(frames))
+            tables = tables if tables is not None else _load_tables(config)
+            frames = dict(frames)
+            for table_config in config.tables:
+                series = frames[table_config.segment][table_config.field_name]
+                frames[f"{REF}.{table_config.name}"] = join(tables[table_config.name], series, table_config)
+            stage.record(rows_out=count_rows(frames))
+        return frames
+
+
+def load_table(config: ReferenceTableConfig) -> ReferenceTable:
+    """
+    Reference table of config, from the cache unless its source changed since it was loaded
+    """
+    key = (config.source, config.key)
+    cached = _tables.get(key)
+    version, data = _read(config.source, cached.version if cached else None)
+    if data is None:
+        _tables.move_to_end(key)
+        return cached
+    table = _build(config, version, data)
+    _tables[key] = table
+    _tables.move_to_end(key)
+    budget = int(os.environ.get('reference_cache_bytes', CACHE_BYTES))
+    while len(_tables) > 1 and sum(t.size for t in _tables.values()) > budget:
+        _tables.popitem(last=False)
+    log.info(f"Loaded reference table {config.name} with {len(table.index)} keys from {config.source}")
+    return table
+
+
+def join(table: ReferenceTable, series: pd.Series, config: ReferenceTableConfig) -> pd.DataFrame:
+    columns = config.columns if config.columns is not None else list(table.frame.columns)
+    missing = [column for column in columns if column not in table.frame.columns]
+    if missing:
+        raise InvalidConfigError(f"Columns {missing} are not in reference table [{config.name}].")
+    # Keys are held as str, so fields converted to numbers are joined on their str value
+    values = series if series.dtype == object or is_arrow_string(series) else series.astype(str)
+    positions = table.index.get_indexer(values)
+    positions[positions < 0] = len(table.index)
+    return table.frame[columns].take(positions).reset_index(drop=True)
+
+
+def _load_tables(config: EnrichmentConfig) -> dict[str, ReferenceTable]:
+    return {table_config.name: load_table(table_config) for table_config in config.tables}
+
+
+def clear_tables():
+    _tables.clear()
+
+
+def _read(source: str, version: str):
+    """
+    :return: (version, data) of source, data is None when the version is unchanged
+    """
+    if source.startswith("s3://"):
+        bucket, key = source[len("s3://"):].split("/", 1)
+        body, etag = aws_service.download_s3_if_modified(bucket, key, etag=version)
+        return etag, None if body is None else io.BytesIO(body.read())
+    stat = os.stat(source)
+    current = f"{stat.st_mtime_ns}-{stat.st_size}"
+    return current, None if current == version else source
+
+
+def _build(config: ReferenceTableConfig, version: str, data) -> ReferenceTable:
+    if config.source.lower().endswith(PARQUET_EXTENSIONS):
+        frame = pd.read_parquet(data)
+    else:
+        frame = pd.read_csv(data, dtype=str)
+    if config.key not in frame.columns:
+        raise InvalidConfigError(f"Key [{config.key}] is not a column of reference table [{config.name}].")
+    frame = frame[frame[config.key].notna()]
+    keys = frame[config.key].astype(str)
+    # The first row of a key is joined when the table holds it more than once
+    unique = ~keys.duplicated().to_numpy()
+    index = pd.Index(keys[unique], dtype=object)
+    index.get_indexer(index[:1])
+    frame = frame[unique].reset_index(drop=True)
+    frame = frame.reindex(range(len(frame.index) + 1))
+    size = int(frame.memory_usage(deep=True).sum() + index.memory_usage(deep=True))
+    return ReferenceTable(version=version, index=index, frame=frame, size=size)
@@ -0,0 +1,53 @@
+import dataclasses
+
+from transformer.library.exceptions import InvalidConfigError
+
+ENRICH = "enrich"
+
+
+@dataclasses.dataclass
+class ReferenceTableConfig:
+    """
+    :param name: Name of the table, its columns are referred to as ref.<name>.<column>
+    :param source: Local CSV or Parquet file, or s3://bucket/key
+    :param key: Column of the table joined on
+    :param segment: Segment of the field joined with [key]
+    :param field_name: Field joined with [key]
+    :param columns: Columns of the table to join, every column when None
+    """
+    name: str
+    source: str
+    key: str
+    segment: str
+    field_name: str
+    columns: list = None
+
+
+@dataclasses.dataclass
+class EnrichmentConfig:
+    tables: list[ReferenceTableConfig]
+
+    def __init__(self, config: dict):
+        self.tables = []
+        if ENRICH not in config.keys():
+            return
+        if not isinstance(config[ENRICH], list):
+            raise InvalidConfigError(f"Field [{ENRICH}] must be a list of reference tables.")
+        for table in config[ENRICH]:
+            for name in ['table', 'source', 'key', 'field']:
+                if not isinstance(table.get(name), str):
+                    raise InvalidConfigError(f"Field [{ENRICH}.{name}] must be of str type.")
+            if '.' not in table['field']:
+                raise InvalidConfigError(f"Field [{ENRICH}.field] must be of segment.field format.")
+            columns = table.get('columns')
+            if columns is not None and not isinstance(columns, list):
+                raise InvalidConfigError(f"Field [{ENRICH}.columns] must be a list of column names.")
+            segment, field_name = table['field'].split('.', 1)
+            self.tables.append(ReferenceTableConfig(
+                name=table['table'],
+                source=table['source'],
+                key=table['key'],
+                segment=segment,
+                field_name=field_name,
+                columns=columns
+            ))
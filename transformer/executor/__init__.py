@@ -1,2 +1,13 @@
-from transformer.executor.executor_config import ExecutorConfig
-from transformer.executor.executor import LambdaFixedWidthExecutor
+import importlib
+
+# Exports are imported on first access, so eg. ExecutorConfig can be used without loading pandas
+_exports = {
+    "ExecutorConfig": "transformer.executor.executor_config",
+    "LambdaFixedWidthExecutor": "transformer.executor.executor",
+}
+
+
+def __getattr__(name: str):
+    if name in _exports:
+        return getattr(importlib.import_module(_exports[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
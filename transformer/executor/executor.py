@@ -1,11 +1,14 @@
 
 from transformer.library import logger, aws_service
+from transformer.library.metrics import PipelineMetrics, StageMetrics, count_rows
 from transformer.executor import ExecutorConfig
 from transformer.source import SourceMapperConfig, SourceMapper
 from transformer.source import source_mapper
 from transformer.result import ResultMapperConfig, ResultProducerConfig
 from transformer.result import ResultMapper, result_producer
+from transformer.enrichment import EnrichmentConfig, Enricher
 from transformer.model import ResultResponse
+import os
 
 log = logger.set_logger(__name__)
 
@@ -18,33 +21,93 @@ class LambdaFixedWidthExecutor(AbstractExecutor):
     def run(self, **kwargs) -> ResultResponse:
         bucket = kwargs['bucket']
         key = kwargs['key']
+        metrics = PipelineMetrics()
         # 1. Download Config/Locate Config & Initialise Config
         # Compulsory Segment
-        cls = ExecutorConfig(key)
+        with metrics.stage("config"):
+            cls = ExecutorConfig(key)
+            # The compiled source layout is reused by warm invocations as long as the config version is unchanged
+            src_mapper_cfg = SourceMapperConfig(config=cls.get_exact_config(),
+                                                file_name="/tmp/" + key.replace("/", "_"), version=cls.get_version())
+            enrichment_config = EnrichmentConfig(cls.get_exact_config())
+            result_mapper_config = ResultMapperConfig(cls.get_exact_config())
+            result_config = ResultProducerConfig(cls.get_exact_config())
+            producer = getattr(result_producer, result_config.name)(result_config)
+            quarantine = src_mapper_cfg.quarantine
+            # Quarantined rows are sent with a ResultProducer of their own
+            quarantine_producer = getattr(result_producer, quarantine.name)(quarantine) if quarantine else None
         # 2. Download Source Data/File
         # Compulsory segment
-        file_name = "/tmp/" + key.replace("/", "_")
-        file = aws_service.download_s3_file(
-            bucket=bucket,
-            key=key,
-            file_name=file_name
-        )
+        if src_mapper_cfg.reader.name == "S3SourceReader":
+            # Source is parsed straight from the S3 object stream instead of a local copy
+            src_mapper_cfg.file_name = f"s3://{bucket}/{key}"
+        else:
+            with metrics.stage("download") as stage:
+                self._download(bucket, key, src_mapper_cfg)
+                if os.path.exists(src_mapper_cfg.file_name):
+                    stage.record(bytes=os.path.getsize(src_mapper_cfg.file_name))
         # 3. Run SourceMapper
         # Compulsory Segment
-        src_mapper_cfg = SourceMapperConfig(config=cls.get_exact_config(), file_name=file_name)
-        dataframes = SourceMapper().run(src_mapper_cfg)
+        mapper = SourceMapper()
+        enricher = Enricher()
+        result_mapper = ResultMapper()
+        if src_mapper_cfg.chunk_size:
+            # 3-5. Stream the body through SourceMapper, Enricher, ResultMapper and ResultProducer chunk by chunk
+            # Reference tables are loaded once and joined with every chunk
+            tables = enricher.load(enrichment_config, metrics=metrics)
+            with metrics.stage("produce") as stage:
+                producer.run_chunks(
+                    self._count(stage, result_mapper.run(
+                        config=result_mapper_config,
+                        frames=enricher.run(enrichment_config, dataframes, metrics=metrics, tables=tables),
+                        metrics=metrics))
+                    for dataframes in mapper.run_chunks(src_mapper_cfg, metrics=metrics)
+                )
+            self._quarantine(mapper, quarantine_producer, metrics)
+            return self._response(metrics)
+        dataframes = mapper.run(src_mapper_cfg, metrics=metrics)
+        # Conditional Segment, joins reference tables with the frames
+        dataframes = enricher.run(enrichment_config, dataframes, metrics=metrics)
         # 4. Run ResultMapper
         # Conditional Segment
-        result_mapper_config = ResultMapperConfig(cls.get_exact_config())
-        result_mapper = ResultMapper()
-        result_data = result_mapper.run(config=result_mapper_config,frames=dataframes)
+        result_data = result_mapper.run(config=result_mapper_config, frames=dataframes, metrics=metrics)
         # 5. Run ResultProducer
         # # Conditional Segment
-        result_config = ResultProducerConfig(cls.get_exact_config())
-        response = getattr(result_producer, result_config.name)(result_config).run(result_data)
+        with metrics.stage("produce") as stage:
+            self._count(stage, result_data)
+            producer.run(result_data)
+        self._quarantine(mapper, quarantine_producer, metrics)
 
         # 6. Return Result
-        return ResultResponse(destination={})
+        return self._response(metrics)
+
+    def _download(self, bucket: str, key: str, src_mapper_cfg: SourceMapperConfig):
+        download = src_mapper_cfg.download
+        aws_service.download_s3_file(
+            bucket=bucket,
+            key=key,
+            file_name=src_mapper_cfg.file_name,
+            part_size=download.part_size,
+            max_workers=download.max_workers
+        )
+
+    def _quarantine(self, mapper: SourceMapper, producer: result_producer.AbstractResult,
+                    metrics: PipelineMetrics):
+        if mapper.quarantine is None or len(mapper.quarantine.records) == 0:
+            return
+        with metrics.stage("quarantine") as stage:
+            self._count(stage, mapper.quarantine.records)
+            producer.run_chunks([mapper.quarantine.records])
+
+    def _count(self, stage: StageMetrics, data):
+        stage.record(rows_in=count_rows(data))
+        return data
+
+    def _response(self, metrics: PipelineMetrics) -> ResultResponse:
+        if os.environ.get('metrics_log', "").lower() == "true":
+            # Single JSON line, eg. for CloudWatch Logs Insights or a metric filter
+            log.info(metrics.to_json())
+        return ResultResponse(destination={}, metrics=metrics.to_dict())
 
 
 # class FixedWidthExecutor(AbstractExecutor):
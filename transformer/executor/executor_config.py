@@ -1,6 +1,10 @@
 from transformer.library.exceptions import InvalidConfigError, MissingConfigError
 from transformer.library import common, aws_service, logger
-import re
+from transformer.executor.file_matcher import FilePatternMatcher
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+import time
 import yaml
 import os
 
@@ -8,9 +12,26 @@ import os
 log = logger.set_logger(__name__)
 
 
+@dataclass
+class CachedConfig:
+    config: dict
+    version: str
+    etag: str
+    checked_at: float
+
+
+# Remote configs kept by (bucket, key) for the lifetime of the process, eg. across warm Lambda invocations
+_configs: dict[tuple[str, str], CachedConfig] = {}
+
+# File pattern matchers by config version, least recently used first
+MATCHER_CACHE_SIZE = 8
+_matchers = OrderedDict()
+
+
 class ExecutorConfig:
     _config = dict
     _exact_config = dict
+    _version = None
 
     def __init__(self, key: str, local=None, inline=None):
         try:
@@ -22,10 +43,7 @@ class ExecutorConfig:
 
     def _retrieve_config(self, local=None, inline=None) -> dict:
         if inline:
-            cfg = yaml.safe_load(inline)
-            if isinstance(cfg, dict):
-                return cfg
-            raise InvalidConfigError()
+            return self._load(inline)
         if local is None:
             # To retrieve config using environment variables
             if os.environ['config_type'] == "local":
@@ -33,10 +51,7 @@ class ExecutorConfig:
                 log.info(f"Using Local Configuration file [{env_config[0]}]")
                 try:
                     with open(env_config[0], 'r') as file:
-                        cfg = yaml.safe_load(file)
-                        if isinstance(cfg, dict):
-                            return cfg
-                        raise InvalidConfigError()
+                        return self._load(file.read())
                 except FileNotFoundError as e:
                     raise MissingConfigError(e)
 
@@ -44,36 +59,73 @@ class ExecutorConfig:
             required_configs = ["config_bucket", "config_name"]
             env_config = common.check_environment_variables(required_configs)
             log.info(f"Using External Configuration file from S3 bucket [{env_config[0]}] with key [{env_config[1]}")
-            cfg = yaml.safe_load(
-                aws_service.download_s3_as_bytes(env_config[0], env_config[1]).read()
-            )
-            if isinstance(cfg, dict):
-                return cfg
-            raise InvalidConfigError()
+            return self._retrieve_remote_config(env_config[0], env_config[1])
         else:
             log.info(f"Using Local Configuration file [{local}]")
             try:
                 with open(local, 'r') as file:
-                    cfg = yaml.safe_load(file)
-                    if isinstance(cfg, dict):
-                        return cfg
-                    raise
+                    return self._load(file.read())
             except FileNotFoundError as e:
                 raise MissingConfigError(e)
 
+    def _retrieve_remote_config(self, bucket: str, key: str) -> dict:
+        """
+        Configs are cached per bucket and key. A cached config is used as is for [config_ttl] seconds (0 by default)
+        and is then revalidated with a conditional request on its ETag, it is only downloaded and parsed again
+        when it has changed.
+        """
+        ttl = float(os.environ.get('config_ttl', 0))
+        cached = _configs.get((bucket, key))
+        if cached is not None and time.monotonic() - cached.checked_at < ttl:
+            log.debug(f"Using cached configuration, revalidated {time.monotonic() - cached.checked_at:.0f}s ago")
+            self._version = cached.version
+            return cached.config
+        body, etag = aws_service.download_s3_if_modified(bucket, key, cached.etag if cached else None)
+        if body is None:
+            log.debug("Using cached configuration, it is not modified")
+            cached.checked_at = time.monotonic()
+            self._version = cached.version
+            return cached.config
+        cfg = self._load(body.read())
+        _configs[(bucket, key)] = CachedConfig(config=cfg, version=self._version, etag=etag, checked_at=time.monotonic())
+        return cfg
+
+    def _load(self, data) -> dict:
+        raw = data.encode() if isinstance(data, str) else data
+        self._version = hashlib.sha1(raw).hexdigest()
+        cfg = yaml.safe_load(data)
+        if isinstance(cfg, dict):
+            return cfg
+        raise InvalidConfigError()
+
     def _set_exact_config(self, key):
         if self._config['files'] is None:
             raise InvalidConfigError()
-        for k in self._config['files']:
-            pattern = self._config['files'][k]['pattern']
-            if re.match(pattern, key):
-                self._exact_config = self._config['files'][k]
-                return
+        name = self._matcher().match(key)
+        if name is not None:
+            self._exact_config = self._config['files'][name]
+            return
         raise MissingConfigError(
             f"No matching regex pattern found for file with name [{key}]. Please check configuration yaml file")
 
+    def _matcher(self) -> FilePatternMatcher:
+        if self._version in _matchers:
+            _matchers.move_to_end(self._version)
+            return _matchers[self._version]
+        matcher = FilePatternMatcher(self._config['files'])
+        _matchers[self._version] = matcher
+        if len(_matchers) > MATCHER_CACHE_SIZE:
+            _matchers.popitem(last=False)
+        return matcher
+
     def get_config(self):
         return self._config
 
     def get_exact_config(self):
         return self._exact_config
+
+    def get_version(self) -> str:
+        """
+        Hash of the configuration file, changes whenever the file content changes
+        """
+        return self._version
@@ -0,0 +1,127 @@
+from functools import lru_cache
+import re
+
+from transformer.library.exceptions import InvalidConfigError
+from transformer.library import logger
+
+log = logger.set_logger(__name__)
+
+_META_CHARACTERS = set(".^$*+?{}[]()|\\")
+_OPTIONAL_QUANTIFIERS = ("?", "*", "{")
+# Patterns referring to their own groups, with back references or conditionals such as (?(1)a|b), cannot be
+# combined, group numbers change in a combined alternation
+_BACK_REFERENCE = re.compile(r"\\[1-9]|\(\?P=|\(\?\(\d")
+
+
+class FilePatternMatcher:
+    """
+    Matches keys against the [pattern] of every file entry, with the same result as calling re.match on each
+    pattern in order and taking the first match.
+
+    Patterns are compiled once and bucketed by the first character of their literal prefix. Each bucket is
+    a single alternation of its patterns in file order, so a key is matched with one regex search. Results
+    are kept in a bounded LRU per key.
+    """
+    def __init__(self, files: dict, cache_size=1024):
+        self._names = []
+        patterns = []
+        for name in files:
+            pattern = files[name]['pattern']
+            try:
+                re.compile(pattern)
+            except (re.error, TypeError) as e:
+                raise InvalidConfigError(f"Invalid pattern [{pattern}] for file [{name}]: {e}")
+            self._names.append(name)
+            patterns.append(pattern)
+
+        buckets = {}
+        unprefixed = []
+        for index, pattern in enumerate(patterns):
+            prefix = literal_prefix(pattern)
+            if prefix:
+                buckets.setdefault(prefix[0], []).append(index)
+            else:
+                unprefixed.append(index)
+        # Patterns without a literal prefix can match any key, so they are part of every bucket
+        self._buckets = {
+            character: _Bucket(sorted(indexes + unprefixed), patterns) for character, indexes in buckets.items()
+        }
+        self._default = _Bucket(unprefixed, patterns)
+        self.match = lru_cache(maxsize=cache_size)(self._match)
+        log.debug(f"Indexed {len(patterns)} file patterns into {len(self._buckets)} buckets")
+
+    def _match(self, key: str):
+        """
+        :return: Name of the first file entry whose pattern matches key, None when there is no match
+        """
+        bucket = self._buckets.get(key[:1], self._default)
+        index = bucket.match(key)
+        return None if index is None else self._names[index]
+
+
+class _Bucket:
+    def __init__(self, indexes: list[int], patterns: list[str]):
+        self._indexes = indexes
+        self._patterns = [re.compile(patterns[i]) for i in indexes]
+        self._combined = None
+        self._groups = {}
+        if len(indexes) > 1 and not any(_BACK_REFERENCE.search(patterns[i]) for i in indexes):
+            try:
+                self._combined = re.compile("|".join(f"({patterns[i]})" for i in indexes))
+            except re.error:
+                # eg. the same group name used in two patterns
+                self._combined = None
+        if self._combined is not None:
+            group = 1
+            for index, compiled in zip(indexes, self._patterns):
+                self._groups[group] = index
+                group += compiled.groups + 1
+
+    def match(self, key: str):
+        if self._combined is not None:
+            found = self._combined.match(key)
+            return None if found is None else self._groups[found.lastindex]
+        for index, compiled in zip(self._indexes, self._patterns):
+            if compiled.match(key):
+                return index
+        return None
+
+
+def literal_prefix(pattern: str) -> str:
+    """
+    Literal text every key matched by pattern (with re.match) starts with, empty when it cannot be determined.
+    """
+    if _has_alternation(pattern):
+        return ""
+    position = 1 if pattern.startswith("^") else 0
+    prefix = []
+    while position < len(pattern):
+        character = pattern[position]
+        if character == "\\":
+            if position + 1 >= len(pattern) or pattern[position + 1].isalnum():
+                break
+            literal, step = pattern[position + 1], 2
+        elif character in _META_CHARACTERS:
+            break
+        else:
+            literal, step = character, 1
+        following = pattern[position + step:position + step + 1]
+        if following in _OPTIONAL_QUANTIFIERS:
+            break
+        prefix.append(literal)
+        if following == "+":
+            break
+        position += step
+    return "".join(prefix)
+
+
+def _has_alternation(pattern: str) -> bool:
+    position = 0
+    while position < len(pattern):
+        if pattern[position] == "\\":
+            position += 2
+            continue
+        if pattern[position] == "|":
+            return True
+        position += 1
+    return False
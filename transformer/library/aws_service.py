@@ -1,18 +1,38 @@
 from transformer.library import logger
 import os
-import boto3
 import json
-import botocore.exceptions as be
 
 log = logger.set_logger(__name__)
 
 
-def download_s3_file(bucket: str, key: str, file_name: str, client=None):
+def _boto3():
+    # boto3 and botocore are a large share of cold start time, they are imported on the first AWS call
+    import boto3
+    return boto3
+
+
+def _client_error():
+    from botocore.exceptions import ClientError
+    return ClientError
+
+
+def download_s3_file(bucket: str, key: str, file_name: str, client=None, part_size=None, max_workers=None):
+    """
+    :param part_size: Size in bytes of each ranged GET of a multipart download
+    :param max_workers: Number of parts downloaded concurrently
+    """
     log.info(f'Starting to download S3 file {key} from bucket [{bucket}] to local file [{file_name}]')
     if client is None:
-        client = boto3.resource('s3')
+        client = _boto3().resource('s3')
+    transfer_args = {}
+    if part_size is not None:
+        transfer_args['multipart_threshold'] = part_size
+        transfer_args['multipart_chunksize'] = part_size
+    if max_workers is not None:
+        transfer_args['max_concurrency'] = max_workers
     try:
-        client.meta.client.download_file(bucket, key, file_name)
+        from boto3.s3.transfer import TransferConfig
+        client.meta.client.download_file(bucket, key, file_name, Config=TransferConfig(**transfer_args))
         log.info(f'File Downloaded!')
         return file_name
     except Exception as e:
@@ -23,7 +43,7 @@ def download_s3_file(bucket: str, key: str, file_name: str, client=None):
 def upload_s3_file(file_name, bucket, s3_file_key, client=None):
     log.info(f'Starting to upload S3 file {s3_file_key} from bucket [{bucket}] from local file [{file_name}]')
     if client is None:
-        client = boto3.resource('s3')
+        client = _boto3().resource('s3')
     try:
         response = client.meta.client.upload_file(file_name, bucket, s3_file_key)
         log.info(f'File Uploaded!')
@@ -33,18 +53,59 @@ def upload_s3_file(file_name, bucket, s3_file_key, client=None):
         log.error(e)
 
 
+def upload_s3_fileobj(fileobj, bucket: str, s3_key: str, client=None):
+    log.info(f'Starting to upload S3 file {s3_key} from bucket [{bucket}] from file object')
+    if client is None:
+        client = _boto3().client('s3')
+    client.upload_fileobj(fileobj, bucket, s3_key)
+    log.info(f'File Uploaded!')
+
+
 def download_s3_as_bytes(bucket: str, s3_key: str, client=None):
     log.info(f'Starting to download S3 file {s3_key} from bucket [{bucket}] to memory')
     if client is None:
-        client = boto3.client('s3')
+        client = _boto3().client('s3')
     response = client.get_object(Bucket=bucket, Key=s3_key)
     return response['Body']
 
 
+def download_s3_if_modified(bucket: str, s3_key: str, etag=None, client=None):
+    """
+    Conditional GET of an S3 object, the object is only downloaded when its ETag differs from [etag].
+
+    :return: (Body, ETag) of the object, Body is None when it has not been modified
+    """
+    if client is None:
+        client = _boto3().client('s3')
+    arguments = {'Bucket': bucket, 'Key': s3_key}
+    if etag is not None:
+        arguments['IfNoneMatch'] = etag
+    try:
+        response = client.get_object(**arguments)
+    except _client_error() as e:
+        if e.response.get('Error', {}).get('Code') in ('304', 'NotModified'):
+            log.info(f'S3 file {s3_key} from bucket [{bucket}] is not modified')
+            return None, etag
+        raise e
+    log.info(f'Downloaded S3 file {s3_key} from bucket [{bucket}] to memory')
+    return response['Body'], response['ETag']
+
+
+def download_s3_range(bucket: str, s3_key: str, byte_range: str, client=None):
+    """
+    :param byte_range: HTTP Range header value, eg. bytes=0-99 or bytes=-100 for the last 100 bytes
+    """
+    log.info(f'Starting to download range [{byte_range}] of S3 file {s3_key} from bucket [{bucket}] to memory')
+    if client is None:
+        client = _boto3().client('s3')
+    response = client.get_object(Bucket=bucket, Key=s3_key, Range=byte_range)
+    return response['Body']
+
+
 def upload_s3_with_bytes(bucket: str, s3_key: str, bytes, client=None):
     log.info(f'Starting to upload S3 file {s3_key} from bucket [{bucket}] from memory')
     if client is None:
-        client = boto3.client('s3')
+        client = _boto3().client('s3')
     response = client.put_object(
         Bucket=bucket,
         Key=s3_key,
@@ -56,7 +117,7 @@ def upload_s3_with_bytes(bucket: str, s3_key: str, bytes, client=None):
 
 def retrieve_secret(secret_name: str):
     region_name = os.environ['region']
-    session = boto3.Session()
+    session = _boto3().Session()
     client = session.client(
         service_name='secretsmanager',
         region_name=region_name
@@ -65,14 +126,14 @@ def retrieve_secret(secret_name: str):
         return json.loads(client.get_secret_value(
             SecretId=secret_name
         )['SecretString'])
-    except be.ClientError as e:
+    except _client_error() as e:
         print(e)
     raise Exception(f'Failed to retrieve secret [{secret_name}] from SecretsManager')
 
 
 def retrieve_cluster_arn(cluster_name: str, client=None):
     if client is None:
-        client = boto3.client('kafka')
+        client = _boto3().client('kafka')
     response = client.list_clusters(
         ClusterNameFilter=cluster_name,
         MaxResults=3
@@ -84,6 +145,6 @@ def retrieve_cluster_arn(cluster_name: str, client=None):
 
 def retrieve_bootstrap_servers(cluster_name, client=None):
     if client is None:
-        client = boto3.client('kafka')
+        client = _boto3().client('kafka')
     cluster_arn = retrieve_cluster_arn(cluster_name, client)
     return client.get_bootstrap_brokers(ClusterArn=cluster_arn)['BootstrapBrokerStringSaslScram']
\ No newline at end of file
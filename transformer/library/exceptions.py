@@ -35,22 +35,33 @@ class ValidationError(Exception):
     fieldName: str
     failCount: int
     recordCount: int
+    rows: list
 
-    def __init__(self, msg: str, segment: str, field_name: str, fail_count: int, record_count: int) -> None:
+    def __init__(self, msg: str, segment: str, field_name: str, fail_count: int, record_count: int,
+                 rows: list = None) -> None:
+        """
+        :param rows: Positions of the failing rows, when the validator reports them
+        """
         self.segment = segment
         self.fieldName = field_name
         self.failCount = fail_count
         self.recordCount = record_count
+        self.rows = rows
         super().__init__(msg)
 
 
 class ConversionError(Exception):
     segment: str
     field_name: str
+    rows: list
 
-    def __init__(self, msg: str, segment: str, field_name: str):
+    def __init__(self, msg: str, segment: str, field_name: str, rows: list = None):
+        """
+        :param rows: Positions of the rows that could not be converted, when known
+        """
         self.segment = segment
         self.field_name = field_name
+        self.rows = rows
         super().__init__(msg)
 
 
@@ -68,4 +79,8 @@ class SourceFileError(Exception):
 
     def __init__(self, msg, file_name):
         self.file_name = file_name
-        super().__init__(msg)
\ No newline at end of file
+        super().__init__(msg)
+
+    def __reduce__(self):
+        # Keeps the error picklable so it can be sent back from parser processes
+        return SourceFileError, (str(self), self.file_name)
\ No newline at end of file
@@ -1,13 +1,12 @@
 import json
 from transformer.library.aws_service import retrieve_secret, retrieve_bootstrap_servers
 from transformer.library import logger
-import boto3
-from kafka import KafkaProducer
 
 log = logger.set_logger(__name__)
 
 
 def connect_producer_with_cluster_name(cluster_name: str, secret_name: str, batch_size: int, retries=3):
+    from kafka import KafkaProducer
     bootstrap_servers = retrieve_bootstrap_servers(cluster_name)
     secret = retrieve_secret(secret_name)
     return KafkaProducer(
@@ -25,6 +24,7 @@ def connect_producer_with_cluster_name(cluster_name: str, secret_name: str, batc
 
 
 def connect_producer_with_url(broker_urls: str, secret_name: str, batch_size: int, retries=3):
+    from kafka import KafkaProducer
     secret = retrieve_secret(secret_name)
     return KafkaProducer(
         bootstrap_servers=broker_urls,
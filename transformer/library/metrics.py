@@ -0,0 +1,185 @@
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Iterator
+import json
+import os
+import resource
+import time
+import tracemalloc
+
+# Allocation sites reported per stage when memory metrics are enabled
+TOP_ALLOCATIONS = 10
+
+
+@dataclass
+class StageMetrics:
+    name: str
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    calls: int = 0
+    rows_in: int = None
+    rows_out: int = None
+    bytes: int = None
+    # Only set when memory metrics are enabled, see PipelineMetrics
+    memory: dict = None
+
+    def record(self, rows_in: int = None, rows_out: int = None, bytes: int = None):
+        """
+        Adds to the counts of the stage, a stage that runs once per chunk adds up over every chunk
+        """
+        if rows_in is not None:
+            self.rows_in = (self.rows_in or 0) + rows_in
+        if rows_out is not None:
+            self.rows_out = (self.rows_out or 0) + rows_out
+        if bytes is not None:
+            self.bytes = (self.bytes or 0) + bytes
+
+
+class PipelineMetrics:
+    """
+    Wall time, CPU time (of this process) and row and byte counts of every stage of an execution, in the order
+    the stages first ran. Time spent in a stage nested in another one is only counted for the nested stage.
+
+    Memory metrics are opt-in, with the environment variable memory_metrics set to true, as tracemalloc slows
+    down every allocation. Each stage then also reports:
+    peak_rss_bytes: Largest process RSS sampled when the stage and its nested stages started and ended. Sampled from
+    /proc/self/statm rather than the lifetime high-water mark, so a warm process reports the peak of this run only
+    traced_peak_bytes: Peak of the memory allocated by Python while the stage ran, from tracemalloc
+    top_allocations: Lines that allocated the most memory during the stage and still hold it at its end, only for
+    outermost stages as every snapshot walks all traced allocations
+    frame_bytes: DataFrame memory_usage(deep=True) per segment, for stages producing DataFrames
+    Tracing is started with the outermost stage and stopped when it ends, so warm processes do not keep tracing.
+    """
+    def __init__(self, memory: bool = None):
+        self.stages: dict[str, StageMetrics] = {}
+        self._nested = []
+        # Whether tracemalloc was started by these metrics, and so must be stopped by them
+        self._tracing = False
+        if memory is None:
+            memory = os.environ.get('memory_metrics', "").lower() == "true"
+        self.memory = memory
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageMetrics]:
+        metrics = self.stages.setdefault(name, StageMetrics(name=name))
+        snapshot = self._start_memory() if self.memory else None
+        rss = current_rss() if self.memory else None
+        self._nested.append([0.0, 0.0, 0, rss])
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield metrics
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            nested_wall, nested_cpu, nested_peak, rss = self._nested.pop()
+            metrics.wall_seconds += wall - nested_wall
+            metrics.cpu_seconds += cpu - nested_cpu
+            metrics.calls += 1
+            peak, rss = self._end_memory(metrics, snapshot, nested_peak, rss) if self.memory else (0, None)
+            if len(self._nested) > 0:
+                self._nested[-1][0] += wall
+                self._nested[-1][1] += cpu
+                self._nested[-1][2] = max(self._nested[-1][2], peak)
+                self._nested[-1][3] = _max(self._nested[-1][3], rss)
+
+    def record_frames(self, stage: StageMetrics, frames: dict):
+        """
+        Records the deep memory usage of every DataFrame in frames, only when memory metrics are enabled.
+        A stage that runs once per chunk keeps the largest usage of every segment.
+        """
+        if not self.memory:
+            return
+        memory = stage.memory if stage.memory is not None else {}
+        frame_bytes = memory.setdefault('frame_bytes', {})
+        for segment in frames:
+            frame_bytes[segment] = max(frame_bytes.get(segment, 0), int(frames[segment].memory_usage(deep=True).sum()))
+        stage.memory = memory
+
+    def _start_memory(self):
+        """
+        :return: Snapshot of the allocations at the start of an outermost stage, None for nested stages
+        """
+        if len(self._nested) > 0:
+            # The peak is reset for this stage, keep what the enclosing stage reached so far
+            self._nested[-1][2] = max(self._nested[-1][2], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            return None
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        tracemalloc.reset_peak()
+        return _snapshot()
+
+    def _end_memory(self, metrics: StageMetrics, snapshot, nested_peak: int, rss: int = None) -> tuple[int, int]:
+        """
+        :param rss: Largest RSS sampled so far while the stage ran, None where /proc is not available
+        :return: (traced peak, largest RSS sampled) of the stage, including its nested stages
+        """
+        peak = max(tracemalloc.get_traced_memory()[1], nested_peak)
+        rss = _max(rss, current_rss())
+        memory = metrics.memory if metrics.memory is not None else {}
+        if rss is not None:
+            memory['peak_rss_bytes'] = max(memory.get('peak_rss_bytes', 0), rss)
+        if peak >= memory.get('traced_peak_bytes', 0):
+            memory['traced_peak_bytes'] = peak
+            if snapshot is not None:
+                # Allocation sites are kept for the call with the highest peak, eg. the largest chunk
+                memory['top_allocations'] = [{
+                    "site": str(difference.traceback),
+                    "size_bytes": difference.size_diff,
+                    "count": difference.count_diff
+                } for difference in _snapshot().compare_to(snapshot, 'lineno')[:TOP_ALLOCATIONS]]
+        metrics.memory = memory
+        if len(self._nested) == 0 and self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+        return peak, rss
+
+    def to_dict(self) -> dict:
+        return {
+            "wall_seconds": sum(stage.wall_seconds for stage in self.stages.values()),
+            "cpu_seconds": sum(stage.cpu_seconds for stage in self.stages.values()),
+            "stages": [_stage_dict(stage) for stage in self.stages.values()]
+        }
+
+    def to_json(self) -> str:
+        return json.dumps({"metrics": self.to_dict()})
+
+
+def _stage_dict(stage: StageMetrics) -> dict:
+    data = asdict(stage)
+    if stage.memory is None:
+        del data['memory']
+    return data
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+
+def current_rss() -> int:
+    """
+    Current RSS of the process, None where /proc is not available (eg. macOS)
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _max(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def count_rows(frames) -> int:
+    """
+    Rows of a dict of DataFrames, or of a list of results
+    """
+    if isinstance(frames, dict):
+        return sum(len(frame.index) for frame in frames.values())
+    if isinstance(frames, list):
+        return len(frames)
+    return 1
@@ -0,0 +1,80 @@
+"""
+Str columns are held either as Python str objects (object dtype) or, with the arrow_strings source option, as Arrow
+strings (string[pyarrow]). These helpers work on both without turning Arrow strings into Python objects.
+pyarrow is only imported once an Arrow column is met, so it is only required by configs that use Arrow strings.
+"""
+import numpy as np
+import pandas as pd
+
+ARROW_STRING = "string[pyarrow]"
+
+
+def is_arrow_string(series: pd.Series) -> bool:
+    dtype = series.dtype
+    return isinstance(dtype, pd.StringDtype) and dtype.storage == "pyarrow"
+
+
+def is_arrow_category(series: pd.Series) -> bool:
+    """
+    Whether series is a categorical of Arrow strings, eg. an Arrow string column dictionary encoded by the memory
+    optimiser
+    """
+    return isinstance(series.dtype, pd.CategoricalDtype) and isinstance(series.dtype.categories.dtype, pd.StringDtype) \
+        and series.dtype.categories.dtype.storage == "pyarrow"
+
+
+def arrow_array(series: pd.Series):
+    """
+    pyarrow StringArray of an Arrow string series, in a single chunk. Categoricals of Arrow strings are decoded by
+    taking their codes from the Arrow categories, missing values are null
+    """
+    if is_arrow_category(series):
+        import pyarrow as pa
+        codes = series.cat.codes.to_numpy()
+        categories = series.dtype.categories.array.__arrow_array__().combine_chunks()
+        return categories.take(pa.array(codes, mask=codes < 0))
+    return series.array.__arrow_array__().combine_chunks()
+
+
+def from_bytes(column: np.ndarray, index: pd.Index = None) -> pd.Series:
+    """
+    Arrow string series of an array of byte strings (numpy S dtype), whose offsets and data buffers are built from
+    the bytes directly. Values must be UTF-8.
+    """
+    import pyarrow as pa
+    width = column.dtype.itemsize
+    lengths = np.char.str_len(column) if width > 0 else np.zeros(len(column), dtype=np.int64)
+    offsets = np.zeros(len(column) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    if offsets[-1] > np.iinfo(np.int32).max:
+        raise ValueError("Arrow string columns are limited to 2GB, process the file in chunks with chunk_size")
+    matrix = column.view(np.uint8).reshape(len(column), width)
+    data = matrix[np.arange(width) < lengths[:, None]]
+    array = pa.StringArray.from_buffers(len(column), pa.py_buffer(offsets.astype(np.int32)), pa.py_buffer(data))
+    try:
+        array.validate(full=True)
+    except pa.ArrowInvalid as e:
+        raise ValueError(f"Values are not valid UTF-8: {e}")
+    return pd.Series(pd.arrays.ArrowStringArray(array), index=index)
+
+
+def code_points(values) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Characters of every value as a rows x characters matrix of code points, padded with 0 after the end of each
+    value. Arrow strings give their UTF-8 bytes, which are the code points of ASCII values.
+
+    :return: (matrix, True for missing values)
+    """
+    if isinstance(values, pd.Series) and is_arrow_string(values):
+        array = arrow_array(values)
+        _, offsets, data = array.buffers()
+        offsets = np.frombuffer(offsets, dtype=np.int32)[array.offset:array.offset + len(array) + 1]
+        lengths = np.diff(offsets)
+        width = max(int(lengths.max(initial=0)), 1)
+        matrix = np.zeros((len(array), width), dtype=np.uint8)
+        if data is not None:
+            matrix[np.arange(width) < lengths[:, None]] = np.frombuffer(data, dtype=np.uint8)[offsets[0]:offsets[-1]]
+        return matrix, array.is_null().to_numpy(zero_copy_only=False)
+    values = values.to_numpy(dtype=object) if isinstance(values, pd.Series) else np.asarray(values, dtype=object)
+    text = values.astype(str)
+    return text.view(np.uint32).reshape(len(text), text.dtype.itemsize // 4), pd.isna(values)
@@ -1,10 +1,11 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 
 @dataclass
 class ResultResponse:
     destination: dict
-    pass
+    # Per stage wall time, CPU time, rows and bytes, see PipelineMetrics.to_dict
+    metrics: dict = field(default_factory=dict)
 
 
 @dataclass
@@ -1,5 +1,6 @@
 import pandas as pd
 import transformer.result.generator as generator
+from transformer.library.strings import arrow_array, is_arrow_category, is_arrow_string
 from transformer.result.result_config import ResultFormatterConfig, ResultFieldFormat
 
 
@@ -23,11 +24,11 @@ class DefaultArrayResultFormatter(AbstractResultFormatter):
                 if len(d.index) == 1:
                     # Multiple Content
                     data.append(pd.DataFrame({
-                        key: d.to_dict('records') * max_count
+                        key: _records(d) * max_count
                     }))
                 else:
                     data.append(pd.DataFrame({
-                        key: d.to_dict('records')
+                        key: _records(d)
                     }))
             if len(data) == 1:
                 return data[0].to_dict('records')
@@ -45,11 +46,11 @@ class DefaultArrayResultFormatter(AbstractResultFormatter):
             if len(frames[f].index) == 1:
                 # Multiple Content
                 data.append(pd.DataFrame({
-                    f: frames[f].to_dict('records') * max_count
+                    f: _records(frames[f]) * max_count
                 }))
             else:
                 data.append(pd.DataFrame({
-                    f: frames[f].to_dict('records')
+                    f: _records(frames[f])
                 }))
         if len(data) == 1:
             return data[0].to_dict('records')
@@ -60,8 +61,9 @@ class DefaultArrayResultFormatter(AbstractResultFormatter):
         field_frames = []
         for field in segment:
             if "." in field.value:
-                splits = field.value.split(".")
-                f = frames[splits[-2]][splits[-1]].to_frame()
+                # The frame name can hold a dot itself, eg. ref.<table>.<column> of enriched frames
+                splits = field.value.rsplit(".", 1)
+                f = frames[splits[0]][splits[1]].to_frame()
                 f = f.rename(columns={f.columns[0]: field.name})
                 field_frames.append(f)
             else:
@@ -70,6 +72,22 @@ class DefaultArrayResultFormatter(AbstractResultFormatter):
                 field_frames.append(pd.DataFrame({field.name: generated_data}))
         return pd.concat(field_frames, axis=1)
 
+
+def _records(frame: pd.DataFrame) -> list[dict]:
+    """
+    Same as frame.to_dict('records'), except that frames with Arrow string columns are zipped into dicts from a list
+    of every column, as to_dict goes through Arrow strings value by value. Their missing values are None, also for
+    Arrow strings dictionary encoded as categoricals.
+    """
+    arrow = [is_arrow_string(frame[name]) or is_arrow_category(frame[name]) for name in frame.columns]
+    if not any(arrow):
+        return frame.to_dict('records')
+    names = list(frame.columns)
+    columns = [arrow_array(frame[name]).to_numpy(zero_copy_only=False).tolist() if is_arrow
+               else frame[name].tolist() for name, is_arrow in zip(names, arrow)]
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
 # class JsonArrayResultMapper(AbstractResultFormatter):
 #     """
 #     This ResultMapper maps incoming dataframes and returns it as list
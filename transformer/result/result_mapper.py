@@ -4,18 +4,23 @@ import transformer.result.result_formatter as fmt
 from transformer.validator import validator, ValidatorConfig
 from transformer.result.result_config import ResultMapperConfig, ResultFormatterConfig
 from transformer.library.exceptions import ValidationError, ValidationFailureError
+from transformer.library.metrics import PipelineMetrics, count_rows
 
 current_module = sys.modules[__name__]
 
 
 class ResultMapper:
-    def run(self, config: ResultMapperConfig, frames: dict[str, pd.DataFrame]):
+    def run(self, config: ResultMapperConfig, frames: dict[str, pd.DataFrame], metrics: PipelineMetrics = None):
         # 1. Run ResultFormatter + Generator
         # 2. Validate
         # Final: Return Result
-
-        data = self._format(config.format, frames)
-        self._validate(config.validators, data)
+        metrics = metrics or PipelineMetrics()
+        with metrics.stage("result_format") as stage:
+            data = self._format(config.format, frames)
+            stage.record(rows_in=count_rows(frames), rows_out=count_rows(data))
+        with metrics.stage("result_validate") as stage:
+            stage.record(rows_in=count_rows(data))
+            self._validate(config.validators, data)
         return data
 
     def _format(self, config: ResultFormatterConfig, frames) -> dict[str, pd.DataFrame]:
@@ -1,9 +1,16 @@
+import json
+import tempfile
+from typing import Iterable
+
 from transformer.result import ResultProducerConfig
-from transformer.library import logger, aws_service
-from transformer.library.kafka_service import connect_producer_with_url, connect_producer_with_cluster_name
+from transformer.library import logger, aws_service, kafka_service
+from transformer.library.exceptions import InvalidConfigError
 
 log = logger.set_logger()
 
+JSON = "json"
+JSON_LINES = "jsonl"
+
 
 class AbstractResult:
     arguments: dict
@@ -13,37 +20,109 @@ class AbstractResult:
 
     def run(self, data): pass
 
+    def run_chunks(self, chunks: Iterable):
+        """
+        Produces results that arrive in chunks, eg. when the file is processed with chunk_size.
+        """
+        for data in chunks:
+            self.run(data)
+
 
 class S3ResultProducer(AbstractResult):
+    """
+    Uploads results to [bucket] / [key] in the same [format] whether they are produced at once or in chunks:
+    json (default) for a JSON array of every record, or jsonl for JSON lines
+    """
     def __init__(self, config: ResultProducerConfig):
         super().__init__(config)
+        self.format = self.arguments.get('format', JSON)
+        if self.format not in (JSON, JSON_LINES):
+            raise InvalidConfigError(f"Argument [format] of S3ResultProducer must be {JSON} or {JSON_LINES}.")
 
     def run(self, data):
         aws_service.upload_s3_with_bytes(
             bucket=self.arguments['bucket'],
             s3_key=self.arguments['key'],
-            bytes=data
+            bytes=b"".join(_encode([data], self.format))
         )
 
+    def run_chunks(self, chunks: Iterable):
+        # Chunks are spooled to a file so the object is uploaded once without holding every chunk in memory
+        with tempfile.TemporaryFile() as file:
+            file.writelines(_encode(chunks, self.format))
+            file.seek(0)
+            aws_service.upload_s3_fileobj(
+                fileobj=file,
+                bucket=self.arguments['bucket'],
+                s3_key=self.arguments['key']
+            )
+
+
+def _encode(chunks: Iterable, output_format: str) -> Iterable[bytes]:
+    """
+    Encoded records of every chunk, a chunk being a list of records or a single record
+    """
+    if output_format == JSON:
+        yield b"["
+    first = True
+    for data in chunks:
+        for d in (data if isinstance(data, list) else [data]):
+            encoded = json.dumps(d, default=str).encode('utf-8')
+            if output_format == JSON_LINES:
+                yield encoded + b"\n"
+            else:
+                yield encoded if first else b", " + encoded
+            first = False
+    if output_format == JSON:
+        yield b"]"
+
+
+class LocalResultProducer(AbstractResult):
+    """
+    Writes results to the local file [file_name] as JSON lines
+    """
+    def __init__(self, config: ResultProducerConfig):
+        super().__init__(config)
+
+    def run(self, data):
+        self.run_chunks([data])
+
+    def run_chunks(self, chunks: Iterable):
+        with open(self.arguments['file_name'], 'w') as file:
+            for data in chunks:
+                for d in (data if isinstance(data, list) else [data]):
+                    file.write(json.dumps(d, default=str))
+                    file.write("\n")
+
 
 class MSKScramResultProducer(AbstractResult):
     def __init__(self, config: ResultProducerConfig):
         super().__init__(config)
 
     def run(self, data: list):
+        producer = self._connect()
+        self._send(producer, data)
+
+    def run_chunks(self, chunks: Iterable):
+        producer = self._connect()
+        for data in chunks:
+            self._send(producer, data)
+        producer.flush()
+
+    def _connect(self):
         if 'brokerUrls' in self.arguments.keys():
-            producer = connect_producer_with_url(
+            return kafka_service.connect_producer_with_url(
                 broker_urls=self.arguments['brokerUrls'],
                 secret_name=self.arguments['secretName'],
                 batch_size=self.arguments['batchSize']
             )
-        else:
-            producer = connect_producer_with_cluster_name(
-                cluster_name=self.arguments['clusterName'],
-                secret_name=self.arguments['secretName'],
-                batch_size=self.arguments['batchSize']
-            )
+        return kafka_service.connect_producer_with_cluster_name(
+            cluster_name=self.arguments['clusterName'],
+            secret_name=self.arguments['secretName'],
+            batch_size=self.arguments['batchSize']
+        )
 
+    def _send(self, producer, data: list):
         for m in data:
             producer.send(
                 topic=self.arguments['topic'],
@@ -1,2 +1,2 @@
-from transformer.source.source_config import SourceMapperConfig, SourceFormatterConfig
+from transformer.source.source_config import SourceMapperConfig, SourceFormatterConfig, SourceReaderConfig
 from transformer.source.source_mapper import SourceMapper
@@ -0,0 +1,104 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from transformer.library import logger
+from transformer.library.strings import is_arrow_string
+
+log = logger.set_logger(__name__)
+
+
+@dataclass(frozen=True)
+class MemoryOptimiserConfig:
+    """
+    :param category_ratio: Most distinct values per row of a str column for it to be dictionary encoded, eg. 0.5 when
+    every value is repeated twice on average. 0 leaves str columns as they are
+    """
+    category_ratio: float = 0.5
+
+
+@dataclass
+class SegmentMemory:
+    """
+    :param bytes_before: Memory used by the frames of the segment before they were optimised, deep
+    :param bytes_after: Memory used by the optimised frames
+    :param columns: Dtype of every column that was changed
+    """
+    bytes_before: int = 0
+    bytes_after: int = 0
+    columns: dict = field(default_factory=dict)
+
+    @property
+    def saved(self) -> int:
+        return self.bytes_before - self.bytes_after
+
+
+class MemoryOptimiser:
+    """
+    Shrinks the converted frames of a file. Numeric columns are downcast to the smallest dtype holding every value
+    exactly, and str columns (Python or Arrow strings) with few distinct values are dictionary encoded as categoricals.
+    The memory saved is added up in report per segment, over every chunk of the file.
+    """
+    def __init__(self, config: MemoryOptimiserConfig):
+        self.config = config
+        self.report = {}
+
+    def run(self, frames: dict[str, pd.DataFrame]) -> dict[str, pd.DataFrame]:
+        return {segment: self.optimise(segment, frame) for segment, frame in frames.items()}
+
+    def optimise(self, segment: str, frame: pd.DataFrame) -> pd.DataFrame:
+        memory = self.report.setdefault(segment, SegmentMemory())
+        before = frame.memory_usage(deep=True)
+        after = before.copy()
+        columns = {}
+        for name in frame.columns:
+            column = self._column(frame[name])
+            if column is None:
+                continue
+            size = column.memory_usage(deep=True, index=False)
+            # Categories of short columns can take more than their values
+            if size < before[name]:
+                columns[name] = column
+                after[name] = size
+                memory.columns[name] = str(column.dtype)
+        memory.bytes_before += int(before.sum())
+        memory.bytes_after += int(after.sum())
+        if not columns:
+            return frame
+        frame = frame.copy(deep=False)
+        for name, column in columns.items():
+            frame[name] = column
+        return frame
+
+    def log_report(self, file_name: str):
+        for segment, memory in self.report.items():
+            log.info(f"Optimised {segment} of {file_name} from {memory.bytes_before} to {memory.bytes_after} bytes, "
+                     f"saving {memory.saved} bytes with {memory.columns}")
+
+    def _column(self, column: pd.Series):
+        """
+        :return: Smaller equivalent of column, None when there is none
+        """
+        dtype = column.dtype
+        if pd.api.types.is_bool_dtype(dtype):
+            return None
+        if pd.api.types.is_integer_dtype(dtype):
+            narrow = pd.to_numeric(column, downcast='unsigned' if pd.api.types.is_unsigned_integer_dtype(dtype)
+                                   else 'integer')
+            return narrow if narrow.dtype.itemsize < dtype.itemsize else None
+        if pd.api.types.is_float_dtype(dtype):
+            if dtype.itemsize <= 4:
+                return None
+            # float32 only when every value is the same after the round trip, eg. not 0.1
+            narrow = column.astype(np.float32)
+            return narrow if np.array_equal(narrow.to_numpy(dtype=np.float64), column.to_numpy(), equal_nan=True) \
+                else None
+        if (dtype == object or is_arrow_string(column)) and self.config.category_ratio > 0 and len(column.index) > 0:
+            # Categories of Arrow string columns stay Arrow strings
+            codes, uniques = pd.factorize(column)
+            if len(uniques) > self.config.category_ratio * len(column.index):
+                return None
+            return pd.Series(pd.Categorical.from_codes(codes, categories=uniques), index=column.index,
+                             name=column.name)
+        return None
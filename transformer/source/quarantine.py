@@ -0,0 +1,136 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from transformer.library import logger
+from transformer.library.exceptions import ValidationFailureError
+from transformer.validator import SegmentFailures
+
+log = logger.set_logger(__name__)
+
+
+@dataclass(frozen=True)
+class QuarantineConfig:
+    """
+    :param threshold: Most rows of a segment that can be quarantined before the file fails.
+    Values below 1 are a fraction of the rows of the segment, eg. 0.01 for 1%
+    :param name: ResultProducer the quarantined rows are sent with, eg. LocalResultProducer or S3ResultProducer
+    :param arguments: Arguments of the producer
+    """
+    threshold: float
+    name: str
+    arguments: dict
+
+
+class Quarantine:
+    """
+    Body rows that failed row validators, diverted from the frames of a file so the valid rows carry on.
+    Every quarantined row is kept as a record with the raw line and the validators it failed.
+    """
+    def __init__(self, config: QuarantineConfig, file_name: str):
+        self.config = config
+        self.file_name = file_name
+        self.records = []
+        self.counts = {}
+        self.rows = {}
+        self.totals = {}
+        self.errors = {}
+
+    def expect(self, segment: str, rows: int):
+        """
+        Total rows of a segment, known before its chunks are diverted. A fraction threshold is then checked on every chunk
+        """
+        self.totals[segment] = rows
+
+    def divert(self, segment: str, frame: pd.DataFrame, failures: SegmentFailures, lines: memoryview,
+               offset=0, fixed_length=False) -> pd.DataFrame:
+        """
+        :param lines: Raw lines the frame was parsed from
+        :param offset: Row of the segment the frame starts at, eg. of a chunk
+        :param fixed_length: Whether every line has the same length, so failing lines are sliced at their offset
+        :return: Rows of frame that did not fail any validator
+        """
+        self.rows[segment] = self.rows.get(segment, 0) + len(frame.index)
+        failed = failures.rows
+        if not failed.any():
+            return frame
+        positions = np.flatnonzero(failed)
+        self.errors.setdefault(segment, []).extend(failures.errors)
+        for position, line in zip(positions, _lines(lines, positions, fixed_length)):
+            self.records.append({
+                "file_name": self.file_name,
+                "segment": segment,
+                "row": int(offset + position),
+                "line": line,
+                "reasons": [f"{field_name}.{name}" for (field_name, name), failure
+                            in zip(failures.rules, failures.bitmap[position]) if failure]
+            })
+        self.counts[segment] = self.counts.get(segment, 0) + len(positions)
+        log.warning(f"Quarantined {len(positions)} rows of {segment} in {self.file_name}")
+        return frame[~failed].reset_index(drop=True)
+
+    def check(self, final=True):
+        """
+        Fails the file when a segment quarantined more rows than the threshold, with the validation errors of the
+        segment. A fraction is checked against the expected total rows of the segment, or when [final] once every row
+        of the segment has been seen.
+        """
+        threshold = self.config.threshold
+        for segment, count in self.counts.items():
+            if threshold < 1:
+                total = self.rows[segment] if final else self.totals.get(segment)
+                if total is None or count <= threshold * total:
+                    continue
+            elif count <= threshold:
+                continue
+            raise ValidationFailureError(
+                f"Quarantined {count}/{self.totals.get(segment, self.rows[segment])} rows of {segment}, "
+                f"above the threshold of {threshold}",
+                self.errors[segment]
+            )
+
+
+def _lines(data: memoryview, positions: np.ndarray, fixed_length=False) -> list[str]:
+    """
+    Raw lines at the row positions of a frame parsed from data, None for positions past the last line.
+    Only the lines at positions are sliced and decoded
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    if fixed_length:
+        length = _record_length(buffer)
+        bounds = [(position * length, position * length + length - 1) for position in positions]
+    else:
+        starts, ends = _line_bounds(buffer)
+        bounds = [(starts[position], ends[position]) if position < len(starts) else (len(buffer), len(buffer))
+                  for position in positions]
+    return [bytes(data[start:min(end, len(buffer))]).rstrip(b"\r").decode('utf-8', errors='replace')
+            if start < len(buffer) else None for start, end in bounds]
+
+
+def _record_length(buffer: np.ndarray, window=65536) -> int:
+    """
+    Length of the records of a fixed length segment with their line break, from its first line
+    """
+    for start in range(0, len(buffer), window):
+        breaks = np.flatnonzero(buffer[start:start + window] == 0x0A)
+        if len(breaks) > 0:
+            return start + int(breaks[0]) + 1
+    return len(buffer) + 1
+
+
+def _line_bounds(buffer: np.ndarray) -> tuple:
+    """
+    Offsets of the lines of a segment from the positions of its line breaks.
+    Blank lines are skipped by the formatters, so they are left out
+    """
+    breaks = np.flatnonzero(buffer == 0x0A)
+    starts = np.concatenate(([0], breaks + 1))
+    ends = np.concatenate((breaks, [len(buffer)]))
+    if starts[-1] == len(buffer):
+        starts, ends = starts[:-1], ends[:-1]
+    if len(starts) == 0:
+        return starts, ends
+    # A line is blank when it only holds whitespace and control bytes
+    filled = (ends > starts) & np.logical_or.reduceat(buffer > 0x20, starts)
+    return starts[filled], ends[filled]
@@ -1,9 +1,18 @@
+from collections import OrderedDict
+import dataclasses
 from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping
+
+import numpy as np
 
 from transformer.library import exceptions
-from transformer.validator import ValidatorConfig, ValidatorFieldConfig
-from transformer.converter import ConverterConfig
+from transformer.validator import ValidatorConfig, ValidatorFieldConfig, ValidatorEngine, validator
+from transformer.converter import ConverterConfig, converter
 from transformer.library import logger
+from transformer.source import source_reader
+from transformer.source.quarantine import QuarantineConfig
+from transformer.source.memory_optimiser import MemoryOptimiserConfig
 import sys
 
 
@@ -12,12 +21,88 @@ current_module = sys.modules[__name__]
 log = logger.set_logger(__name__)
 
 
-@dataclass
+TRIM_SIDES = ["both", "left", "right"]
+
+
+@dataclass(frozen=True)
+class TrimConfig:
+    """
+    :param side: both, left or right
+    :param characters: Pad characters to strip, eg. "0" for leading zeros. None strips whitespace
+    """
+    side: str = "both"
+    characters: str = None
+
+
+@dataclass(frozen=True)
 class SourceFormatterConfig:
     name: str
     segment: str
     names: list
     specs: list
+    workers: int = 1
+    # TrimConfig of every field, None for fields that are not trimmed. Fields are trimmed once they are validated
+    trims: list = None
+    # Whether fields are trimmed while they are parsed instead, so validators see trimmed values
+    trim_on_parse: bool = False
+    # Whether str fields are held as Arrow strings (string[pyarrow]) instead of Python str objects
+    arrow_strings: bool = False
+    # Start and width of every field as read only arrays, compiled once with the layout. Derived from specs when None
+    offsets: np.ndarray = dataclasses.field(default=None, compare=False)
+    widths: np.ndarray = dataclasses.field(default=None, compare=False)
+
+
+@dataclass(frozen=True)
+class SourceReaderConfig:
+    name: str
+    arguments: Mapping
+
+
+@dataclass(frozen=True)
+class DownloadConfig:
+    """
+    Download of the source object to /tmp, for readers that read a local copy
+
+    :param part_size: Size in bytes of each ranged GET
+    :param max_workers: Number of parts downloaded concurrently
+    """
+    part_size: int = None
+    max_workers: int = None
+
+
+@dataclass(frozen=True)
+class SourceLayout:
+    """
+    Compiled form of the source segment of a file config. Specs are parsed, validator and converter
+    names are resolved and field offsets and widths are held as read only NumPy arrays, once per config version.
+    The formatter config of every segment holds the offsets and widths of its fields, which the Numpy formatters
+    slice records with.
+    The layout is shared between invocations, so it only holds frozen configs, tuples and read only mappings:
+    arguments of validators, converters, the reader and the quarantine producer are read only copies.
+    """
+    mappers: tuple
+    validators: tuple
+    converters: tuple
+    offsets: Mapping[str, np.ndarray]
+    widths: Mapping[str, np.ndarray]
+    validator_callables: Mapping[str, validator.AbstractValidator]
+    converter_callables: Mapping[str, converter.AbstractConverter]
+    # Validators grouped by field, with their patterns compiled
+    validator_engine: ValidatorEngine = None
+    # Whether fields are trimmed by default, fields can override it with their own trim policy
+    trim: bool = True
+    nan_check: bool = True
+    chunk_size: int = None
+    reader: SourceReaderConfig = SourceReaderConfig(name="LocalSourceReader", arguments=MappingProxyType({}))
+    download: DownloadConfig = DownloadConfig()
+    compression: str = "auto"
+    quarantine: QuarantineConfig = None
+    memory_optimiser: MemoryOptimiserConfig = None
+
+
+# Compiled layouts keyed by (config version, file pattern, file format), least recently used first
+LAYOUT_CACHE_SIZE = 64
+_layouts = OrderedDict()
 
 
 @dataclass
@@ -28,61 +113,37 @@ class SourceMapperConfig:
     trim: bool
     nan_check: bool
     file_name: str
+    chunk_size: int
+    reader: SourceReaderConfig
+    download: DownloadConfig
+    compression: str
+    quarantine: QuarantineConfig
+    memory_optimiser: MemoryOptimiserConfig
+    version: str
+    layout: SourceLayout
 
-    def __init__(self, config: dict, file_name: str):
-        print(config)
-        self.mappers = []
-        self.validators = []
-        self.converters = []
+    def __init__(self, config: dict, file_name: str, version: str = None):
+        """
+        :param version: Version of the config, eg. its ETag or hash. When given the compiled layout is cached
+        per version and file pattern, so later invocations with the same config do not interpret it again
+        """
         self.file_name = file_name
-        self.trim = True
-        self.nan_check = True
+        self.version = version
         self.configure(config)
 
     def configure(self, config: dict, file_format="source"):
-        mappers = []
-        if file_format in config.keys():
-            if config[file_format] is None:
-                raise exceptions.InvalidConfigError(f"{file_format} segment cannot be empty")
-        else:
-            raise exceptions.InvalidConfigError(f"{file_format} segment is missing in configuration")
-        if 'trim' in config.keys():
-            self.trim = config['trim']
-        if 'nan_check' in config.keys():
-            self.nan_check = config['nan_check']
-        for segment in config[file_format]:
-            names = []
-            specs = []
-            validators = []
-            for field in config[file_format][segment]['format']:
-                names.append(field['name'])
-                specs.append(_converter(field['spec']))
-                if 'validators' in field.keys():
-                    field_validators = []
-                    for validator in field['validators']:
-                        args = validator['arguments'] if 'arguments' in validator.keys() else None
-                        field_validators.append(ValidatorFieldConfig(validator['name'], args))
-                    self.validators.append(ValidatorConfig(
-                        segment=segment,
-                        field_name=field['name'],
-                        validators=field_validators
-                    ))
-                if 'converter' in field.keys():
-                    if not isinstance(field['converter'], str):
-                        raise exceptions.InvalidConfigError("Field [converter] must be of str type.")
-                    self.converters.append(ConverterConfig(
-                        segment=segment,
-                        field_name=field['name'],
-                        name=field['converter']
-                    ))
-            mappers.append(SourceFormatterConfig(
-                name=config[file_format][segment]['formatter'],
-                segment=segment,
-                names=names,
-                specs=specs
-                )
-            )
-        self.mappers = mappers
+        self.layout = compile_layout(config, file_format, self.version)
+        self.mappers = self.layout.mappers
+        self.validators = self.layout.validators
+        self.converters = self.layout.converters
+        self.trim = self.layout.trim
+        self.nan_check = self.layout.nan_check
+        self.chunk_size = self.layout.chunk_size
+        self.reader = self.layout.reader
+        self.download = self.layout.download
+        self.compression = self.layout.compression
+        self.quarantine = self.layout.quarantine
+        self.memory_optimiser = self.layout.memory_optimiser
 
     def get_mappers(self):
         return self.mappers
@@ -94,6 +155,246 @@ class SourceMapperConfig:
         return self.validators
 
 
+def compile_layout(config: dict, file_format="source", version: str = None) -> SourceLayout:
+    """
+    Returns the SourceLayout of config, from the cache when the same version of the config has been compiled before.
+    Layouts without a version are not cached.
+    """
+    if version is None:
+        return _compile(config, file_format)
+    key = (version, config.get('pattern'), file_format)
+    if key in _layouts:
+        _layouts.move_to_end(key)
+        return _layouts[key]
+    layout = _compile(config, file_format)
+    _layouts[key] = layout
+    if len(_layouts) > LAYOUT_CACHE_SIZE:
+        _layouts.popitem(last=False)
+    log.debug(f"Compiled source layout for pattern [{config.get('pattern')}] of config version [{version}]")
+    return layout
+
+
+def clear_layouts():
+    _layouts.clear()
+
+
+def _compile(config: dict, file_format: str) -> SourceLayout:
+    if file_format in config.keys():
+        if config[file_format] is None:
+            raise exceptions.InvalidConfigError(f"{file_format} segment cannot be empty")
+    else:
+        raise exceptions.InvalidConfigError(f"{file_format} segment is missing in configuration")
+    options = {}
+    default_trim = _trim_config(config['trim'], "trim") if 'trim' in config.keys() else TrimConfig()
+    options['trim'] = default_trim is not None
+    if 'nan_check' in config.keys():
+        options['nan_check'] = config['nan_check']
+    if 'chunk_size' in config.keys():
+        if not isinstance(config['chunk_size'], int) or config['chunk_size'] < 1:
+            raise exceptions.InvalidConfigError("Field [chunk_size] must be a positive integer.")
+        options['chunk_size'] = config['chunk_size']
+    if 'reader' in config.keys():
+        options['reader'] = _reader_config(config['reader'])
+    if 'download' in config.keys():
+        options['download'] = _download_config(config['download'])
+    if 'compression' in config.keys():
+        if config['compression'] not in source_reader.COMPRESSIONS:
+            raise exceptions.InvalidConfigError(
+                f"Field [compression] must be one of {source_reader.COMPRESSIONS}.")
+        options['compression'] = config['compression']
+    if 'quarantine' in config.keys():
+        options['quarantine'] = _quarantine_config(config['quarantine'])
+    if 'optimise_memory' in config.keys():
+        options['memory_optimiser'] = _memory_optimiser_config(config['optimise_memory'])
+    workers = 1
+    if 'parse_workers' in config.keys():
+        if not isinstance(config['parse_workers'], int) or config['parse_workers'] < 1:
+            raise exceptions.InvalidConfigError("Field [parse_workers] must be a positive integer.")
+        workers = config['parse_workers']
+    trim_on_parse = False
+    if 'trim_on_parse' in config.keys():
+        if not isinstance(config['trim_on_parse'], bool):
+            raise exceptions.InvalidConfigError("Field [trim_on_parse] must be of bool type.")
+        trim_on_parse = config['trim_on_parse']
+    arrow_strings = False
+    if 'arrow_strings' in config.keys():
+        if not isinstance(config['arrow_strings'], bool):
+            raise exceptions.InvalidConfigError("Field [arrow_strings] must be of bool type.")
+        if config['arrow_strings']:
+            try:
+                import pyarrow
+            except ImportError:
+                raise exceptions.InvalidConfigError("pyarrow package is required for [arrow_strings].")
+        arrow_strings = config['arrow_strings']
+
+    mappers = []
+    validators = []
+    converters = []
+    offsets = {}
+    widths = {}
+    validator_callables = {}
+    converter_callables = {}
+    for segment in config[file_format]:
+        names = []
+        specs = []
+        trims = []
+        for field in config[file_format][segment]['format']:
+            names.append(field['name'])
+            specs.append(_converter(field['spec']))
+            trims.append(_trim_config(field['trim'], f"{field['name']}.trim") if 'trim' in field.keys()
+                         else default_trim)
+            if 'validators' in field.keys():
+                field_validators = []
+                for vld in field['validators']:
+                    args = vld['arguments'] if 'arguments' in vld.keys() else None
+                    field_validators.append(ValidatorFieldConfig(vld['name'], _frozen(args)))
+                    validator_callables[vld['name']] = _resolve(validator, vld['name'], "validator")
+                validators.append(ValidatorConfig(
+                    segment=segment,
+                    field_name=field['name'],
+                    validators=tuple(field_validators)
+                ))
+            if 'converter' in field.keys():
+                cfg = _converter_config(field['converter'], segment, field['name'])
+                converters.append(cfg)
+                converter_callables[cfg.name] = _resolve(converter, cfg.name, "converter")
+        bounds = np.array(specs, dtype=np.int64).reshape(-1, 2)
+        offsets[segment] = _read_only(bounds[:, 0])
+        widths[segment] = _read_only(bounds[:, 1] - bounds[:, 0])
+        mappers.append(SourceFormatterConfig(
+            name=config[file_format][segment]['formatter'],
+            segment=segment,
+            names=tuple(names),
+            specs=tuple(specs),
+            workers=workers,
+            trims=tuple(trims),
+            trim_on_parse=trim_on_parse,
+            arrow_strings=arrow_strings,
+            offsets=offsets[segment],
+            widths=widths[segment]
+            )
+        )
+
+    return SourceLayout(
+        mappers=tuple(mappers),
+        validators=tuple(validators),
+        converters=tuple(converters),
+        offsets=MappingProxyType(offsets),
+        widths=MappingProxyType(widths),
+        validator_callables=MappingProxyType(validator_callables),
+        converter_callables=MappingProxyType(converter_callables),
+        validator_engine=ValidatorEngine(tuple(validators), validator_callables),
+        **options
+    )
+
+
+def _converter_config(data, segment: str, field_name: str) -> ConverterConfig:
+    """
+    Converter of a field: its name, or a [name] with the [arguments] of the converter
+    """
+    if isinstance(data, dict):
+        if not isinstance(data.get('name'), str):
+            raise exceptions.InvalidConfigError("Field [converter.name] must be of str type.")
+        arguments = data.get('arguments')
+        if arguments is not None and not isinstance(arguments, dict):
+            raise exceptions.InvalidConfigError("Field [converter.arguments] must be a mapping.")
+        return ConverterConfig(segment=segment, field_name=field_name, name=data['name'],
+                               arguments=_frozen(arguments))
+    if not isinstance(data, str):
+        raise exceptions.InvalidConfigError("Field [converter] must be of str type.")
+    return ConverterConfig(segment=segment, field_name=field_name, name=data)
+
+
+def _trim_config(data, name: str):
+    """
+    Trim policy of a field: true or both, left, right, false or none, or a [side] with the pad [characters] to strip
+    """
+    if data is True:
+        return TrimConfig()
+    if data is False or data == "none":
+        return None
+    if isinstance(data, str) and data in TRIM_SIDES:
+        return TrimConfig(side=data)
+    if isinstance(data, dict):
+        side = data.get('side', "both")
+        characters = data.get('characters')
+        if side in TRIM_SIDES and (characters is None or (isinstance(characters, str) and len(characters) > 0)):
+            return TrimConfig(side=side, characters=characters)
+    raise exceptions.InvalidConfigError(
+        f"Field [{name}] must be a boolean, one of {TRIM_SIDES + ['none']} or contain a [side] and [characters].")
+
+
+def _resolve(module, name: str, kind: str):
+    target = getattr(module, name, None)
+    if not isinstance(target, type):
+        raise exceptions.InvalidConfigError(f"Unknown {kind} [{name}].")
+    return target()
+
+
+def _frozen(value):
+    """
+    Read only copy of a config value held by a layout: dicts become read only mappings and lists tuples
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({key: _frozen(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_frozen(item) for item in value)
+    return value
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    array = np.ascontiguousarray(array)
+    array.flags.writeable = False
+    return array
+
+
+def _reader_config(data) -> SourceReaderConfig:
+    if isinstance(data, str):
+        return SourceReaderConfig(name=data, arguments=MappingProxyType({}))
+    if isinstance(data, dict) and isinstance(data.get('name'), str):
+        return SourceReaderConfig(name=data['name'], arguments=_frozen(data.get('arguments') or {}))
+    raise exceptions.InvalidConfigError("Field [reader] must be a reader name or contain a [name] field.")
+
+
+def _download_config(data) -> DownloadConfig:
+    if not isinstance(data, dict):
+        raise exceptions.InvalidConfigError("Field [download] must contain download settings.")
+    unknown = set(data.keys()) - {field.name for field in dataclasses.fields(DownloadConfig)}
+    if unknown:
+        raise exceptions.InvalidConfigError(f"Unknown fields {sorted(unknown)} in [download].")
+    for name, value in data.items():
+        if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+            raise exceptions.InvalidConfigError(f"Field [download.{name}] must be a positive integer.")
+    return DownloadConfig(**data)
+
+
+def _quarantine_config(data) -> QuarantineConfig:
+    if not isinstance(data, dict) or not isinstance(data.get('producer'), dict) \
+            or not isinstance(data['producer'].get('name'), str):
+        raise exceptions.InvalidConfigError("Field [quarantine] must contain a [producer] with a [name] field.")
+    threshold = data.get('threshold', 0)
+    if isinstance(threshold, bool) or not isinstance(threshold, (int, float)) or threshold < 0:
+        raise exceptions.InvalidConfigError("Field [quarantine.threshold] must be a positive number.")
+    return QuarantineConfig(threshold=threshold, name=data['producer']['name'],
+                            arguments=_frozen(data['producer'].get('arguments') or {}))
+
+
+def _memory_optimiser_config(data):
+    """
+    Memory optimiser of a file: true or false, or the [category_ratio] of the optimiser
+    """
+    if data is True:
+        return MemoryOptimiserConfig()
+    if data is False:
+        return None
+    if not isinstance(data, dict):
+        raise exceptions.InvalidConfigError("Field [optimise_memory] must be true, false or a mapping.")
+    ratio = data.get('category_ratio', MemoryOptimiserConfig.category_ratio)
+    if isinstance(ratio, bool) or not isinstance(ratio, (int, float)) or not 0 <= ratio <= 1:
+        raise exceptions.InvalidConfigError("Field [optimise_memory.category_ratio] must be a number from 0 to 1.")
+    return MemoryOptimiserConfig(category_ratio=ratio)
+
+
 def _converter(data: str):
     if not isinstance(data, str):
         raise ValueError("Invalid Type for input [data]")
@@ -1,67 +1,309 @@
 from transformer.library import logger
 from transformer.library.exceptions import SourceFileError
+from transformer.library.strings import ARROW_STRING, from_bytes, is_arrow_string
 from transformer.source import SourceFormatterConfig
-from io import StringIO
+from transformer.source.source_config import TrimConfig
+from transformer.source import source_reader
+from transformer.source.source_reader import SourceSegments
+from io import BytesIO
+import multiprocessing
+import os
+import sys
+import numpy as np
 import pandas as pd
 
 log = logger.set_logger(__name__)
+current_module = sys.modules[__name__]
+
+# Segments smaller than this are always parsed in process, as starting workers would cost more than it saves
+PARALLEL_MIN_BYTES = 4 * 1024 * 1024
+
+_STRIP = {"both": np.char.strip, "left": np.char.lstrip, "right": np.char.rstrip}
+_STRIP_METHODS = {"both": "strip", "left": "lstrip", "right": "rstrip"}
 
 
 class AbstractDataMapper:
-    def run(self, config: SourceFormatterConfig, file_name: str) -> pd.DataFrame: pass
+    # Lines the formatter reads: header, body, footer or all. Only body and all formatters can be streamed in chunks
+    source_range = "all"
+    # Whether fields can be trimmed to config.trims while they are parsed, with config.trim_on_parse.
+    # Else SourceMapper trims the frame once it is validated
+    trims_on_parse = False
+    # Whether every record of the segment has the same length, so a row starts at its position times the record length
+    fixed_length = False
+
+    def run(self, config: SourceFormatterConfig, file_name: str) -> pd.DataFrame:
+        return self.format(config, source_reader.read_segments(file_name))
+
+    def format(self, config: SourceFormatterConfig, segments: SourceSegments) -> pd.DataFrame:
+        # Formatters that only implement run() still work with a pre-read SourceSegments
+        return self.run(config, segments.file_name)
 
 
 class HeaderSourceFormatter(AbstractDataMapper):
-    def run(self, config: SourceFormatterConfig, file_name: str) -> pd.DataFrame:
-        try:
-            data = pd.read_fwf(file_name, colspecs=config.specs, names=config.names,
-                               converters={h: str for h in config.names}, delimiter="\n\t", nrows=1)
-            if len(data.index) == 0:
-                raise SourceFileError("Invalid Source File, Index is empty", file_name)
-            return data
-        except FileNotFoundError as e:
-            raise SourceFileError(e, file_name)
+    source_range = "header"
+    trims_on_parse = True
+
+    def format(self, config: SourceFormatterConfig, segments: SourceSegments) -> pd.DataFrame:
+        return _read_fwf(segments.header(), config, segments.file_name)
 
 
 class BodySourceFormatter(AbstractDataMapper):
-    def run(self, config: SourceFormatterConfig, file_name: str) -> pd.DataFrame:
-        try:
-            data = pd.read_fwf(file_name, colspecs=config.specs, header=0,
-                               names=config.names,
-                               converters={h: str for h in config.names}, skipfooter=1,
-                               delimiter="\n\t")
-            if len(data.index) == 0:
-                raise SourceFileError("Invalid Source File, Index is empty", file_name)
-            return data
-        except FileNotFoundError as e:
-            raise SourceFileError(e, file_name)
+    source_range = "body"
+    trims_on_parse = True
+
+    def format(self, config: SourceFormatterConfig, segments: SourceSegments) -> pd.DataFrame:
+        return _parse(_read_fwf, segments.body(), config, segments.file_name)
 
 
 class FooterSourceFormatter(AbstractDataMapper):
+    source_range = "footer"
+    trims_on_parse = True
+
     def run(self, config: SourceFormatterConfig, file_name: str) -> pd.DataFrame:
-        try:
-            with open(file_name, 'r') as lines:
-                read = lines.readlines()
-                if len(read) == 0:
-                    raise SourceFileError("Invalid Source File, Index is empty", file_name)
-                last_line = read[-1]
-                data = pd.read_fwf(StringIO(last_line), colspecs=config.specs,
-                                   names=config.names,
-                                   converters={h: str for h in config.names}, delimiter="\n\t")
-                return data
-        except FileNotFoundError as e:
-            raise SourceFileError(e, file_name)
+        # Only the last line is read, by seeking back from the end of the file
+        footer = source_reader.LocalSourceReader(file_name).read_tail(1)
+        return self.format(config, SourceSegments(data=footer, file_name=file_name, header_end=0, footer_start=0))
+
+    def format(self, config: SourceFormatterConfig, segments: SourceSegments) -> pd.DataFrame:
+        return _read_fwf(segments.footer(), config, segments.file_name)
 
 
 class BodyOnlySourceFormatter(AbstractDataMapper):
-    def run(self, config: SourceFormatterConfig, file_name: str) -> pd.DataFrame:
+    source_range = "all"
+    trims_on_parse = True
+
+    def format(self, config: SourceFormatterConfig, segments: SourceSegments) -> pd.DataFrame:
+        return _parse(_read_fwf, segments.all(), config, segments.file_name)
+
+
+class NumpyBodySourceFormatter(AbstractDataMapper):
+    """
+    Body formatter for files where every body record has the same length.
+    Records are viewed as a (rows, record_length) byte matrix and columns are cut from it directly,
+    which avoids pd.read_fwf parsing every cell in Python.
+    """
+    source_range = "body"
+    trims_on_parse = True
+    fixed_length = True
+
+    def format(self, config: SourceFormatterConfig, segments: SourceSegments) -> pd.DataFrame:
+        return _parse(_slice_records, segments.body(), config, segments.file_name)
+
+
+class NumpyBodyOnlySourceFormatter(AbstractDataMapper):
+    """
+    BodyOnlySourceFormatter equivalent of NumpyBodySourceFormatter.
+    """
+    source_range = "all"
+    trims_on_parse = True
+    fixed_length = True
+
+    def format(self, config: SourceFormatterConfig, segments: SourceSegments) -> pd.DataFrame:
+        return _parse(_slice_records, segments.all(), config, segments.file_name)
+
+
+def _parse(parser, data: memoryview, config: SourceFormatterConfig, file_name: str) -> pd.DataFrame:
+    """
+    Parses data with [parser], split over config.workers processes (at most one per CPU) when the segment is large
+    enough. Every process parses a range of whole lines and the frames are joined back in file order.
+    """
+    workers = min(config.workers, os.cpu_count() or 1)
+    if workers <= 1 or len(data) < PARALLEL_MIN_BYTES:
+        return parser(data, config, file_name)
+    ranges = _line_ranges(data, workers)
+    if len(ranges) <= 1:
+        return parser(data, config, file_name)
+    log.debug(f"Parsing {len(data)} bytes of [{file_name}] with {len(ranges)} processes")
+
+    # Forked processes share data with the parent and only get the offsets of their range. Where processes are
+    # spawned, each range is written to its process through a pipe straight from data, without copying it first.
+    # Process and Pipe are used instead of a Pool as they also work where there is no /dev/shm, eg. AWS Lambda
+    fork = "fork" in multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if fork else None)
+    processes = []
+    for start, end in ranges:
+        receiver, sender = context.Pipe(duplex=False)
+        range_receiver, range_sender = (None, None) if fork else context.Pipe(duplex=False)
+        process = context.Process(target=_parse_worker,
+                                  args=(sender, parser.__name__, data if fork else range_receiver, start, end,
+                                        config, file_name))
+        process.start()
+        sender.close()
+        if not fork:
+            range_receiver.close()
+            range_sender.send_bytes(data, start, end - start)
+            range_sender.close()
+        processes.append((process, receiver))
+
+    frames = []
+    errors = []
+    for process, receiver in processes:
+        try:
+            result = receiver.recv()
+        except EOFError:
+            result = SourceFileError(f"Parser process exited with code {process.exitcode}", file_name)
+        process.join()
+        if isinstance(result, Exception):
+            errors.append(result)
+        else:
+            frames.append(result)
+    if len(errors) > 0:
+        raise errors[0]
+    return pd.concat(frames, ignore_index=True)
+
+
+def _parse_worker(sender, parser_name: str, data, start: int, end: int, config: SourceFormatterConfig,
+                  file_name: str):
+    """
+    :param data: Whole segment shared with the parent, or the connection its range is received from
+    """
+    try:
+        if isinstance(data, memoryview):
+            data = data[start:end]
+        else:
+            data = memoryview(data.recv_bytes())
+        sender.send(getattr(current_module, parser_name)(data, config, file_name))
+    except Exception as e:
+        sender.send(e)
+    finally:
+        sender.close()
+
+
+def _line_ranges(data: memoryview, parts: int) -> list[tuple[int, int]]:
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    ranges = []
+    start = 0
+    for part in range(1, parts):
+        end = _next_line_start(buffer, max(start, len(buffer) * part // parts))
+        if end >= len(buffer):
+            break
+        if end > start:
+            ranges.append((start, end))
+            start = end
+    ranges.append((start, len(buffer)))
+    return ranges
+
+
+def _next_line_start(buffer: np.ndarray, position: int, window=65536) -> int:
+    while position < len(buffer):
+        breaks = np.flatnonzero(buffer[position:position + window] == 0x0A)
+        if len(breaks) > 0:
+            return position + int(breaks[0]) + 1
+        position += window
+    return len(buffer)
+
+
+def _read_fwf(data: memoryview, config: SourceFormatterConfig, file_name: str) -> pd.DataFrame:
+    if len(data) == 0:
+        raise SourceFileError("Invalid Source File, Index is empty", file_name)
+    try:
+        frame = pd.read_fwf(BytesIO(data), colspecs=config.specs, header=None, names=config.names,
+                            converters={h: str for h in config.names}, delimiter="\n\t")
+    except pd.errors.EmptyDataError:
+        raise SourceFileError("Invalid Source File, Index is empty", file_name)
+    if len(frame.index) == 0:
+        raise SourceFileError("Invalid Source File, Index is empty", file_name)
+    return trim_columns(frame, config) if config.trim_on_parse else frame
+
+
+def _slice_records(data: memoryview, config: SourceFormatterConfig, file_name: str) -> pd.DataFrame:
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    end = len(buffer)
+    while end > 0 and buffer[end - 1] in (0x0A, 0x0D):
+        end -= 1
+    if end == 0:
+        raise SourceFileError("Invalid Source File, Index is empty", file_name)
+
+    width = _record_width(buffer, end)
+    terminator = 2 if width < end and buffer[width] == 0x0D else 1
+    record_length = width + terminator
+    rows = (end + terminator) // record_length
+    # Terminators at every record boundary are not enough, a line break inside a record means misaligned lines
+    if (end + terminator) % record_length != 0 or \
+            not (buffer[width + terminator - 1:end:record_length] == 0x0A).all() or \
+            np.count_nonzero(buffer[:end] == 0x0A) != rows - 1:
+        raise SourceFileError(
+            f"Records are not of fixed length {width}. Use a pd.read_fwf based formatter instead", file_name)
+
+    # (rows, width) view over the raw buffer, the last record does not need a line terminator
+    records = np.lib.stride_tricks.as_strided(buffer, shape=(rows, width), strides=(record_length, 1),
+                                              writeable=False)
+    trims = config.trims if config.trim_on_parse and config.trims else [None] * len(config.names)
+    offsets, widths = _field_bounds(config)
+    # Fields are cut short at the end of the record, or left out when they start after it
+    stops = np.minimum(offsets + widths, width)
+    return pd.DataFrame({
+        name: _slice_column(records, start, stop, trim, config.arrow_strings, file_name)
+        for name, start, stop, trim in zip(config.names, offsets.tolist(), stops.tolist(), trims)
+    })
+
+
+def _field_bounds(config: SourceFormatterConfig) -> tuple[np.ndarray, np.ndarray]:
+    """
+    :return: (offsets, widths) of the fields, compiled with the layout or derived from the specs of other configs
+    """
+    if config.offsets is not None and config.widths is not None:
+        return config.offsets, config.widths
+    bounds = np.array(config.specs, dtype=np.int64).reshape(-1, 2)
+    return bounds[:, 0], bounds[:, 1] - bounds[:, 0]
+
+
+def trim_columns(frame: pd.DataFrame, config: SourceFormatterConfig) -> pd.DataFrame:
+    """
+    Trims the str values of every column of frame to its config.trims, column by column with the pandas str methods.
+    Values that are not str are left as they are.
+    """
+    for name, trim in zip(config.names, config.trims or []):
+        if trim is None or name not in frame.columns or (frame[name].dtype != object and
+                                                          not is_arrow_string(frame[name])):
+            continue
+        column = frame[name]
+        stripped = getattr(column.str, _STRIP_METHODS[trim.side])(trim.characters)
+        frame[name] = stripped.where(stripped.notna(), column)
+    return frame
+
+
+def _record_width(buffer: np.ndarray, end: int, window=65536) -> int:
+    start = 0
+    while start < end:
+        breaks = np.flatnonzero(buffer[start:min(start + window, end)] == 0x0A)
+        if len(breaks) > 0:
+            width = start + int(breaks[0])
+            return width - 1 if width > 0 and buffer[width - 1] == 0x0D else width
+        start += window
+    return end
+
+
+def arrow_strings(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Object columns of frame as Arrow strings, eg. of pd.read_fwf based and custom formatters
+    """
+    columns = {name: ARROW_STRING for name in frame.columns if frame[name].dtype == object}
+    return frame.astype(columns) if columns else frame
+
+
+def _slice_column(records: np.ndarray, start: int, stop: int, trim: TrimConfig = None,
+                  arrow: bool = False, file_name: str = None) -> pd.Series:
+    """
+    :param arrow: Whether the column is built as Arrow strings, straight from the sliced bytes
+    :param file_name: File the records are read from, for the SourceFileError of values that are not UTF-8
+    """
+    rows = records.shape[0]
+    if start >= stop:
+        # Same as pd.read_fwf, a column that lies outside the record is NaN
+        return pd.Series([np.nan] * rows, dtype=object)
+    column = np.ascontiguousarray(records[:, start:stop]).view(f"S{stop - start}").ravel()
+    if trim is not None:
+        # Pad bytes are stripped from the raw slice, before it is decoded
+        characters = trim.characters.encode('utf-8') if trim.characters is not None else None
+        column = _STRIP[trim.side](column, characters)
+    try:
+        if arrow:
+            return from_bytes(column)
         try:
-            data = pd.read_fwf(file_name, colspecs=config.specs, header=None,
-                               names=config.names,
-                               converters={h: str for h in config.names}, skipfooter=0,
-                               delimiter="\n\t")
-            if len(data.index) == 0:
-                raise SourceFileError("Invalid Source File, Index is empty", file_name)
-            return data
-        except FileNotFoundError as e:
-            raise SourceFileError(e, file_name)
\ No newline at end of file
+            decoded = column.astype(f"U{stop - start}")
+        except UnicodeDecodeError:
+            decoded = np.char.decode(column, 'utf-8')
+    except (UnicodeDecodeError, ValueError) as e:
+        raise SourceFileError(f"Invalid Source File, field at {start}-{stop} is not UTF-8: {e}", file_name)
+    return pd.Series(decoded, dtype=object)
@@ -1,71 +1,307 @@
+from typing import Iterator
+
 from transformer.library import logger
+from transformer.library.metrics import PipelineMetrics, count_rows
 from transformer.source.source_config import SourceMapperConfig
-from transformer.source.source_config import SourceFormatterConfig
-from transformer.source import source_formatter
+from transformer.source.source_config import SourceFormatterConfig, SourceLayout
+from transformer.source import source_formatter, source_reader
+from transformer.source.quarantine import Quarantine
+from transformer.source.memory_optimiser import MemoryOptimiser
+from transformer.source.source_reader import SourceSegments, AbstractSourceReader
 from transformer.converter import ConverterConfig, converter
-from transformer.validator import ValidatorConfig, validator
-from transformer.library.exceptions import ValidationError, ValidationFailureError
+from transformer.validator import ValidatorConfig, ValidatorEngine, ValidationResult, validator
+from transformer.library.exceptions import ValidationError, ValidationFailureError, InvalidConfigError, \
+    SourceFileError
 import pandas as pd
 
 log = logger.set_logger(__name__)
 
 
 class SourceMapper:
-    def run(self, config: SourceMapperConfig) -> dict[str, pd.DataFrame]:
+    # Rows diverted from the last file mapped, when its config has a quarantine policy
+    quarantine: Quarantine = None
+    # Memory saved on the frames of the last file mapped, when its config optimises memory
+    memory_optimiser: MemoryOptimiser = None
+
+    def run(self, config: SourceMapperConfig, metrics: PipelineMetrics = None) -> dict[str, pd.DataFrame]:
         """
         The execution of the above steps are as follows:
-        1. SourceFormatter to convert data from File to DataFrames
+        1. SourceFormatter to convert data from File to DataFrames. The file is read once and each formatter parses its own segment
         2. A NaN validation is then applied by default. To prevent this behaviour, provide an override in the config
-        3. Custom Validations are then executed if provided. Else this section will be skipped
-        4. Default Converter is then executed to trim away all whitespaces in DataFrames. To prevent this behaviour, provide and override in the config
+        3. Custom Validations are then executed if provided. Else this section will be skipped.
+           With a quarantine policy, body rows failing row validators are diverted to self.quarantine instead
+        4. Fields are trimmed of whitespaces, or per field trim policy. To prevent this behaviour, provide and override in the config.
+           With trim_on_parse fields are trimmed while they are parsed instead, before they are validated
+        5. Converters are run, then the frames are shrunk by self.memory_optimiser when the config optimises memory
         """
-        dataframes = self._format(config.get_mappers(), config.file_name)
+        metrics = metrics or PipelineMetrics()
+        self.quarantine = Quarantine(config.quarantine, config.file_name) if config.quarantine else None
+        self.memory_optimiser = MemoryOptimiser(config.memory_optimiser) if config.memory_optimiser else None
+        with metrics.stage("format") as stage:
+            # The file is read once and every formatter parses its own slice of it
+            segments = source_reader.read_segments(self._reader(config))
+            dataframes = self._format_segments(config.get_mappers(), segments)
+            stage.record(rows_out=count_rows(dataframes), bytes=len(segments.data))
+            metrics.record_frames(stage, dataframes)
         if config.nan_check:
-            errors = []
-            for df in dataframes:
-                try:
-                    validator.NaNValidator().validate(segment=df, field_name="ALL", arguments={}, frames=dataframes)
-                except ValidationError as e:
-                    errors.append(e)
-            if len(errors) > 0:
-                raise ValidationFailureError(f"Nan Validation failed for {len(errors)} segments.", errors)
-        self._validate(config.get_validators(), dataframes)
-        if config.trim:
-            dataframes = self._trim(dataframes)
-        dataframes = self._convert(config.get_converters(), dataframes)
+            with metrics.stage("nan_check") as stage:
+                stage.record(rows_in=count_rows(dataframes))
+                self._nan_check(dataframes)
+        with metrics.stage("validate") as stage:
+            stage.record(rows_in=count_rows(dataframes))
+            mappers = config.get_mappers()
+            result = self._validate(config.get_validators(), dataframes, layout=config.layout,
+                                    diverted=self._diverted(mappers))
+            if self.quarantine:
+                dataframes = self._divert(result, dataframes, segments, mappers)
+                self.quarantine.check()
+                stage.record(rows_out=count_rows(dataframes))
+        if self._untrimmed(config.get_mappers()):
+            with metrics.stage("trim") as stage:
+                dataframes = self._trim(dataframes, config.get_mappers())
+                stage.record(rows_in=count_rows(dataframes), rows_out=count_rows(dataframes))
+                metrics.record_frames(stage, dataframes)
+        with metrics.stage("convert") as stage:
+            dataframes = self._convert(config.get_converters(), dataframes, layout=config.layout)
+            stage.record(rows_in=count_rows(dataframes), rows_out=count_rows(dataframes))
+            metrics.record_frames(stage, dataframes)
+        if self.memory_optimiser:
+            dataframes = self._optimise(dataframes, metrics)
+            self.memory_optimiser.log_report(config.file_name)
         return dataframes
 
-    def _format(self, config: [SourceFormatterConfig], file_name) -> dict[str, pd.DataFrame]:
+    def run_chunks(self, config: SourceMapperConfig,
+                   metrics: PipelineMetrics = None) -> Iterator[dict[str, pd.DataFrame]]:
+        """
+        Chunked equivalent of run(), yielding the dataframes of every [config.chunk_size] body rows.
+        Header and footer frames are read once and are part of every chunk. Deferred validators
+        (eg. RefValidator count) and a fraction quarantine threshold need the total row count, the body
+        lines are counted before the first chunk so they fail the file before any chunk is yielded.
+        Deferred validators are run again with the parsed row counts after the last chunk.
+        Stage metrics add up over every chunk.
+        """
+        metrics = metrics or PipelineMetrics()
+        self.quarantine = Quarantine(config.quarantine, config.file_name) if config.quarantine else None
+        self.memory_optimiser = MemoryOptimiser(config.memory_optimiser) if config.memory_optimiser else None
+        reader = self._reader(config)
+        mappers = config.get_mappers()
+        streamed = [cfg for cfg in mappers if getattr(source_formatter, cfg.name).source_range in ("body", "all")]
+        source_ranges = {getattr(source_formatter, cfg.name).source_range for cfg in streamed}
+        if len(source_ranges) != 1:
+            raise InvalidConfigError("Chunked processing requires body segments that read the same lines of the file")
+        streamed_segments = [cfg.segment for cfg in streamed]
+        resident = [cfg for cfg in mappers if cfg.segment not in streamed_segments]
+
+        # Untrimmed and unconverted resident frames are kept for validations, same as run()
+        with metrics.stage("format") as stage:
+            edges = source_reader.read_edges(reader) if resident else None
+            raw_frames = self._format_segments(resident, edges) if resident else {}
+            stage.record(rows_out=count_rows(raw_frames), bytes=len(edges.data) if edges else 0)
+            metrics.record_frames(stage, raw_frames)
+        if config.nan_check:
+            with metrics.stage("nan_check") as stage:
+                stage.record(rows_in=count_rows(raw_frames))
+                self._nan_check(raw_frames)
+        with metrics.stage("validate") as stage:
+            stage.record(rows_in=count_rows(raw_frames))
+            self._validate([cfg for cfg in config.get_validators() if cfg.segment not in streamed_segments],
+                           raw_frames, deferred=False, layout=config.layout)
+        resident_frames = dict(raw_frames)
+        if self._untrimmed(resident):
+            with metrics.stage("trim") as stage:
+                resident_frames = self._trim(resident_frames, resident)
+                stage.record(rows_in=count_rows(resident_frames), rows_out=count_rows(resident_frames))
+                metrics.record_frames(stage, resident_frames)
+        with metrics.stage("convert") as stage:
+            resident_frames = self._convert(
+                [cfg for cfg in config.get_converters() if cfg.segment not in streamed_segments], resident_frames,
+                layout=config.layout)
+            stage.record(rows_in=count_rows(resident_frames), rows_out=count_rows(resident_frames))
+            metrics.record_frames(stage, resident_frames)
+        if self.memory_optimiser:
+            resident_frames = self._optimise(resident_frames, metrics)
+
+        source_range = source_ranges.pop()
+        counts = {segment: len(raw_frames[segment].index) for segment in raw_frames}
+        if self._counted(config):
+            with metrics.stage("count") as stage:
+                total = source_reader.count_lines(reader, source_range)
+                stage.record(rows_out=total)
+            if total == 0:
+                raise SourceFileError("Invalid Source File, Index is empty", reader.file_name)
+            with metrics.stage("validate"):
+                self._validate_counts(config.get_validators(), raw_frames,
+                                      {**counts, **{segment: total for segment in streamed_segments}},
+                                      layout=config.layout)
+            if self.quarantine:
+                for segment in streamed_segments:
+                    self.quarantine.expect(segment, total)
+        counts.update({segment: 0 for segment in streamed_segments})
+        chunks = source_reader.iter_chunks(reader, config.chunk_size, source_range)
+        while True:
+            # Stages do not span a yield, so time spent by the consumer of a chunk is not counted here
+            with metrics.stage("format") as stage:
+                segments = next(chunks, None)
+                if segments is None:
+                    break
+                chunk = self._format_segments(streamed, segments)
+                stage.record(rows_out=count_rows(chunk), bytes=len(segments.data))
+                metrics.record_frames(stage, chunk)
+            if config.nan_check:
+                with metrics.stage("nan_check") as stage:
+                    stage.record(rows_in=count_rows(chunk))
+                    self._nan_check(chunk)
+            with metrics.stage("validate") as stage:
+                stage.record(rows_in=count_rows(chunk))
+                result = self._validate([cfg for cfg in config.get_validators() if cfg.segment in streamed_segments],
+                                        {**raw_frames, **chunk}, deferred=False, layout=config.layout,
+                                        diverted=self._diverted(streamed))
+                offsets = dict(counts)
+                for segment in chunk:
+                    counts[segment] += len(chunk[segment].index)
+                if self.quarantine:
+                    chunk = self._divert(result, chunk, segments, streamed, offsets)
+                    self.quarantine.check(final=False)
+                    stage.record(rows_out=count_rows(chunk))
+            if self._untrimmed(streamed):
+                with metrics.stage("trim") as stage:
+                    chunk = self._trim(chunk, streamed)
+                    stage.record(rows_in=count_rows(chunk), rows_out=count_rows(chunk))
+                    metrics.record_frames(stage, chunk)
+            with metrics.stage("convert") as stage:
+                chunk = self._convert([cfg for cfg in config.get_converters() if cfg.segment in streamed_segments],
+                                      chunk, layout=config.layout)
+                stage.record(rows_in=count_rows(chunk), rows_out=count_rows(chunk))
+                metrics.record_frames(stage, chunk)
+            if self.memory_optimiser:
+                chunk = self._optimise(chunk, metrics)
+            frames = {**resident_frames, **chunk}
+            yield {cfg.segment: frames[cfg.segment] for cfg in mappers}
+
+        if any(counts[segment] == 0 for segment in streamed_segments):
+            raise SourceFileError("Invalid Source File, Index is empty", reader.file_name)
+        with metrics.stage("validate"):
+            if self.quarantine:
+                self.quarantine.check()
+            self._validate_counts(config.get_validators(), raw_frames, counts, layout=config.layout)
+        if self.memory_optimiser:
+            self.memory_optimiser.log_report(config.file_name)
+
+    def _counted(self, config: SourceMapperConfig) -> bool:
+        """
+        Whether chunks need the total row count up front, for deferred validators or a fraction quarantine threshold
+        """
+        if self.quarantine and self.quarantine.config.threshold < 1:
+            return True
+        return any(self._deferred(vld, config.layout) for cfg in config.get_validators() for vld in cfg.validators)
+
+    def _deferred(self, vld, layout: SourceLayout = None) -> bool:
+        instance = layout.validator_callables[vld.name] if layout else getattr(validator, vld.name)()
+        return instance.is_deferred(vld.arguments)
+
+    def _reader(self, config: SourceMapperConfig) -> AbstractSourceReader:
+        return getattr(source_reader, config.reader.name)(config.file_name, compression=config.compression,
+                                                          **config.reader.arguments)
+
+    def _format_segments(self, config: [SourceFormatterConfig], segments: SourceSegments) -> dict[str, pd.DataFrame]:
         dataframes = {}
         for cfg in config:
-            dataframes[cfg.segment] = getattr(source_formatter, cfg.name)().run(cfg, file_name)
+            frame = getattr(source_formatter, cfg.name)().format(cfg, segments)
+            dataframes[cfg.segment] = source_formatter.arrow_strings(frame) if cfg.arrow_strings else frame
         return dataframes
 
-    def _convert(self, config: [ConverterConfig], dataframes: [str, pd.DataFrame]) -> dict[str, pd.DataFrame]:
+    def _convert(self, config: [ConverterConfig], dataframes: [str, pd.DataFrame],
+                 layout: SourceLayout = None) -> dict[str, pd.DataFrame]:
         for cfg in config:
-            dataframes[cfg.segment][cfg.field_name] = getattr(converter, cfg.name)().run(cfg, dataframes[cfg.segment][cfg.field_name])
+            instance = layout.converter_callables[cfg.name] if layout else getattr(converter, cfg.name)()
+            dataframes[cfg.segment][cfg.field_name] = instance.run(cfg, dataframes[cfg.segment][cfg.field_name])
         return dataframes
 
-    def _validate(self, config: [ValidatorConfig], dataframes: [str, pd.DataFrame]) -> None:
+    def _optimise(self, dataframes: dict[str, pd.DataFrame], metrics: PipelineMetrics) -> dict[str, pd.DataFrame]:
+        with metrics.stage("optimise") as stage:
+            saved = sum(memory.saved for memory in self.memory_optimiser.report.values())
+            dataframes = self.memory_optimiser.run(dataframes)
+            stage.record(rows_in=count_rows(dataframes), rows_out=count_rows(dataframes),
+                         bytes=sum(memory.saved for memory in self.memory_optimiser.report.values()) - saved)
+            metrics.record_frames(stage, dataframes)
+        return dataframes
+
+    def _nan_check(self, dataframes: dict[str, pd.DataFrame]) -> None:
+        errors = []
+        for df in dataframes:
+            try:
+                validator.NaNValidator().validate(segment=df, field_name="ALL", arguments={}, frames=dataframes)
+            except ValidationError as e:
+                errors.append(e)
+        if len(errors) > 0:
+            raise ValidationFailureError(f"Nan Validation failed for {len(errors)} segments.", errors)
+
+    def _validate(self, config: [ValidatorConfig], dataframes: [str, pd.DataFrame], deferred=None,
+                  layout: SourceLayout = None, diverted=()) -> ValidationResult:
+        """
+        :param deferred: When set, only validators whose is_deferred() equals it are run
+        :param layout: Compiled layout holding the validators of the config, they are compiled on every call without it
+        :param diverted: Segments whose failing rows are quarantined, their row validators do not fail the file
+        """
+        engine = layout.validator_engine if layout else ValidatorEngine(config)
+        # The layout holds every validator of the config, config selects the segments to validate
+        result = engine.run(dataframes, segments={cfg.segment for cfg in config}, deferred=deferred)
+        quarantined = {id(e) for segment in diverted if segment in result.failures
+                       for e in result.failures[segment].errors}
+        errors = [e for e in result.errors if id(e) not in quarantined]
+
+        if len(errors) > 0:
+            raise ValidationFailureError(f"There are {len(errors)} pre-validation errors. {errors}", errors)
+        return result
+
+    def _diverted(self, config: [SourceFormatterConfig]) -> set[str]:
+        """
+        Segments whose failing rows are quarantined, only body rows can be left out of a file
+        """
+        if self.quarantine is None:
+            return set()
+        return {cfg.segment for cfg in config if getattr(source_formatter, cfg.name).source_range in ("body", "all")}
+
+    def _divert(self, result: ValidationResult, dataframes: dict[str, pd.DataFrame], segments: SourceSegments,
+                config: [SourceFormatterConfig], offsets: dict[str, int] = None) -> dict[str, pd.DataFrame]:
+        diverted = self._diverted(config)
+        for cfg in config:
+            if cfg.segment not in diverted or cfg.segment not in result.failures:
+                continue
+            formatter = getattr(source_formatter, cfg.name)
+            lines = getattr(segments, formatter.source_range)()
+            dataframes[cfg.segment] = self.quarantine.divert(cfg.segment, dataframes[cfg.segment],
+                                                             result.failures[cfg.segment], lines,
+                                                             offsets[cfg.segment] if offsets else 0,
+                                                             fixed_length=formatter.fixed_length)
+        return dataframes
+
+    def _validate_counts(self, config: [ValidatorConfig], dataframes: [str, pd.DataFrame], counts: dict[str, int],
+                         layout: SourceLayout = None) -> None:
         errors = []
         for cfg in config:
             for vld in cfg.validators:
+                instance = layout.validator_callables[vld.name] if layout else getattr(validator, vld.name)()
+                if not instance.is_deferred(vld.arguments):
+                    continue
                 try:
-                    getattr(validator, vld.name)().validate(
-                        segment=cfg.segment,
-                        field_name = cfg.field_name,
-                        arguments=vld.arguments,
-                        frames=dataframes
-                    )
+                    instance.validate_counts(cfg.segment, cfg.field_name, vld.arguments, dataframes, counts)
                 except ValidationError as e:
-                    print(e)
                     errors.append(e)
 
         if len(errors) > 0:
             raise ValidationFailureError(f"There are {len(errors)} pre-validation errors. {errors}", errors)
 
-    def _trim(self, dataframes: dict[str, pd.DataFrame]) -> dict[str, pd.DataFrame]:
-        for df in dataframes:
-            dataframes[df] = dataframes[df].applymap(lambda x: x.strip() if isinstance(x, str) else x)
+    def _trim(self, dataframes: dict[str, pd.DataFrame], config: [SourceFormatterConfig]) -> dict[str, pd.DataFrame]:
+        """
+        Trims the frames that were not trimmed while they were parsed
+        """
+        for cfg in self._untrimmed(config):
+            if cfg.segment in dataframes:
+                dataframes[cfg.segment] = source_formatter.trim_columns(dataframes[cfg.segment], cfg)
 
         return dataframes
+
+    def _untrimmed(self, config: [SourceFormatterConfig]) -> list[SourceFormatterConfig]:
+        return [cfg for cfg in config if not (cfg.trim_on_parse and getattr(source_formatter, cfg.name).trims_on_parse)
+                and any(trim is not None for trim in cfg.trims or [])]
@@ -0,0 +1,418 @@
+import bz2
+import gzip
+import io
+import lzma
+import queue
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Iterator, BinaryIO, Union
+
+from transformer.library import logger, aws_service
+from transformer.library.exceptions import SourceFileError, InvalidConfigError
+
+log = logger.set_logger(__name__)
+
+
+@dataclass
+class SourceSegments:
+    """
+    A source file split into header, body and footer in a single read.
+
+    Every segment is a memoryview over the same buffer, so handing a segment to a
+    SourceFormatter does not copy or re-read the file.
+    """
+    data: bytes
+    file_name: str
+    header_end: int
+    footer_start: int
+
+    def header(self) -> memoryview:
+        return memoryview(self.data)[:self.header_end]
+
+    def body(self) -> memoryview:
+        return memoryview(self.data)[self.header_end:max(self.header_end, self.footer_start)]
+
+    def footer(self) -> memoryview:
+        return memoryview(self.data)[self.footer_start:]
+
+    def all(self) -> memoryview:
+        return memoryview(self.data)
+
+
+COMPRESSIONS = ["auto", "none", "gzip", "bz2", "xz", "zstd"]
+
+_EXTENSIONS = {
+    ".gz": "gzip",
+    ".gzip": "gzip",
+    ".bz2": "bz2",
+    ".xz": "xz",
+    ".lzma": "xz",
+    ".zst": "zstd",
+    ".zstd": "zstd"
+}
+
+_MAGIC_BYTES = {
+    b"\x1f\x8b": "gzip",
+    b"BZh": "bz2",
+    b"\xfd7zXZ\x00": "xz",
+    b"\x28\xb5\x2f\xfd": "zstd"
+}
+
+
+class AbstractSourceReader:
+    file_name: str
+    compression: str
+
+    def __init__(self, file_name: str, compression="auto", **kwargs):
+        """
+        :param compression: One of COMPRESSIONS. auto detects it from the file extension, then from the first bytes of the file
+        """
+        if compression not in COMPRESSIONS:
+            raise InvalidConfigError(f"Unsupported compression [{compression}], expected one of {COMPRESSIONS}")
+        self.file_name = file_name
+        self.compression = compression
+
+    def open(self) -> BinaryIO:
+        """
+        Opens the file for reading, decompressing it while it is read when it is compressed.
+        """
+        stream = self._open()
+        compression = self.compression
+        if compression == "auto":
+            compression = _extension_compression(self.file_name) or _magic_compression(stream.peek(6)[:6])
+        return decompress(stream, compression, self.file_name)
+
+    def _open(self) -> io.BufferedReader: pass
+
+    def is_compressed(self) -> bool:
+        if self.compression != "auto":
+            return self.compression != "none"
+        if _extension_compression(self.file_name):
+            return True
+        with self._open() as stream:
+            return _magic_compression(stream.peek(6)[:6]) is not None
+
+    def read_head(self, lines=1) -> bytes:
+        """
+        First [lines] lines of the file. Readers of remote files override this to avoid opening the whole file.
+        """
+        with self.open() as file:
+            return b"".join(file.readline() for _ in range(lines))
+
+    def read_tail(self, lines=1) -> bytes:
+        """
+        Last [lines] non-empty lines of the file. Readers that can seek override this to avoid reading the whole file,
+        compressed files are always read through.
+        """
+        with self.open() as file:
+            tail = deque(maxlen=lines)
+            trailing = []
+            for line in file:
+                if line.strip(b'\r\n'):
+                    tail.append(line)
+                    trailing = []
+                else:
+                    trailing.append(line)
+        return b"".join(tail) + b"".join(trailing)
+
+
+class LocalSourceReader(AbstractSourceReader):
+    def _open(self) -> io.BufferedReader:
+        try:
+            return open(self.file_name, 'rb')
+        except FileNotFoundError as e:
+            raise SourceFileError(e, self.file_name)
+
+    def read_tail(self, lines=1, block_size=64 * 1024) -> bytes:
+        if self.is_compressed():
+            return super().read_tail(lines)
+        with self._open() as file:
+            position = file.seek(0, io.SEEK_END)
+            data = b""
+            while position > 0:
+                step = min(block_size, position)
+                position -= step
+                file.seek(position)
+                data = file.read(step) + data
+                start = tail_start(data, lines)
+                if start != -1:
+                    return data[start:]
+        return data
+
+
+class S3SourceReader(AbstractSourceReader):
+    """
+    Reads a source file of the form s3://bucket/key directly from the get_object streaming body, nothing is written to disk.
+    Blocks of [buffer_size] bytes are downloaded on a background thread up to [read_ahead] blocks ahead of the parser.
+    Download and parsing only overlap when the file is read in chunks (chunk_size), as the segments of a whole file are
+    parsed once all of it is read. Header and footer lines are read with range GETs.
+    """
+    bucket: str
+    key: str
+    buffer_size: int
+    read_ahead: int
+
+    def __init__(self, file_name: str, buffer_size=8 * 1024 * 1024, read_ahead=2, client=None, **kwargs):
+        super().__init__(file_name, **kwargs)
+        if not file_name.startswith("s3://") or "/" not in file_name[5:]:
+            raise InvalidConfigError(f"S3SourceReader requires a file name of the form s3://bucket/key, got [{file_name}]")
+        self.bucket, self.key = file_name[5:].split("/", 1)
+        self.buffer_size = buffer_size
+        self.read_ahead = read_ahead
+        self.client = client
+
+    def _open(self) -> io.BufferedReader:
+        try:
+            body = aws_service.download_s3_as_bytes(self.bucket, self.key, self.client)
+        except Exception as e:
+            raise SourceFileError(e, self.file_name)
+        return io.BufferedReader(ReadAheadStream(body, self.buffer_size, self.read_ahead), buffer_size=self.buffer_size)
+
+    def is_compressed(self) -> bool:
+        if self.compression != "auto" or _extension_compression(self.file_name):
+            return super().is_compressed()
+        try:
+            magic = aws_service.download_s3_range(self.bucket, self.key, "bytes=0-5", self.client).read()
+        except Exception as e:
+            raise SourceFileError(e, self.file_name)
+        return _magic_compression(magic) is not None
+
+    def read_head(self, lines=1, block_size=64 * 1024) -> bytes:
+        if self.is_compressed():
+            return super().read_head(lines)
+        # Range GETs from the start, growing until they hold enough lines or the whole object
+        size = block_size
+        while True:
+            try:
+                data = aws_service.download_s3_range(self.bucket, self.key, f"bytes=0-{size - 1}", self.client).read()
+            except Exception as e:
+                raise SourceFileError(e, self.file_name)
+            end = -1
+            for _ in range(lines):
+                end = data.find(b'\n', end + 1)
+                if end == -1:
+                    break
+            if end != -1:
+                return data[:end + 1]
+            if len(data) < size:
+                return data
+            size *= 4
+
+    def read_tail(self, lines=1, block_size=64 * 1024) -> bytes:
+        if self.is_compressed():
+            return super().read_tail(lines)
+        # Suffix range GETs, growing until they hold enough lines or the whole object
+        suffix = block_size
+        while True:
+            try:
+                data = aws_service.download_s3_range(self.bucket, self.key, f"bytes=-{suffix}", self.client).read()
+            except Exception as e:
+                raise SourceFileError(e, self.file_name)
+            start = tail_start(data, lines)
+            if start != -1:
+                return data[start:]
+            if len(data) < suffix:
+                return data
+            suffix *= 4
+
+
+class ReadAheadStream(io.RawIOBase):
+    """
+    Raw stream that reads [stream] on a background thread, keeping up to [read_ahead] blocks ready for the consumer.
+    """
+    def __init__(self, stream, buffer_size: int, read_ahead: int):
+        super().__init__()
+        self._stream = stream
+        self._buffer_size = buffer_size
+        self._blocks = queue.Queue(maxsize=max(1, read_ahead))
+        self._block = memoryview(b"")
+        self._eof = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._fill, daemon=True)
+        self._thread.start()
+
+    def _fill(self):
+        try:
+            while not self._stop.is_set():
+                block = self._stream.read(self._buffer_size)
+                self._put(block)
+                if not block:
+                    return
+        except Exception as e:
+            self._put(e)
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while len(self._block) == 0:
+            if self._eof:
+                return 0
+            item = self._blocks.get()
+            if isinstance(item, Exception):
+                raise item
+            if not item:
+                self._eof = True
+                return 0
+            self._block = memoryview(item)
+        size = min(len(buffer), len(self._block))
+        buffer[:size] = self._block[:size]
+        self._block = self._block[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            self._stream.close()
+        super().close()
+
+
+def decompress(stream: io.BufferedReader, compression: str, file_name: str) -> BinaryIO:
+    """
+    Wraps stream with a streaming decompressor, data is inflated as it is read and never held as a whole.
+    """
+    if compression in (None, "none"):
+        return stream
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    if compression == "bz2":
+        return bz2.BZ2File(stream, mode='rb')
+    if compression == "xz":
+        return lzma.LZMAFile(stream, mode='rb')
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            stream.close()
+            raise SourceFileError("zstandard package is required to read zstd compressed files", file_name)
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(stream, closefd=True))
+    raise InvalidConfigError(f"Unsupported compression [{compression}], expected one of {COMPRESSIONS}")
+
+
+def _extension_compression(file_name: str):
+    for extension in _EXTENSIONS:
+        if file_name.lower().endswith(extension):
+            return _EXTENSIONS[extension]
+    return None
+
+
+def _magic_compression(magic: bytes):
+    for prefix in _MAGIC_BYTES:
+        if magic.startswith(prefix):
+            return _MAGIC_BYTES[prefix]
+    return None
+
+
+def open_reader(source: Union[str, AbstractSourceReader]) -> AbstractSourceReader:
+    if isinstance(source, AbstractSourceReader):
+        return source
+    return LocalSourceReader(source)
+
+
+def read_segments(source: Union[str, AbstractSourceReader]) -> SourceSegments:
+    reader = open_reader(source)
+    with reader.open() as file:
+        data = file.read()
+    log.debug(f"Read {len(data)} bytes from source file [{reader.file_name}]")
+    return split_segments(data, reader.file_name)
+
+
+def split_segments(data: bytes, file_name: str) -> SourceSegments:
+    """
+    Header is the first line and footer is the last non-empty line of data.
+    Trailing line breaks are not treated as an extra (empty) footer line.
+    """
+    first_break = data.find(b'\n')
+    header_end = len(data) if first_break == -1 else first_break + 1
+
+    end = len(data)
+    while end > 0 and data[end - 1] in b'\r\n':
+        end -= 1
+    footer_start = data.rfind(b'\n', 0, end) + 1
+    return SourceSegments(data=data, file_name=file_name, header_end=header_end, footer_start=footer_start)
+
+
+def tail_start(data: bytes, lines: int) -> int:
+    """
+    Offset in data where its last [lines] non-empty lines start, -1 when data does not contain that many complete lines.
+    """
+    end = len(data)
+    while end > 0 and data[end - 1] in b'\r\n':
+        end -= 1
+    start = end
+    for _ in range(lines):
+        start = data.rfind(b'\n', 0, start)
+        if start == -1:
+            return -1
+    return start + 1
+
+
+def read_edges(source: Union[str, AbstractSourceReader]) -> SourceSegments:
+    """
+    Reads only the header and footer lines of a file, the footer is read from the end of the file without
+    going through the body. The returned SourceSegments has an empty body.
+    """
+    reader = open_reader(source)
+    head = reader.read_head(1)
+    tail = reader.read_tail(1)
+    return SourceSegments(data=head + tail, file_name=reader.file_name, header_end=len(head), footer_start=len(head))
+
+
+def iter_chunks(source: Union[str, AbstractSourceReader], rows: int, source_range="body") -> Iterator[SourceSegments]:
+    """
+    Streams a file in chunks of at most [rows] lines, each chunk is returned as a SourceSegments whose body is the chunk.
+
+    :param source_range: "body" to leave out the header and footer lines, "all" to stream every line
+    """
+    reader = open_reader(source)
+    file_name = reader.file_name
+    with reader.open() as file:
+        if source_range == "body":
+            file.readline()
+        chunk = []
+        # Last non-empty line and the empty lines after it, held back until we know it is not the footer
+        held = []
+        for line in file:
+            if line.strip(b'\r\n'):
+                chunk.extend(held)
+                held = [line]
+            else:
+                held.append(line)
+            if len(chunk) >= rows:
+                yield _chunk_segments(chunk, file_name)
+                chunk = []
+        if source_range == "all":
+            chunk.extend(held)
+        if len(chunk) > 0:
+            yield _chunk_segments(chunk, file_name)
+
+
+def count_lines(source: Union[str, AbstractSourceReader], source_range="body") -> int:
+    """
+    Number of rows iter_chunks would stream, without keeping any line. Blank lines are not rows and are not counted.
+
+    :param source_range: "body" to leave out the header and footer lines, "all" to count every line
+    """
+    reader = open_reader(source)
+    with reader.open() as file:
+        if source_range == "body":
+            file.readline()
+        count = sum(1 for line in file if line.strip())
+    if source_range == "body":
+        # Last non-empty line is the footer
+        count = max(count - 1, 0)
+    return count
+
+
+def _chunk_segments(lines: list, file_name: str) -> SourceSegments:
+    data = b"".join(lines)
+    return SourceSegments(data=data, file_name=file_name, header_end=0, footer_start=len(data))
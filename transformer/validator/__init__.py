@@ -1,2 +1,3 @@
 from transformer.validator.validator_config import ValidatorConfig, ValidatorFieldConfig
-from transformer.validator.validator import NricValidator, NaNValidator, RegexValidator, RefValidator
\ No newline at end of file
+from transformer.validator.validator import NricValidator, NaNValidator, RegexValidator, RefValidator
+from transformer.validator.validator_engine import ValidatorEngine, ValidationResult, SegmentFailures
@@ -1,9 +1,15 @@
 import dataclasses
+import os
+import re
+from collections import OrderedDict
+from typing import Callable
 
+import numpy as np
 import pandas as pd
 
 from transformer.library import logger
-from transformer.library.exceptions import ValidationError, MissingConfigError
+from transformer.library.exceptions import ValidationError, MissingConfigError, InvalidConfigError
+from transformer.library.strings import arrow_array, code_points, is_arrow_string
 import sys
 
 log = logger.set_logger(__name__)
@@ -11,6 +17,9 @@ module = sys.modules[__name__]
 
 
 class AbstractValidator:
+    # Name of the validation in failure messages of row validators
+    label = None
+
     def validate(self,
                  segment: str,
                  field_name: str,
@@ -18,8 +27,52 @@ class AbstractValidator:
                  frames: dict[pd.DataFrame]
                  ): pass
 
+    def compile(self, arguments: dict) -> Callable[[str], bool]:
+        """
+        Check of a single value for validators that are evaluated row by row, see RowValidator.
+        Validators returning None are run with validate.
+        """
+        return None
+
+    def error(self, segment: str, field_name: str, failure_count: int, record_count: int,
+              rows: list[int] = None) -> ValidationError:
+        """
+        Failure of the rows of a field that failed the check returned by compile
+        """
+        return ValidationError(
+            f"{self.label} Validation Failure for {segment}, {field_name} with {failure_count}/{record_count} count",
+            segment,
+            field_name,
+            failure_count,
+            record_count,
+            rows
+        )
+
+    def is_deferred(self, arguments: dict) -> bool:
+        """
+        Deferred validations depend on every row of a segment. When a file is processed in chunks
+        they are run once with validate_counts after the last chunk instead of on every chunk.
+        """
+        return False
+
+    def validate_counts(self,
+                        segment: str,
+                        field_name: str,
+                        arguments: dict,
+                        frames: dict[str, pd.DataFrame],
+                        counts: dict[str, int]
+                        ): pass
+
+
+class RowValidator(AbstractValidator):
+    """
+    Validator that checks every value of a field on its own. compile is called once per config and the check is
+    evaluated by ValidatorEngine together with the other row validators of the same field, in one pass over the
+    distinct values of the field. NaN and values that are not str fail every row validator.
+    """
+    def compile(self, arguments: dict) -> Callable[[str], bool]:
+        raise NotImplementedError()
 
-class NricValidator(AbstractValidator):
     def validate(self,
                  segment: str,
                  field_name: str,
@@ -27,45 +80,69 @@ class NricValidator(AbstractValidator):
                  frames: dict[str, pd.DataFrame]
                  ):
         target_series = frames[segment][field_name]
+        failures = row_failures(target_series, [self.compile(arguments)])[:, 0]
+        if failures.any():
+            raise self.error(segment, field_name, int(failures.sum()), target_series.size,
+                             np.flatnonzero(failures).tolist())
 
-        matched = target_series[target_series.str.count(r'(?i)^[STFG]\d{7}[A-Z]$') == True]
-        if len(matched.index) != len(target_series.index):
-            failure_count = target_series.size - matched.size
-            raise ValidationError(
-                f"NRIC Validation Failure for {segment}, {field_name} with {failure_count}/{target_series.size} count",
-                segment,
-                field_name,
-                failure_count,
-                target_series.size
-            )
 
+class ColumnCheck:
+    """
+    Check of a RowValidator that is evaluated on an array of str values, or a Series of Arrow strings, at once,
+    returning True for every valid value
+    """
+    def __init__(self, function: Callable[[np.ndarray], np.ndarray]):
+        self.function = function
 
-class RegexValidator(AbstractValidator):
-    def validate(self,
-                 segment: str,
-                 field_name: str,
-                 arguments: dict,
-                 frames: dict[str, pd.DataFrame]
-                 ):
-        if 'pattern' not in arguments.keys():
+    def __call__(self, values: np.ndarray) -> np.ndarray:
+        return self.function(values)
+
+
+class PatternCheck(ColumnCheck):
+    """
+    Check of a RegexValidator pattern. Arrow strings are matched with pyarrow.compute when every value is ASCII and
+    the pattern is supported by its RE2 engine, which then matches the same values as re. Else values are matched
+    one by one with re.
+    """
+    def __init__(self, pattern: re.Pattern):
+        super().__init__(self._matches)
+        self.pattern = pattern
+        self.match = _matches_once(pattern)
+
+    def _matches(self, values) -> np.ndarray:
+        if isinstance(values, pd.Series) and is_arrow_string(values):
+            valid = _arrow_matches(arrow_array(values), self.pattern)
+            if valid is not None:
+                return valid
+            values = values.tolist()
+        return np.fromiter((bool(self.match(value)) for value in values), dtype=bool, count=len(values))
+
+
+class NricValidator(RowValidator):
+    """
+    Checks the shape ([STFGM], 7 digits, check letter, in any case) and the check letter of NRIC/FIN numbers
+    """
+    label = "NRIC"
+
+    def compile(self, arguments: dict) -> Callable[[str], bool]:
+        return ColumnCheck(nric_checksum)
+
+
+class RegexValidator(RowValidator):
+    label = "Regex"
+
+    def compile(self, arguments: dict) -> Callable[[str], bool]:
+        if arguments is None or 'pattern' not in arguments.keys():
             raise MissingConfigError("Required argument [pattern] is missing. Please verify configuration.")
 
         if not isinstance(arguments['pattern'], str):
             raise MissingConfigError(
                 "Required argument [pattern] is not of string/str type. Please verify configuration")
 
-        target_series = frames[segment][field_name]
-        matched = target_series[target_series.str.count(arguments['pattern']) == True]
-
-        if len(matched.index) != len(target_series.index):
-            failure_count = target_series.size - matched.size
-            raise ValidationError(
-                f"Regex Validation Failure for {segment}, {field_name} with {failure_count}/{target_series.size} count",
-                segment,
-                field_name,
-                failure_count,
-                target_series.size
-            )
+        try:
+            return PatternCheck(re.compile(arguments['pattern']))
+        except re.error as e:
+            raise InvalidConfigError(f"Invalid pattern [{arguments['pattern']}]: {e}")
 
 
 class NaNValidator(AbstractValidator):
@@ -92,6 +169,14 @@ class NaNValidator(AbstractValidator):
 
 
 class RefValidator(AbstractValidator):
+    """
+    type count: The row count of the segment equals the value of [ref], or the other way around for single row segments
+    type match: The field equals [ref] row by row
+    type lookup: Every value of the field is a key of [ref], or of the local reference [file] (one key per line, or
+    the [column] of a CSV file). Reference files are loaded once into a hash index kept across invocations
+    """
+    label = "Ref"
+
     def validate(self,
                  segment: str,
                  field_name: str,
@@ -102,23 +187,62 @@ class RefValidator(AbstractValidator):
             splits = arguments['ref'].split('.')
             target = frames[splits[0]][splits[1]]
             source = frames[segment][field_name]
-            print(target, source)
 
             if not target.equals(source):
-                raise ValidationError(
-                    "Failed RefValidation",
-                    segment,
-                    field_name,
-                    target.value_counts().loc[False],
-                    len(target.index)
-                )
+                rows = _mismatches(source, target)
+                if len(rows) > 0:
+                    raise ValidationError(
+                        "Failed RefValidation",
+                        segment,
+                        field_name,
+                        len(rows),
+                        len(source.index),
+                        rows
+                    )
+
+        if arguments['type'] == "lookup":
+            source = frames[segment][field_name]
+            if 'file' in arguments:
+                index = reference_index(arguments['file'], arguments.get('column'))
+            else:
+                splits = arguments['ref'].split('.')
+                index = pd.Index(pd.unique(frames[splits[0]][splits[1]].dropna()))
+            missing = index.get_indexer(source) < 0
+            if missing.any():
+                raise self.error(segment, field_name, int(missing.sum()), len(source.index),
+                                 np.flatnonzero(missing).tolist())
+
+        if arguments['type'] == "count":
+            self.validate_counts(segment, field_name, arguments, frames,
+                                 {f: len(frames[f].index) for f in frames})
+
+    def compile(self, arguments: dict) -> Callable[[str], bool]:
+        if arguments is None or arguments.get('type') not in ("count", "match", "lookup"):
+            raise MissingConfigError("Required argument [type] must be one of count, match or lookup.")
+        if arguments['type'] == "lookup" and 'file' in arguments:
+            file_name, column = arguments['file'], arguments.get('column')
+            # The index is looked up on every call, so a reference file that changed is loaded again
+            return ColumnCheck(lambda values: reference_index(file_name, column).get_indexer(values) >= 0)
+        if not isinstance(arguments.get('ref'), str) or '.' not in arguments['ref']:
+            raise MissingConfigError("Required argument [ref] must be of segment.field format.")
+        return None
+
+    def is_deferred(self, arguments: dict) -> bool:
+        return arguments is not None and arguments.get('type') == "count"
 
+    def validate_counts(self,
+                        segment: str,
+                        field_name: str,
+                        arguments: dict,
+                        frames: dict[str, pd.DataFrame],
+                        counts: dict[str, int]
+                        ):
         if arguments['type'] == "count":
             splits = arguments['ref'].split('.')
-            target_count = len(frames[segment][field_name].index)
+            target_count = counts[segment]
             if target_count == 1:
                 # Reversed Flow
-                target_count = len(frames[splits[0]][splits[1]].index)
+                target_count = counts[splits[0]]
                 expected_count = frames[segment][field_name][0]
             else:
                 expected_count = frames[splits[0]][splits[1]][0]
@@ -130,3 +254,172 @@ class RefValidator(AbstractValidator):
                     int(target_count),
                     int(expected_count)
                 )
+
+
+def row_failures(series: pd.Series, checks: list[Callable[[str], bool]]) -> np.ndarray:
+    """
+    Evaluates every check on the distinct values of series, value checks in one pass over them and ColumnChecks on
+    all of them at once.
+
+    :return: Boolean array of rows x checks, True where the row failed the check
+    """
+    codes, uniques = pd.factorize(series)
+    if is_arrow_string(series):
+        # Missing values are left out of the uniques, which stay Arrow strings for the ColumnChecks
+        strings = np.ones(len(uniques), dtype=bool)
+        values = pd.Series(uniques)
+    else:
+        uniques = np.asarray(uniques, dtype=object)
+        strings = np.fromiter((isinstance(value, str) for value in uniques), dtype=bool, count=len(uniques))
+        values = uniques[strings]
+    valid = np.zeros((len(values), len(checks)), dtype=bool)
+    value_checks = []
+    for index, check in enumerate(checks):
+        if isinstance(check, ColumnCheck):
+            valid[:, index] = check(values)
+        else:
+            value_checks.append(index)
+    if value_checks:
+        valid[:, value_checks] = np.array([[bool(checks[index](value)) for index in value_checks]
+                                           for value in values.tolist()],
+                                          dtype=bool).reshape(len(values), len(value_checks))
+    failures = np.ones((len(uniques) + 1, len(checks)), dtype=bool)
+    failures[:-1][strings] = ~valid
+    # NaN values have code -1, which selects the last row where every check failed
+    return failures[codes]
+
+
+NRIC_WEIGHTS = np.array([2, 7, 6, 5, 4, 3, 2])
+# Added to the weighted sum of the digits, by prefix
+NRIC_OFFSETS = {"S": 0, "T": 4, "F": 0, "G": 4, "M": 3}
+# Check letter of every remainder of the sum by 11, by prefix
+NRIC_CHECK_LETTERS = {
+    "S": "JZIHGFEDCBA",
+    "T": "JZIHGFEDCBA",
+    "F": "XWUTRQPNMLK",
+    "G": "XWUTRQPNMLK",
+    "M": "XWUTRQPNJLK"
+}
+_NRIC_OFFSETS = np.zeros(256, dtype=np.int64)
+_NRIC_PREFIXES = np.zeros(256, dtype=bool)
+_NRIC_TABLE = np.zeros((256, 11), dtype=np.uint8)
+for _prefix, _letters in NRIC_CHECK_LETTERS.items():
+    _NRIC_OFFSETS[ord(_prefix)] = NRIC_OFFSETS[_prefix]
+    _NRIC_PREFIXES[ord(_prefix)] = True
+    _NRIC_TABLE[ord(_prefix)] = np.frombuffer(_letters.encode('ascii'), dtype=np.uint8)
+
+
+def nric_checksum(values) -> np.ndarray:
+    """
+    True for every value that is a NRIC/FIN number with a valid check letter, computed on the characters of all
+    values at once: the digits are weighted, the offset of the prefix is added and the remainder by 11 selects the
+    check letter from the table of the prefix.
+
+    :param values: Array of str, or a Series of Arrow strings
+    """
+    # Code points of every character, values shorter than the longest one are padded with 0
+    codes, _ = code_points(values)
+    width = codes.shape[1]
+    if len(codes) == 0 or width < 9:
+        return np.zeros(len(codes), dtype=bool)
+    nine = codes[:, 8] != 0
+    if width > 9:
+        nine &= codes[:, 9] == 0
+    codes = codes[:, :9].astype(np.int64)
+    lower = (codes >= ord("a")) & (codes <= ord("z"))
+    codes = np.where(lower, codes - 32, codes)
+    codes = np.where(codes < 256, codes, 0)
+    prefixes = codes[:, 0]
+    digits = codes[:, 1:8] - ord("0")
+    shaped = nine & _NRIC_PREFIXES[prefixes] & ((digits >= 0) & (digits <= 9)).all(axis=1)
+    remainders = (digits @ NRIC_WEIGHTS + _NRIC_OFFSETS[prefixes]) % 11
+    return shaped & (_NRIC_TABLE[prefixes, remainders] == codes[:, 8])
+
+
+def _matches_once(pattern: re.Pattern) -> Callable[[str], bool]:
+    """
+    Same as series.str.count(pattern) == 1, which the validators used before
+    """
+    if _anchored(pattern):
+        # Anchored at the start, the pattern can only match once
+        return pattern.match
+    return lambda value: len(pattern.findall(value)) == 1
+
+
+def _anchored(pattern: re.Pattern) -> bool:
+    return pattern.pattern.startswith("^") and "|" not in pattern.pattern and not pattern.flags & re.MULTILINE
+
+
+def _arrow_matches(array, pattern: re.Pattern):
+    """
+    Same as _matches_once on every value of a pyarrow StringArray without missing values. None when RE2 could match
+    other values than re: values that are not ASCII (eg. re matches other digits with \\d), flags or an unsupported
+    pattern such as a back reference
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    if pattern.flags & ~re.UNICODE or (len(array) > 0 and not pc.all(pc.string_is_ascii(array)).as_py()):
+        return None
+    try:
+        if _anchored(pattern):
+            matches = pc.match_substring_regex(array, pattern.pattern)
+        else:
+            matches = pc.equal(pc.count_substring_regex(array, pattern.pattern), 1)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        return None
+    return matches.to_numpy(zero_copy_only=False)
+
+
+# Hash indexes of reference files keyed by file and column, least recently used first
+REFERENCE_CACHE_SIZE = 8
+_references = OrderedDict()
+
+
+def reference_index(file_name: str, column: str = None) -> pd.Index:
+    """
+    Unique keys of a reference file as a pd.Index, whose hash table is built once and reused by every lookup.
+    Indexes are cached until the file is modified.
+
+    :param column: Column of a CSV file with a header line, the file holds one key per line without it
+    """
+    stat = os.stat(file_name)
+    version = (stat.st_mtime_ns, stat.st_size)
+    key = (file_name, column)
+    if key in _references and _references[key][0] == version:
+        _references.move_to_end(key)
+        return _references[key][1]
+    if column is None:
+        with open(file_name) as file:
+            keys = pd.Series(file.read().splitlines(), dtype=object).str.strip()
+        keys = keys[keys != ""]
+    else:
+        keys = pd.read_csv(file_name, usecols=[column], dtype=str)[column].dropna()
+    index = pd.Index(pd.unique(keys))
+    # Builds the hash table of the index, so the first lookup does not pay for it
+    index.get_indexer(index[:1])
+    _references[key] = (version, index)
+    while len(_references) > REFERENCE_CACHE_SIZE:
+        _references.popitem(last=False)
+    log.info(f"Loaded {len(index)} reference keys from {file_name}")
+    return index
+
+
+def clear_references():
+    _references.clear()
+
+
+def _mismatches(source: pd.Series, target: pd.Series) -> list[int]:
+    """
+    Positions where source and target differ, rows missing from the shorter one included
+    """
+    length = min(len(source.index), len(target.index))
+    if is_arrow_string(source) and is_arrow_string(target):
+        left = source.iloc[:length].reset_index(drop=True)
+        right = target.iloc[:length].reset_index(drop=True)
+        equal = (left == right).fillna(False).to_numpy(dtype=bool)
+        different = ~equal & ~(left.isna() & right.isna()).to_numpy()
+    else:
+        left = source.to_numpy()[:length]
+        right = target.to_numpy()[:length]
+        different = (left != right) & ~(pd.isna(left) & pd.isna(right))
+    return np.flatnonzero(different).tolist() + list(range(length, max(len(source.index), len(target.index))))
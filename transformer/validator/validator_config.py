@@ -1,13 +1,13 @@
 from dataclasses import dataclass
 
 
-@dataclass
+@dataclass(frozen=True)
 class ValidatorFieldConfig:
     name: str
     arguments: dict
 
 
-@dataclass
+@dataclass(frozen=True)
 class ValidatorConfig:
     segment: str
     field_name: str
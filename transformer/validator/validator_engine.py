@@ -0,0 +1,92 @@
+from dataclasses import dataclass
+from typing import Mapping
+
+import numpy as np
+import pandas as pd
+
+from transformer.library.exceptions import ValidationError
+from transformer.validator import validator
+from transformer.validator.validator_config import ValidatorConfig
+
+
+@dataclass
+class SegmentFailures:
+    """
+    :param rules: (field name, validator name) of every column of bitmap
+    :param bitmap: rows x rules, True where the row failed the rule
+    :param errors: ValidationError of every rule that failed any row
+    """
+    rules: list
+    bitmap: np.ndarray
+    errors: list
+    @property
+    def rows(self) -> np.ndarray:
+        """
+        True for every row that failed at least one rule
+        """
+        return self.bitmap.any(axis=1)
+
+
+@dataclass
+class ValidationResult:
+    failures: dict[str, SegmentFailures]
+    errors: list[ValidationError]
+
+
+class ValidatorEngine:
+    """
+    Validators of a config, grouped by field. Row validators (see validator.RowValidator) are compiled once and all
+    rules of a field are evaluated in a single pass over it, giving a per row failure bitmap of every segment.
+    Other validators are run with their validate method.
+    """
+    def __init__(self, config: [ValidatorConfig], callables: Mapping[str, validator.AbstractValidator] = None):
+        """
+        :param callables: Validator instances by name, validators are looked up by name without it
+        """
+        self._columns = {}
+        self._others = []
+        for cfg in config:
+            for vld in cfg.validators:
+                instance = callables[vld.name] if callables else getattr(validator, vld.name)()
+                check = instance.compile(vld.arguments)
+                if check is None:
+                    self._others.append((cfg, vld, instance))
+                else:
+                    self._columns.setdefault((cfg.segment, cfg.field_name), []).append((vld, instance, check))
+
+    def run(self, frames: dict[str, pd.DataFrame], segments=None, deferred=None) -> ValidationResult:
+        """
+        :param segments: When set, only validators of these segments are run
+        :param deferred: When set, only validators whose is_deferred() equals it are run
+        """
+        result = ValidationResult(failures={}, errors=[])
+        bitmaps = {}
+        for (segment, field_name), rules in self._columns.items():
+            if (segments is not None and segment not in segments) or deferred is True:
+                # Row validators are never deferred
+                continue
+            series = frames[segment][field_name]
+            bitmap = validator.row_failures(series, [check for _, _, check in rules])
+            counts = bitmap.sum(axis=0)
+            bitmaps.setdefault(segment, ([], [], []))
+            for column, ((vld, instance, _), count) in enumerate(zip(rules, counts)):
+                if count > 0:
+                    bitmaps[segment][2].append(instance.error(segment, field_name, int(count), series.size,
+                                                              np.flatnonzero(bitmap[:, column]).tolist()))
+            bitmaps[segment][0].extend((field_name, vld.name) for vld, _, _ in rules)
+            bitmaps[segment][1].append(bitmap)
+        for segment, (rules, bitmap, errors) in bitmaps.items():
+            result.failures[segment] = SegmentFailures(rules=rules, bitmap=np.hstack(bitmap), errors=errors)
+            result.errors.extend(errors)
+
+        for cfg, vld, instance in self._others:
+            if segments is not None and cfg.segment not in segments:
+                continue
+            if deferred is not None and instance.is_deferred(vld.arguments) != deferred:
+                continue
+            try:
+                instance.validate(segment=cfg.segment, field_name=cfg.field_name, arguments=vld.arguments,
+                                  frames=frames)
+            except ValidationError as e:
+                result.errors.append(e)
+        return result